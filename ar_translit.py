@@ -4,6 +4,7 @@
 
 import re, unicodedata
 import arabiclib
+import translitlib
 from arabiclib import *
 from blib import remove_links, msg
 
@@ -105,6 +106,10 @@ tt = {
   "–":"-", # long dash
 }
 
+# Single-pass converter for the final table-lookup stage of tr(); see
+# translitlib.py.
+tt_transliterator = translitlib.Transliterator(table=tt)
+
 sun_letters = "تثدذرزسشصضطظلن"
 # For use in implementing sun-letter assimilation of ال (al-)
 ttsun1 = {}
@@ -257,7 +262,7 @@ def tr(text, lang=None, sc=None, omit_i3raab=False, gray_i3raab=False,
   text = rsub(text, "ـ$", "-")
   text = rsub(text, "ـ\\s", "- ")
   # Now convert remaining Arabic chars according to table.
-  text = rsub(text, ".", tt)
+  text = tt_transliterator.tr(text)
   text = rsub(text, "aā", "ā")
   # Implement elision of al- after a final vowel. We do this
   # conservatively, only handling elision of the definite article rather
@@ -276,6 +281,13 @@ def tr(text, lang=None, sc=None, omit_i3raab=False, gray_i3raab=False,
 
   return text
 
+# Transliterate each string in TEXTS, returning a list of the results (None
+# for each string that isn't vocalized, as for tr()).
+def tr_many(texts, lang=None, sc=None, omit_i3raab=False, gray_i3raab=False,
+    force_translate=False, msgfun=msg):
+  return translitlib.tr_many(lambda text: tr(text, lang, sc, omit_i3raab,
+    gray_i3raab, force_translate, msgfun), texts)
+
 has_diacritics_subs = [
   # FIXME! What about lam-alif ligature?
   # remove punctuation and shadda
@@ -964,13 +976,44 @@ def post_canonicalize_arabic(text, safe=False):
 
 debug_tr_matching = False
 
+# Maximum number of results cached by tr_matching(). When the cache fills
+# up, it is cleared. Set to 0 to disable caching.
+tr_matching_cache_size = 100000
+tr_matching_cache = {}
+
+# Memoizing wrapper around tr_matching_uncached(). Bot scripts often match
+# the same Arabic/Latin pair many times over (e.g. the same lemma in
+# several inflection templates), so we cache the result along with any
+# messages output through MSGFUN, which are output again on a cache hit.
+# Errors are not cached.
+def tr_matching(arabic, latin, err=False, msgfun=msg):
+  if not tr_matching_cache_size:
+    return tr_matching_uncached(arabic, latin, err, msgfun)
+  key = (arabic, latin, err)
+  cached = tr_matching_cache.get(key)
+  if cached is not None:
+    result, messages = cached
+    for message in messages:
+      msgfun(message)
+    return result
+  messages = []
+  def record_msgfun(txt):
+    messages.append(txt)
+    msgfun(txt)
+  result = tr_matching_uncached(arabic, latin, err, record_msgfun)
+  if len(tr_matching_cache) >= tr_matching_cache_size:
+    tr_matching_cache.clear()
+  tr_matching_cache[key] = (result, messages)
+  return result
+
 # Vocalize Arabic based on transliterated Latin, and canonicalize the
 # transliteration based on the Arabic.  This works by matching the Latin
 # to the unvocalized Arabic and inserting the appropriate diacritics in
 # the right places, so that ambiguities of Latin transliteration can be
 # correctly handled. Returns a tuple of Arabic, Latin. If unable to match,
-# throw an error if ERR, else return None.
-def tr_matching(arabic, latin, err=False, msgfun=msg):
+# throw an error if ERR, else return None. Normally called through
+# tr_matching(), which caches the results.
+def tr_matching_uncached(arabic, latin, err=False, msgfun=msg):
   origarabic = arabic
   origlatin = latin
   def debprint(x):
@@ -1183,10 +1183,16 @@ pa.add_argument("--accent-hidden", action="store_true",
     help="Also add accents and brackets to hidden qutoes")
 pa.add_argument("--no-cache", action="store_true",
     help="Disable caching head lookup results")
+pa.add_argument("--head-index",
+    help="Index of heads and inflections built by build_ru_head_index.py, to consult in place of live page lookups")
+pa.add_argument("--head-index-overlay", action="store_true",
+    help="With --head-index, look up pages changed since the dump live rather than in the index")
 
 params = pa.parse_args()
 semi_verbose = params.semi_verbose or params.verbose
 global_disable_cache = params.no_cache
+ruheadlib.head_index_file = params.head_index
+ruheadlib.head_index_overlay = params.head_index_overlay
 startFrom, upTo = blib.parse_start_end(params.start, params.end)
 
 auto_accent_auto_bracket_russian(params.find_accents, params.accent_hidden,
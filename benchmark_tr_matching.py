@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Benchmark tr_matching() in ar_translit.py and ru_translit.py using the test cases in each module's run_tests().
+# Each module's run_tests() is timed with the tr_matching() result cache disabled and with the cache enabled and warm,
+# and tr_matching() alone is timed the same way on the Arabic/Russian and Latin pairs that run_tests() passes to it.
+# The outputs must be the same in all runs. If --baseline-rev is given, the module as of that git revision (e.g. a
+# revision before tr_matching() was memoized) is also timed, and its outputs must match the current outputs as well.
+
+import argparse, contextlib, io, subprocess, sys, time, types
+
+parser = argparse.ArgumentParser(description="Benchmark tr_matching() in ar_translit.py and ru_translit.py.")
+parser.add_argument("--modules", help="Comma-separated translit modules to benchmark (default %(default)s).",
+    default="ar_translit,ru_translit")
+parser.add_argument("--iterations", help="Number of times to run each module's tests (default %(default)s).",
+    type=int, default=5)
+parser.add_argument("--baseline-rev", help="Git revision of the modules to compare against.")
+args = parser.parse_args()
+
+def load_baseline_module(modname, rev):
+  source = subprocess.check_output(["git", "show", "%s:%s.py" % (rev, modname)]).decode("utf-8")
+  module = types.ModuleType("%s_%s" % (modname, rev))
+  module.__file__ = "%s.py@%s" % (modname, rev)
+  exec(compile(source, module.__file__, "exec"), module.__dict__)
+  return module
+
+# Run MODULE.run_tests() ITERATIONS times, returning the elapsed time per iteration and the captured output
+# (which should be the same for each iteration).
+def time_run_tests(module, iterations):
+  outputs = set()
+  starttime = time.time()
+  for i in range(iterations):
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+      module.run_tests()
+    outputs.add(buf.getvalue())
+  elapsed = (time.time() - starttime) / iterations
+  if len(outputs) != 1:
+    raise RuntimeError("%s.run_tests() output differs between iterations" % module.__name__)
+  return elapsed, outputs.pop()
+
+# Return the (NATIVE, LATIN) pairs passed to MODULE.tr_matching() by MODULE.run_tests().
+def get_tr_matching_pairs(module):
+  pairs = []
+  tr_matching = module.tr_matching
+  def recording_tr_matching(native, latin, *args, **kwargs):
+    pairs.append((native, latin))
+    return tr_matching(native, latin, *args, **kwargs)
+  module.tr_matching = recording_tr_matching
+  try:
+    with contextlib.redirect_stdout(io.StringIO()):
+      module.run_tests()
+  finally:
+    module.tr_matching = tr_matching
+  return pairs
+
+# Call MODULE.tr_matching() on PAIRS ITERATIONS times, returning the elapsed time per iteration and the results
+# (including messages and errors) of the last iteration.
+def time_tr_matching(module, pairs, iterations):
+  starttime = time.time()
+  for i in range(iterations):
+    results = []
+    for native, latin in pairs:
+      messages = []
+      try:
+        result = module.tr_matching(native, latin, False, messages.append)
+      except RuntimeError as e:
+        result = "ERROR: %s" % e
+      results.append((result, messages))
+  return (time.time() - starttime) / iterations, results
+
+failed = False
+for modname in args.modules.split(","):
+  module = __import__(modname)
+  pairs = get_tr_matching_pairs(module)
+  for benchdesc, timefun in [
+    ("run_tests()", lambda mod: time_run_tests(mod, args.iterations)),
+    ("tr_matching() on %s pairs" % len(pairs), lambda mod: time_tr_matching(mod, pairs, args.iterations)),
+  ]:
+    results = []
+    if args.baseline_rev:
+      baseline = load_baseline_module(modname, args.baseline_rev)
+      results.append(("baseline %s" % args.baseline_rev,) + timefun(baseline))
+
+    saved_cache_size = module.tr_matching_cache_size
+    module.tr_matching_cache_size = 0
+    results.append(("uncached",) + timefun(module))
+    module.tr_matching_cache_size = saved_cache_size
+    module.tr_matching_cache.clear()
+    # Warm up the cache before timing.
+    timefun(module)
+    results.append(("cached",) + timefun(module))
+
+    print("%s: %s" % (modname, benchdesc))
+    reference_time = results[0][1]
+    reference_output = results[0][2]
+    for desc, elapsed, output in results:
+      same = output == reference_output
+      if not same:
+        failed = True
+      print("  %-30s %8.2f ms/run  %6.2fx  output %s" % (desc, elapsed * 1000,
+        reference_time / elapsed if elapsed > 0 else 0, "same" if same else "DIFFERENT"))
+
+if failed:
+  print("FAILED: output changed")
+  sys.exit(1)
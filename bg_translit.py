@@ -6,6 +6,7 @@ import re
 import unicodedata
 
 from blib import remove_links, msg
+import translitlib
 
 # FIXME:
 # 1. Converts grave-и to и with both acute and grave.
@@ -49,25 +50,36 @@ tt = {
 
 bulgarian_vowels = "АОУЯЮИЕЪЬѢѪаоуяюиеъьѣѫAEIOUĚǪaeiouěǫʹ"
 
+# Contextual rules for tr(), applied along with the table in tt in a single
+# pass; see translitlib.py.
+tr_rules = [
+    # Remove word-final hard sign
+    ("Ъ", "", None, ["$", r"[- \]]"]),
+    ("ъ", "", None, ["$", r"[- \]]"]),
+    # ьо becomes jo, Ьо becomes Jo
+    ("ь", "j", None, "[Оо]"),
+    ("Ь", "J", None, "[Оо]"),
+]
+
+tr_transliterator = translitlib.Transliterator(tr_rules, tt)
+
 # Transliterates text, which should be a single word or phrase. It should
 # include stress marks, which are then preserved in the transliteration.
 def tr(text, lang=None, sc=None, msgfun=msg):
     text = remove_links(text)
     text = tr_canonicalize_bulgarian(text)
 
-    # Remove word-final hard sign
-    text = rsub(text, "[Ъъ]($|[- \]])", r"\1")
-
-    # ьо becomes jo, Ьо becomes Jo
-    text = rsub(text, "ь(?=[Оо])", r"j")
-    text = rsub(text, "Ь(?=[Оо])", r"J")
-    text = rsub(text, '.', tt)
+    text = tr_transliterator.tr(text)
 
     # compose accented characters
     text = tr_canonicalize_latin(text)
 
     return text
 
+# Transliterate each string in TEXTS, returning a list of the results.
+def tr_many(texts, lang=None, sc=None, msgfun=msg):
+    return translitlib.tr_many(lambda text: tr(text, lang, sc, msgfun), texts)
+
 ############################################################################
 #                    Transliterate from Latin to Bulgarian                 #
 ############################################################################
@@ -501,17 +513,23 @@ def pre_canonicalize_latin(text, bulgarian=None, msgfun=msg):
     debprint("pre_canonicalize_latin: Exit, text=%s" % text)
     return text
 
+latin_composition = {
+    "a"+AC:"á", "e"+AC:"é", "i"+AC:"í",
+    "o"+AC:"ó", ""+AC:"ú", "y"+AC:"ý", "n"+AC:"ń",
+    "A"+AC:"Á", "E"+AC:"É", "I"+AC:"Í",
+    "O"+AC:"Ó", "U"+AC:"Ú", "Y"+AC:"Ý", "N"+AC:"Ń",
+    "a"+GR:"à", "e"+GR:"è", "i"+GR:"ì",
+    "o"+GR:"ò", ""+GR:"ù", "y"+GR:"ỳ",
+    "A"+GR:"À", "E"+GR:"È", "I"+GR:"Ì",
+    "O"+GR:"Ò", "U"+GR:"Ù", "Y"+GR:"Ỳ",
+}
+# Only vowels are recomposed.
+latin_composition_transliterator = translitlib.Transliterator(table=dict(
+    (k, v) for k, v in latin_composition.items() if k[0] in "aeiouyAEIOUY"))
+
 def tr_canonicalize_latin(text):
     # recompose accented letters
-    text = rsub(text, "[aeiouyAEIOUY][" + AC + GR + "]",
-        {"a"+AC:"á", "e"+AC:"é", "i"+AC:"í",
-         "o"+AC:"ó", ""+AC:"ú", "y"+AC:"ý", "n"+AC:"ń",
-         "A"+AC:"Á", "E"+AC:"É", "I"+AC:"Í",
-         "O"+AC:"Ó", "U"+AC:"Ú", "Y"+AC:"Ý", "N"+AC:"Ń",
-         "a"+GR:"à", "e"+GR:"è", "i"+GR:"ì",
-         "o"+GR:"ò", ""+GR:"ù", "y"+GR:"ỳ",
-         "A"+GR:"À", "E"+GR:"È", "I"+GR:"Ì",
-         "O"+GR:"Ò", "U"+GR:"Ù", "Y"+GR:"Ỳ",})
+    text = latin_composition_transliterator.tr(text)
 
     return text
 
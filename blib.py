@@ -3,13 +3,26 @@
 
 # Author: Benwing; bits and pieces taken from code written by CodeCat/Rua for MewBot
 
-import pywikibot, mwparserfromhell, re, string, sys, urllib, datetime, json, argparse, time
-from collections import defaultdict
+import pywikibot, mwparserfromhell, re, string, sys, urllib, datetime, json, argparse, time, io
+from collections import defaultdict, OrderedDict, deque
+import itertools
 import xml.sax
 import difflib
 import traceback
 import unicodedata
 import multiprocessing as mp
+import mmap
+import bisect
+import struct
+import zlib
+import pickle
+import sqlite3
+import hashlib
+import os
+import atexit
+import queue
+import random
+import threading
 from json.decoder import JSONDecodeError
 
 site = pywikibot.Site()
@@ -156,25 +169,185 @@ def escape_newline(text):
 def undo_escape_newline(text):
   return re.sub(r"\\([\\n])", lambda m: "\\" if m.group(1) == "\\" else "\n", text)
 
+# Logging. msg(), errmsg() and friends write through the log sink `log_sink`, which can be replaced using
+# set_log_sink(). A sink is an object with methods msg(), msgn(), errmsg(), errmsgn() and page_msg() (see below) and
+# flush(). Two sinks are provided: TextLogSink (the default), which writes messages as lines of text, and JSONLogSink,
+# selected using --log-format jsonl or by setting the environment variable BLIB_LOG_FORMAT to "jsonl" (which also
+# covers the messages output before the command line is parsed). JSONLogSink writes each message to stdout as a JSON
+# object on a line of its own (see make_log_record()); messages to stderr are still written as text. The functions
+# that read previous output (yield_pages_from_previous_output(), yield_text_from_find_regex(), FindRegexFile, etc.)
+# accept either format, and take the page index and title directly from the JSON records.
+#
+# Both sinks write each message with a single write() call to the current sys.stdout (which is replaced by a StringIO
+# in the worker processes of process_in_parallel()), rather than the several writes made by print(). When stdout isn't
+# a terminal, it's replaced at startup by an equivalent block-buffered stream with a larger buffer of
+# `log_buffer_size` bytes, unless Python was run with -u or PYTHONUNBUFFERED; set the environment variable
+# BLIB_LOG_BUFFER_SIZE to 0 to prevent this.
+log_buffer_size = int(os.environ.get("BLIB_LOG_BUFFER_SIZE", 65536))
+
+# Replace stdout with a stream with a buffer of `log_buffer_size` bytes if it isn't a terminal and unbuffered output
+# wasn't requested.
+def buffer_stdout():
+  if not log_buffer_size or sys.stdout is not sys.__stdout__:
+    return
+  # With -u or PYTHONUNBUFFERED, stdout writes through to an unbuffered binary stream.
+  if getattr(sys.stdout, "write_through", False):
+    return
+  try:
+    if sys.stdout.isatty():
+      return
+    fd = sys.stdout.fileno()
+  except (OSError, ValueError, io.UnsupportedOperation):
+    return
+  sys.stdout.flush()
+  sys.stdout = io.TextIOWrapper(io.BufferedWriter(io.FileIO(fd, "w", closefd=False), log_buffer_size),
+                                encoding=sys.stdout.encoding, errors=sys.stdout.errors)
+  atexit.register(sys.stdout.flush)
+
+class TextLogSink(object):
+  def msg(self, text):
+    sys.stdout.write(text + "\n")
+
+  def msgn(self, text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+  def errmsg(self, text):
+    sys.stderr.write(text + "\n")
+
+  def errmsgn(self, text):
+    sys.stderr.write(text)
+    sys.stderr.flush()
+
+  # Output TEXT as a message about page PAGETITLE with index INDEX.
+  def page_msg(self, index, pagetitle, text):
+    self.msg("Page %s %s: %s" % (index, pagetitle, text))
+
+  def flush(self):
+    sys.stdout.flush()
+
+# Prefix of each line output by JSONLogSink; used to tell JSON records from text lines.
+log_record_prefix = '{"level": '
+log_page_msg_re = re.compile(r"\APage ([0-9]+) (.*?): (.*)\Z", re.S)
+json_log_encoder = json.JSONEncoder(ensure_ascii=False)
+
+# Return the JSON log record for a message, as a dict with fields "level" ("warning" or "error" if TEXT begins with
+# WARNING or ERROR, else "info"), "index" and "title" (only for messages about a page) and "msg". If INDEX is None,
+# TEXT is checked for the form "Page INDEX TITLE: MESSAGE" output by the pagemsg() functions in the scripts.
+def make_log_record(text, index=None, pagetitle=None):
+  if index is None and text.startswith("Page "):
+    m = log_page_msg_re.search(text)
+    if m:
+      index, pagetitle, text = m.groups()
+      if str(int(index)) == index:
+        index = int(index)
+  if text.startswith("WARNING"):
+    level = "warning"
+  elif text.startswith("ERROR"):
+    level = "error"
+  else:
+    level = "info"
+  if pagetitle is None:
+    return {"level": level, "msg": text}
+  return {"level": level, "index": index, "title": pagetitle, "msg": text}
+
+class JSONLogSink(TextLogSink):
+  def __init__(self):
+    # Text output using msgn() that hasn't been ended by a call to msg().
+    self.partial = ""
+
+  def write_record(self, record):
+    sys.stdout.write(json_log_encoder.encode(record) + "\n")
+
+  def msg(self, text):
+    if self.partial:
+      text = self.partial + text
+      self.partial = ""
+    self.write_record(make_log_record(text))
+
+  def msgn(self, text):
+    self.partial += text
+
+  def page_msg(self, index, pagetitle, text):
+    if self.partial:
+      self.msg("")
+    self.write_record(make_log_record(text, index, pagetitle))
+
+  def flush(self):
+    if self.partial:
+      self.msg("")
+    sys.stdout.flush()
+
+log_sinks = {"text": TextLogSink, "jsonl": JSONLogSink}
+log_sink = log_sinks[os.environ.get("BLIB_LOG_FORMAT") or "text"]()
+
+def set_log_sink(sink):
+  global log_sink
+  with log_lock:
+    log_sink.flush()
+    log_sink = sink
+
+def set_log_format(log_format):
+  set_log_sink(log_sinks[log_format]())
+
+class LogFormatArgAction(argparse.Action):
+  def __call__(self, parser, namespace, values, option_string=None):
+    setattr(namespace, self.dest, values)
+    set_log_format(values)
+
+# If LINE is a record output by JSONLogSink, return it as a dict, else None.
+def decode_log_record(line):
+  if not line.startswith(log_record_prefix):
+    return None
+  try:
+    return json.loads(line)
+  except ValueError:
+    return None
+
+# Convert a record output by JSONLogSink back into the corresponding text line (without a newline).
+def log_record_to_text(record):
+  if "title" in record:
+    return "Page %s %s: %s" % (record["index"], record["title"], record["msg"])
+  return record["msg"]
+
+# Serializes output to the log sink, which is written to by the worker threads of SaveScheduler as well as the main
+# thread.
+log_lock = threading.RLock()
+
 def msg(text):
-  print(text)
+  with log_lock:
+    log_sink.msg(text)
 
 def msgn(text):
-  print(text, end='', flush=True)
+  with log_lock:
+    log_sink.msgn(text)
 
 def errmsg(text):
-  print(text, file=sys.stderr)
+  with log_lock:
+    log_sink.errmsg(text)
 
 def errmsgn(text):
-  print(text, end='', file=sys.stderr, flush=True)
+  with log_lock:
+    log_sink.errmsgn(text)
+
+# Output TEXT as a message about page PAGETITLE with index INDEX, in the form "Page INDEX PAGETITLE: TEXT". This is
+# what the pagemsg() functions in the scripts do using msg(), but saves JSONLogSink from having to parse out the index
+# and title.
+def page_msg(index, pagetitle, text):
+  with log_lock:
+    log_sink.page_msg(index, pagetitle, text)
+
+buffer_stdout()
 
 def errandmsg(text):
-  msg(text)
-  errmsg(text)
+  with log_lock:
+    msg(text)
+    errmsg(text)
 
 def errandmsgn(text):
-  msgn(text)
-  errmsgn(text)
+  with log_lock:
+    msgn(text)
+    errmsgn(text)
 
 def rsub_repeatedly(fr, to, text, count=0, flags=0):
   while True:
@@ -188,12 +361,430 @@ def ucfirst(txt):
     return txt
   return txt[0].upper() + txt[1:]
 
-def parse_text(text):
-  return mwparserfromhell.parser.Parser().parse(text, skip_style_tags=True)
+# Cache of parse trees for parse_text(), so that text parsed more than once in a run (e.g. by do_edit() and again by the
+# processing function, or by several helper functions) isn't parsed again each time. The cache is keyed by the text
+# itself and holds up to `parse_cache_size` texts, dropping the least recently used ones. Callers usually modify the
+# tree they get back, so each entry holds a pickled copy of the tree, from which an independent copy can be made in
+# about half the time it takes to parse the text. Callers that don't modify the tree can pass `readonly=True` to
+# parse_text() to share a single copy instead. The first parse of a text only records that it has been seen; the
+# pickled copy is made when the text is parsed a second time (which parses it again), so text that is parsed only once
+# (most text in a dump run) costs nothing extra, and the third and later parses are unpicklings. Each entry is a list
+# [PICKLED_TREE, SHARED_TREE], either of which may be None.
+parse_cache_size = 50
+parse_cache = OrderedDict()
+# If set (using --parse-stats), output the number of calls to parse_text() and the time spent in it for each page,
+# and the totals at the end of the run.
+show_parse_stats = False
+
+class ParseStats(object):
+  def __init__(self):
+    self.calls = 0
+    self.cache_hits = 0
+    self.secs = 0.0
+
+  # Return the current counts, to be passed to describe() to get the counts since this point.
+  def snapshot(self):
+    return (self.calls, self.cache_hits, self.secs)
+
+  def describe(self, since=(0, 0, 0.0)):
+    return "%s calls, %s from cache, %.1f ms" % (self.calls - since[0], self.cache_hits - since[1],
+                                                 (self.secs - since[2]) * 1000)
+
+parse_stats = ParseStats()
+
+# Parse TEXT into an mwparserfromhell tree. If READONLY, the caller promises not to modify the tree, which may then be
+# shared with other callers parsing the same text; otherwise the caller gets its own copy. See `parse_cache`.
+def parse_text(text, readonly=False):
+  def do_parse():
+    return mwparserfromhell.parser.Parser().parse(text, skip_style_tags=True)
+
+  starttime = time.time()
+  parse_stats.calls += 1
+  try:
+    if not parse_cache_size:
+      return do_parse()
+    entry = parse_cache.get(text)
+    if entry is None:
+      tree = do_parse()
+      parse_cache[text] = [None, tree if readonly else None]
+      while len(parse_cache) > parse_cache_size:
+        parse_cache.popitem(last=False)
+      return tree
+    parse_cache.move_to_end(text)
+    pickled_tree, shared_tree = entry
+    if readonly:
+      if shared_tree is None:
+        if pickled_tree is None:
+          shared_tree = do_parse()
+        else:
+          shared_tree = pickle.loads(pickled_tree)
+          parse_stats.cache_hits += 1
+        entry[1] = shared_tree
+      else:
+        parse_stats.cache_hits += 1
+      return shared_tree
+    if pickled_tree is None:
+      if shared_tree is None:
+        # Second time parsing this text; save a copy for next time.
+        tree = do_parse()
+        entry[0] = pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+        return tree
+      pickled_tree = entry[0] = pickle.dumps(shared_tree, pickle.HIGHEST_PROTOCOL)
+    parse_stats.cache_hits += 1
+    return pickle.loads(pickled_tree)
+  finally:
+    parse_stats.secs += time.time() - starttime
 
 def parse(page):
   return parse_text(page.text)
 
+# Fast template scanning. Most scripts only look at the templates on a page, but parse_text() parses everything (links,
+# tags, headings, etc.). scan_templates() instead finds the templates using a lightweight tokenizer that only tracks
+# the constructs that determine where templates and their parameters begin and end, and returns a ScannedText object
+# that can be used in place of the parse tree in the usual pattern:
+#
+#   parsed = blib.scan_templates(text, ["form of", "inflection of"])
+#   for t in parsed.filter_templates():
+#     ...
+#   return str(parsed), notes
+#
+# The templates returned by filter_templates() support the read-only parts of the mwparserfromhell Template interface
+# (`name`, `params`, has(), get() and str()) and hence work with tname(), getparam(), fetch_param_chain(), etc. The
+# first time a template is modified (by setting its name, calling add() or remove(), modifying its parameter list or
+# a parameter's name or value, or accessing any other Template attribute), the outermost template containing it is
+# parsed using parse_text() and the template is replaced by the corresponding mwparserfromhell node, which is what
+# gets modified; str() of the ScannedText incorporates the modifications. Text that the tokenizer might not split the
+# same way as mwparserfromhell (e.g. because of template arguments {{{...}}}, <nowiki> and similar tags, unclosed
+# comments or templates, invalid template names, or HTML tags, external links, tables or headings inside of
+# templates) is instead parsed in full, and filter_templates() then returns the mwparserfromhell nodes. Either way,
+# the templates returned match those returned by parse_text(text).filter_templates(); compare_template_scan.py checks
+# this on a dump.
+#
+# If NAMES is given, filter_templates() returns only the templates whose name (as returned by tname()) is in NAMES,
+# and text that doesn't contain any of the names as a substring isn't scanned at all.
+
+class TemplateScanFallback(Exception):
+  pass
+
+# Text containing these is parsed in full: template arguments and tags whose contents aren't parsed.
+template_scan_fallback_re = re.compile(r"\{\{\{|<\s*/?\s*(?:%s)\b" %
+                                       "|".join(mwparserfromhell.definitions.PARSER_BLACKLIST), re.I)
+template_scan_toplevel_re = re.compile(r"\{\{|<!--")
+template_scan_token_re = re.compile(r"\{\{|\}\}|\[\[|\]\]|\||=|<!--|<|\[|\{\|")
+template_scan_link_title_re = re.compile(r"[^\n\[\]{}<>|]*(?:\||\]\])")
+template_scan_ext_link_re = re.compile(r"[A-Za-z][A-Za-z0-9+.\-]*:|//")
+template_scan_tag_re = re.compile(r"</?[A-Za-z0-9_]+[\s/>]")
+template_scan_safe_tag_re = re.compile(r"<(?:br|hr|wbr)\s*/?>", re.I)
+template_scan_invalid_name_re = re.compile(r"[\n\[\]{}<>]")
+
+# Tokenize TEXT, returning a list of [START, END, NAME_END, PARAMS, GROUP] for each template, ordered by starting
+# position (the order of filter_templates()). PARAMS is a list of [START, EQUALS_POS, END] for each parameter, where
+# EQUALS_POS is None for a positional parameter, and GROUP is the index in the list of the outermost template
+# containing the template. Raise TemplateScanFallback if the text needs to be parsed in full.
+def scan_template_spans(text):
+  def fallback():
+    raise TemplateScanFallback()
+
+  def end_part(span, endpos):
+    if span[2] is None:
+      span[2] = endpos
+      name = text[span[0] + 2:endpos]
+      if "<!--" in name:
+        name = re.sub("<!--.*?-->", "", name, 0, re.S)
+      name = name.strip()
+      if not name or template_scan_invalid_name_re.search(name):
+        fallback()
+    else:
+      span[3][-1][2] = endpos
+
+  if template_scan_fallback_re.search(text):
+    fallback()
+  spans = []
+  pos = 0
+  while True:
+    m = template_scan_toplevel_re.search(text, pos)
+    if not m:
+      return spans
+    pos = m.end()
+    if m.group(0) == "<!--":
+      pos = text.find("-->", pos)
+      if pos < 0:
+        fallback()
+      pos += 3
+      continue
+    group = len(spans)
+    span = [m.start(), None, None, [], group]
+    spans.append(span)
+    # Stack of the open templates (as spans) and links (as None) within the outermost template.
+    stack = [span]
+    while stack:
+      m = template_scan_token_re.search(text, pos)
+      if not m:
+        fallback()
+      tok = m.group(0)
+      tokpos = m.start()
+      pos = m.end()
+      top = stack[-1]
+      if tok == "|":
+        if top is not None:
+          end_part(top, tokpos)
+          top[3].append([pos, None, None])
+      elif tok == "=":
+        # A heading inside of a template protects its equal signs.
+        if text[tokpos - 1] == "\n":
+          fallback()
+        if top is not None and top[3] and top[3][-1][1] is None:
+          # mwparserfromhell fails to parse a template whose parameter name contains a brace directly after a
+          # nested template.
+          if "}}{" in text[top[3][-1][0]:tokpos]:
+            fallback()
+          top[3][-1][1] = tokpos
+      elif tok == "{{":
+        span = [tokpos, None, None, [], group]
+        spans.append(span)
+        stack.append(span)
+      elif tok == "}}":
+        if top is None:
+          fallback()
+        end_part(top, tokpos)
+        top[1] = pos
+        stack.pop()
+      elif tok == "[[":
+        if not template_scan_link_title_re.match(text, pos):
+          fallback()
+        stack.append(None)
+      elif tok == "]]":
+        # A ]] that doesn't close a link is ordinary text.
+        if top is None:
+          stack.pop()
+      elif tok == "<!--":
+        pos = text.find("-->", pos)
+        if pos < 0:
+          fallback()
+        pos += 3
+      elif tok == "<":
+        if template_scan_tag_re.match(text, tokpos) and not template_scan_safe_tag_re.match(text, tokpos):
+          fallback()
+      elif tok == "[":
+        if template_scan_ext_link_re.match(text, pos):
+          fallback()
+      else:
+        # A table.
+        fallback()
+
+# Replace any ScannedParameter in ARG (or in ARG if it's a list) with the corresponding mwparserfromhell Parameter,
+# parsing the template it belongs to.
+def upgrade_scanned_param(arg):
+  if isinstance(arg, ScannedParameter):
+    return arg.upgrade()
+  if isinstance(arg, list):
+    return [upgrade_scanned_param(x) for x in arg]
+  return arg
+
+class ScannedText(object):
+  def __init__(self, text, names=None):
+    self.text = text
+    self.names = None if names is None else set(names)
+    # The full parse tree, if the text had to be parsed in full.
+    self.parsed = None
+    self.templates = []
+    # Parse trees of the outermost templates that have been parsed so they can be modified, indexed by the position of
+    # the outermost template in `self.templates`.
+    self.group_trees = {}
+    if self.names is not None and not any(name in text for name in self.names):
+      return
+    try:
+      spans = scan_template_spans(text)
+    except TemplateScanFallback:
+      self.parsed = parse_text(text)
+      return
+    self.templates = [ScannedTemplate(self, span) for span in spans]
+
+  def filter_templates(self):
+    templates = self.templates if self.parsed is None else self.parsed.filter_templates()
+    if self.names is None:
+      return list(templates)
+    return [t for t in templates if tname(t) in self.names]
+
+  # Parse the outermost template at position GROUP in `self.templates` and replace it and the templates inside of it
+  # with the corresponding mwparserfromhell nodes.
+  def upgrade_group(self, group):
+    start, end = self.templates[group].span[0:2]
+    tree = parse_text(self.text[start:end])
+    nodes = tree.filter_templates()
+    members = list(itertools.takewhile(lambda t: t.span[4] == group, self.templates[group:]))
+    if len(nodes) != len(members):
+      raise AssertionError("Scanned %s templates but parsed %s in %s" % (len(members), len(nodes),
+                                                                       self.text[start:end]))
+    for t, node in zip(members, nodes):
+      t.node = node
+      t.node_params = list(node.params)
+    self.group_trees[group] = tree
+
+  def __str__(self):
+    if self.parsed is not None:
+      return str(self.parsed)
+    parts = []
+    pos = 0
+    for group, tree in sorted(self.group_trees.items()):
+      start, end = self.templates[group].span[0:2]
+      parts.append(self.text[pos:start])
+      parts.append(str(tree))
+      pos = end
+    parts.append(self.text[pos:])
+    return "".join(parts)
+
+class ScannedTemplate(object):
+  def __init__(self, scanned, span):
+    self.scanned = scanned
+    self.span = span
+    # The mwparserfromhell node, once the template has been parsed, and the node's original parameters (corresponding
+    # to the scanned parameters).
+    self.node = None
+    self.node_params = None
+    self.scanned_params = None
+
+  # Parse the template if not already done and return the mwparserfromhell node.
+  def upgrade(self):
+    if self.node is None:
+      self.scanned.upgrade_group(self.span[4])
+    return self.node
+
+  @property
+  def name(self):
+    if self.node is not None:
+      return self.node.name
+    return self.scanned.text[self.span[0] + 2:self.span[2]]
+
+  @name.setter
+  def name(self, value):
+    self.upgrade().name = value
+
+  @property
+  def params(self):
+    if self.node is not None:
+      return self.node.params
+    if self.scanned_params is None:
+      text = self.scanned.text
+      params = []
+      posno = 0
+      for index, (start, equals_pos, end) in enumerate(self.span[3]):
+        if equals_pos is None:
+          posno += 1
+          params.append(ScannedParameter(self, index, str(posno), text[start:end], False))
+        else:
+          params.append(ScannedParameter(self, index, text[start:equals_pos], text[equals_pos + 1:end], True))
+      self.scanned_params = ScannedParameterList(self, params)
+    return self.scanned_params
+
+  # Same as Template.has() and Template.get() in mwparserfromhell.
+  def has(self, name, ignore_empty=False):
+    name = str(name).strip()
+    for param in self.params:
+      if param.name.strip() == name:
+        if ignore_empty and not param.value.strip():
+          continue
+        return True
+    return False
+
+  def get(self, name, *default):
+    name = str(name).strip()
+    for param in reversed(self.params):
+      if param.name.strip() == name:
+        return param
+    if default:
+      return default[0]
+    raise ValueError(name)
+
+  def add(self, *args, **kwargs):
+    return self.upgrade().add(*upgrade_scanned_param(list(args)),
+                              **{key: upgrade_scanned_param(value) for key, value in kwargs.items()})
+
+  def remove(self, *args, **kwargs):
+    return self.upgrade().remove(*upgrade_scanned_param(list(args)), **kwargs)
+
+  def __getattr__(self, attr):
+    if attr.startswith("__") or attr in ["scanned", "span", "node", "node_params", "scanned_params"]:
+      raise AttributeError(attr)
+    return getattr(self.upgrade(), attr)
+
+  def __str__(self):
+    if self.node is not None:
+      return str(self.node)
+    return self.scanned.text[self.span[0]:self.span[1]]
+
+  def __repr__(self):
+    return "ScannedTemplate(%r)" % str(self)
+
+# The parameter list of a ScannedTemplate. Modifying it parses the template and modifies the mwparserfromhell
+# node's parameter list instead.
+class ScannedParameterList(list):
+  def __init__(self, template, params):
+    super().__init__(params)
+    self.template = template
+
+def make_scanned_param_list_modifier(method):
+  def modify(self, *args, **kwargs):
+    params = self.template.upgrade().params
+    return getattr(params, method)(*upgrade_scanned_param(list(args)), **kwargs)
+  return modify
+
+for scanned_param_list_method in ["__setitem__", "__delitem__", "__iadd__", "append", "extend", "insert", "pop",
+                                  "remove", "clear", "sort", "reverse"]:
+  setattr(ScannedParameterList, scanned_param_list_method,
+          make_scanned_param_list_modifier(scanned_param_list_method))
+
+class ScannedParameter(object):
+  def __init__(self, template, index, name, value, showkey):
+    self.template = template
+    self.index = index
+    self.scanned_name = name
+    self.scanned_value = value
+    self.scanned_showkey = showkey
+
+  # Parse the template this parameter belongs to if not already done and return the mwparserfromhell Parameter.
+  def upgrade(self):
+    self.template.upgrade()
+    return self.template.node_params[self.index]
+
+  @property
+  def name(self):
+    return self.upgrade().name if self.template.node is not None else self.scanned_name
+
+  @name.setter
+  def name(self, value):
+    self.upgrade().name = value
+
+  @property
+  def value(self):
+    return self.upgrade().value if self.template.node is not None else self.scanned_value
+
+  @value.setter
+  def value(self, value):
+    self.upgrade().value = value
+
+  @property
+  def showkey(self):
+    return self.upgrade().showkey if self.template.node is not None else self.scanned_showkey
+
+  @showkey.setter
+  def showkey(self, value):
+    self.upgrade().showkey = value
+
+  def __str__(self):
+    if self.template.node is not None:
+      return str(self.upgrade())
+    if self.scanned_showkey:
+      return "%s=%s" % (self.scanned_name, self.scanned_value)
+    return self.scanned_value
+
+  def __repr__(self):
+    return "ScannedParameter(%r)" % str(self)
+
+# Scan TEXT for templates, returning a ScannedText object. See above.
+def scan_templates(text, names=None):
+  return ScannedText(text, names)
+
 def getparam(template, param):
   if template.has(param):
     return str(template.get(param).value)
@@ -504,13 +1095,17 @@ def show_diff(existing_text, newtext):
   newlines = newtext.splitlines(True)
   diff = difflib.unified_diff(oldlines, newlines)
   dangling_newline = False
+  difflines = []
   for line in diff:
     dangling_newline = not line.endswith('\n')
-    sys.stdout.write(line)
+    difflines.append(line)
     if dangling_newline:
-      sys.stdout.write("\n")
+      difflines.append("\n")
   if dangling_newline:
-    sys.stdout.write("\\ No newline at end of file\n")
+    difflines.append("\\ No newline at end of file\n")
+  # Output as a single message (without the final newline, which msg() adds) so that it makes a single JSON record.
+  if difflines:
+    msg("".join(difflines)[:-1])
   #pywikibot.showDiff(existing_text, new, context=3)
 
 def normalize_text_for_save(text):
@@ -544,10 +1139,272 @@ def handle_process_page_retval(retval, existing_text, pagemsg, verbose, do_diff)
   comment = changelog_to_string(comment)
   return new, comment, has_changed
 
-def expand_text(tempcall, pagetitle, pagemsg, verbose, suppress_errors=False):
-  if verbose:
-    pagemsg("Expanding text: %s" % tempcall)
-  result = try_repeatedly(lambda: site.expand_text(tempcall, title=pagetitle), pagemsg, "expand text: %s" % tempcall, bad_value_ret='<strong class="error">Invalid title</strong>')
+# Persistent on-disk cache of the results of expand_text(), keyed by the template call and page title. Enabled using
+# --expand-text-cache FILE (see create_argparser()). Each entry records a signature computed from the latest revision
+# IDs of the templates and modules the call depends on, and is treated as a miss if any of them has since changed. The
+# dependencies of a call are the templates and modules named directly in it (including those invoked using
+# {{#invoke:...}}) along with everything they in turn transclude, as recorded by MediaWiki; these are looked up once
+# per run per template or module. Once the total size of the cached results exceeds `max_size` bytes, the least
+# recently used entries are evicted. Error results (see is_error()) aren't cached.
+class ExpandTextCache(object):
+  def __init__(self, filename, max_size):
+    self.filename = filename
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+    self.stale = 0
+    self.evicted = 0
+    # Map from template or module page title to a dictionary of its dependencies and their revision IDs.
+    self.deps_by_page = {}
+    self.pending_writes = 0
+    self.pid = None
+    self.conn = None
+    atexit.register(self.commit)
+
+  def connect(self):
+    # Reconnect if we're in a worker process forked off by process_in_parallel(); SQLite connections can't be shared
+    # across processes.
+    if self.conn is None or self.pid != os.getpid():
+      self.conn = sqlite3.connect(self.filename, timeout=60)
+      self.pid = os.getpid()
+      self.conn.execute("""CREATE TABLE IF NOT EXISTS expansions (
+        tempcall TEXT, pagetitle TEXT, depsig TEXT, result TEXT, size INTEGER, atime REAL,
+        PRIMARY KEY (tempcall, pagetitle))""")
+      self.conn.execute("CREATE INDEX IF NOT EXISTS expansions_atime ON expansions (atime)")
+      self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM expansions").fetchone()[0]
+    return self.conn
+
+  def commit(self):
+    if self.conn is not None and self.pid == os.getpid() and self.pending_writes:
+      self.conn.commit()
+      self.pending_writes = 0
+
+  def note_write(self):
+    self.pending_writes += 1
+    if self.pending_writes >= 100:
+      self.commit()
+
+  # Return the pages directly named in template call `tempcall`. Parser functions and magic words are skipped.
+  def pages_named_in_call(self, tempcall):
+    pages = set()
+    for m in re.finditer(r"\{\{\s*([^{}|]*?)\s*(?=[|}])", tempcall):
+      name = m.group(1)
+      if name.startswith("#invoke:"):
+        pages.add("Module:" + name[8:].strip())
+      elif not name or name.startswith("#") or re.search("^[A-Z]+$", name):
+        continue
+      elif ":" in name:
+        if re.search("^(Template|Module):", name):
+          pages.add(name)
+      else:
+        pages.add("Template:" + name)
+    return pages
+
+  def page_deps(self, pagetitle, pagemsg):
+    if pagetitle not in self.deps_by_page:
+      def fetch_deps():
+        page = pywikibot.Page(site, pagetitle)
+        pages = [page] + list(page.templates())
+        return {str(dep.title()): dep.latest_revision_id if dep.exists() else 0
+                for dep in site.preloadpages(pages, content=False)}
+      self.deps_by_page[pagetitle] = try_repeatedly(fetch_deps, pagemsg,
+          "fetch dependencies of %s for expand_text() cache" % pagetitle)
+    return self.deps_by_page[pagetitle]
+
+  # Return the dependency signature for `tempcall`, or None if the dependencies couldn't be determined (in which case
+  # the call isn't cached).
+  def dependency_signature(self, tempcall, pagemsg):
+    deps = {}
+    for pagetitle in self.pages_named_in_call(tempcall):
+      page_deps = self.page_deps(pagetitle, pagemsg)
+      if page_deps is None:
+        return None
+      deps.update(page_deps)
+    depstr = "\n".join("%s=%s" % (title, revid) for title, revid in sorted(deps.items()))
+    return hashlib.sha1(depstr.encode("utf-8")).hexdigest()
+
+  def evict(self):
+    conn = self.connect()
+    target_size = int(self.max_size * 0.9)
+    rows = conn.execute("SELECT tempcall, pagetitle, size FROM expansions ORDER BY atime").fetchall()
+    for tempcall, pagetitle, size in rows:
+      if self.total_size <= target_size:
+        break
+      conn.execute("DELETE FROM expansions WHERE tempcall = ? AND pagetitle = ?", (tempcall, pagetitle))
+      self.total_size -= size
+      self.evicted += 1
+    self.conn.commit()
+    self.pending_writes = 0
+
+  # Look up `tempcall` as expanded on page `pagetitle`. Return a tuple (DEPSIG, RESULT), where DEPSIG is the dependency
+  # signature to pass to store() (None if the call can't be cached) and RESULT is the cached raw result or None on a
+  # cache miss.
+  def lookup(self, tempcall, pagetitle, pagemsg):
+    conn = self.connect()
+    depsig = self.dependency_signature(tempcall, pagemsg)
+    if depsig is None:
+      self.misses += 1
+      return None, None
+    row = conn.execute("SELECT depsig, result FROM expansions WHERE tempcall = ? AND pagetitle = ?",
+                       (tempcall, pagetitle)).fetchone()
+    if row is not None and row[0] == depsig and not self.is_error(row[1]):
+      self.hits += 1
+      conn.execute("UPDATE expansions SET atime = ? WHERE tempcall = ? AND pagetitle = ?",
+                   (time.time(), tempcall, pagetitle))
+      self.note_write()
+      return depsig, row[1]
+    if row is not None:
+      self.stale += 1
+    self.misses += 1
+    return depsig, None
+
+  # Return True if `result` is an error (e.g. an invalid title or a Lua error, which may be transient), which shouldn't be
+  # cached.
+  @staticmethod
+  def is_error(result):
+    return result.startswith('<strong class="error">')
+
+  def store(self, tempcall, pagetitle, depsig, result):
+    if depsig is None or result is None or self.is_error(result):
+      return
+    conn = self.connect()
+    size = len(tempcall) + len(pagetitle) + len(result)
+    oldrow = conn.execute("SELECT size FROM expansions WHERE tempcall = ? AND pagetitle = ?",
+                          (tempcall, pagetitle)).fetchone()
+    if oldrow is not None:
+      self.total_size -= oldrow[0]
+    conn.execute("INSERT OR REPLACE INTO expansions VALUES (?, ?, ?, ?, ?, ?)",
+                 (tempcall, pagetitle, depsig, result, size, time.time()))
+    self.total_size += size
+    self.note_write()
+    if self.total_size > self.max_size:
+      self.evict()
+
+  def expand(self, tempcall, pagetitle, pagemsg):
+    depsig, result = self.lookup(tempcall, pagetitle, pagemsg)
+    if result is None:
+      result = site_expand_text(tempcall, pagetitle, pagemsg)
+      self.store(tempcall, pagetitle, depsig, result)
+    return result
+
+  def stats(self):
+    return "%s hits, %s misses (%s stale), %s evicted" % (self.hits, self.misses, self.stale, self.evicted)
+
+expand_text_cache_file = None
+expand_text_cache_max_mb = 1024
+expand_text_cache = None
+local_lua_dir = None
+lua_engine = None
+
+# Set by --save; see get_dump_store().
+saving_pages = False
+
+# Action for --save, which also records globally that pages are being saved.
+class SaveArgAction(argparse._StoreTrueAction):
+  def __call__(self, parser, namespace, values, option_string=None):
+    global saving_pages
+    super().__call__(parser, namespace, values, option_string)
+    saving_pages = True
+
+# Arguments parsed by the parser returned by create_argparser(), or None if it hasn't been used; see get_since_state().
+parsed_args = None
+
+# Parser returned by create_argparser(), which records the parsed arguments globally.
+class BlibArgumentParser(argparse.ArgumentParser):
+  def parse_known_args(self, args=None, namespace=None):
+    global parsed_args
+    namespace, extras = super().parse_known_args(args, namespace)
+    parsed_args = namespace
+    return namespace, extras
+
+# argparse action for arguments such as --expand-text-cache that set the blib global variable of the same name as the
+# argument's `dest`, so that the corresponding feature gets enabled without any cooperation from the script. The
+# objects implementing the feature (e.g. the expand_text() cache) are created on first use.
+# Flags are declared with nargs=0 and const=True.
+class GlobalSettingArgAction(argparse.Action):
+  def __call__(self, parser, namespace, values, option_string=None):
+    if self.nargs == 0:
+      values = self.const
+    setattr(namespace, self.dest, values)
+    globals()[self.dest] = values
+
+def get_expand_text_cache():
+  global expand_text_cache
+  if expand_text_cache is None and expand_text_cache_file:
+    expand_text_cache = ExpandTextCache(expand_text_cache_file, expand_text_cache_max_mb * 1024 * 1024)
+  return expand_text_cache
+
+def site_expand_text(tempcall, pagetitle, pagemsg):
+  return try_repeatedly(lambda: site.expand_text(tempcall, title=pagetitle), pagemsg, "expand text: %s" % tempcall, bad_value_ret='<strong class="error">Invalid title</strong>')
+
+# Return the engine for running Lua modules locally if --local-lua was given, else None. See lualib.py.
+def get_lua_engine():
+  global lua_engine
+  if lua_engine is None and local_lua_dir:
+    import lualib
+    def errandpagemsg_for(pagetitle):
+      return lambda txt: errandmsg("Page %s: %s" % (pagetitle, txt))
+    def fetch_module_source(name):
+      pagetitle = "Module:%s" % name
+      page = pywikibot.Page(site, pagetitle)
+      if not safe_page_exists(page, errandpagemsg_for(pagetitle)):
+        return None
+      return safe_page_text(page, errandpagemsg_for(pagetitle))
+    lua_engine = lualib.LuaEngine(local_lua_dir, fetch_module_source=fetch_module_source,
+      expand_remote=lambda text, pagetitle: site_expand_text(text, pagetitle, errandpagemsg_for(pagetitle)),
+      page_exists=lambda title: safe_page_exists(pywikibot.Page(site, title), errandpagemsg_for(title)),
+      page_text=lambda title: safe_page_text(pywikibot.Page(site, title), errandpagemsg_for(title)))
+  return lua_engine
+
+# Try to expand `tempcall` using the local Lua engine (see get_lua_engine()). This handles a single call to #invoke or
+# to one of the wrapper templates in lualib.local_lua_templates whose arguments contain no further templates, tags or
+# comments needing preprocessing. Return the expansion, or None if the call can't be handled locally or failed, in
+# which case it should be expanded by the wiki.
+def expand_text_locally(tempcall, pagetitle, pagemsg, verbose):
+  engine = get_lua_engine()
+  if not engine:
+    return None
+  import lualib
+  parsed = parse_text(tempcall.strip(), readonly=True)
+  if len(parsed.nodes) != 1 or not isinstance(parsed.nodes[0], mwparserfromhell.nodes.Template):
+    return None
+  t = parsed.nodes[0]
+  tname = str(t.name).strip()
+  args = {}
+  for param in t.params:
+    value = str(param.value)
+    if "{" in value or "<" in value:
+      return None
+    pname = str(param.name).strip()
+    if param.showkey:
+      value = value.strip()
+    args[int(pname) if re.search("^[0-9]+$", pname) else pname] = value
+  if tname.startswith("#invoke:"):
+    module = tname[len("#invoke:"):].strip()
+    if 1 not in args:
+      return None
+    function = args[1].strip()
+    args = {(k - 1 if isinstance(k, int) else k): v for k, v in args.items() if k != 1}
+    parent_args = None
+  else:
+    tname = re.sub("^Template:", "", tname).replace("_", " ")
+    if tname not in lualib.local_lua_templates:
+      return None
+    module, function, frame_args = lualib.local_lua_templates[tname]
+    parent_args = args
+    args = frame_args
+  try:
+    result = engine.invoke(module, function, args, pagetitle, parent_args=parent_args,
+      parent_title="Template:%s" % tname if parent_args is not None else None)
+  except lualib.LuaEngineError as e:
+    if verbose:
+      pagemsg("Can't expand locally, expanding using the wiki: %s: %s" % (tempcall, e))
+    return None
+  return result
+
+# Convert the raw result of expanding `tempcall` into the return value of expand_text(), i.e. the result itself or
+# False on error (after outputting a warning unless `suppress_errors`).
+def process_expand_text_result(tempcall, result, pagemsg, verbose, suppress_errors=False):
   if verbose:
     pagemsg("Raw result is %s" % result)
   if result.startswith('<strong class="error">'):
@@ -559,6 +1416,73 @@ def expand_text(tempcall, pagetitle, pagemsg, verbose, suppress_errors=False):
     return False
   return result
 
+def expand_text(tempcall, pagetitle, pagemsg, verbose, suppress_errors=False):
+  if verbose:
+    pagemsg("Expanding text: %s" % tempcall)
+  cache = get_expand_text_cache()
+  result = expand_text_locally(tempcall, pagetitle, pagemsg, verbose)
+  if result is None:
+    if cache:
+      result = cache.expand(tempcall, pagetitle, pagemsg)
+    else:
+      result = site_expand_text(tempcall, pagetitle, pagemsg)
+  return process_expand_text_result(tempcall, result, pagemsg, verbose, suppress_errors)
+
+# Expand several template calls in as few API requests as possible, all on page `pagetitle`. Return a list of results,
+# one per call in `tempcalls`, each as returned by expand_text(). Up to `batch_size` calls are joined into a single
+# request, each call preceded by a line containing a unique sentinel, and the expansion is split on the sentinels. Each
+# call begins a line, as when expanded individually, so templates whose output begins with a list or table behave the
+# same way. If a batched request fails or the sentinels don't come back intact, the calls in that batch are expanded
+# individually. Calls already in the expand_text() cache (if enabled) aren't sent at all.
+def expand_text_batch(tempcalls, pagetitle, pagemsg, verbose, suppress_errors=False, batch_size=50):
+  cache = get_expand_text_cache()
+  raw_results = [None] * len(tempcalls)
+  depsigs = [None] * len(tempcalls)
+  to_expand = []
+  for i, tempcall in enumerate(tempcalls):
+    if verbose:
+      pagemsg("Expanding text: %s" % tempcall)
+    raw_results[i] = expand_text_locally(tempcall, pagetitle, pagemsg, verbose)
+    if raw_results[i] is None and cache:
+      depsigs[i], raw_results[i] = cache.lookup(tempcall, pagetitle, pagemsg)
+    if raw_results[i] is None:
+      to_expand.append(i)
+
+  def expand_batch(indices):
+    token = "BLIB-BATCH-%s" % hashlib.sha1(("%s\n%s" % (time.time(), indices)).encode("utf-8")).hexdigest()
+    def sentinel(n):
+      return "<%s-%s>\n" % (token, n)
+    batch_text = "".join(sentinel(n) + tempcalls[i] + "\n" for n, i in enumerate(indices)) + sentinel(len(indices))
+    try:
+      result = site.expand_text(batch_text, title=pagetitle)
+    except KeyboardInterrupt:
+      raise
+    except Exception as e:
+      pagemsg("WARNING: Error expanding batch of %s template calls, expanding individually: %s" % (len(indices), e))
+      return None
+    pieces = re.split("<%s-([0-9]+)>\n" % token, result)
+    # We expect the text before the first sentinel and after the last one to be empty, and the sentinels in order.
+    if (len(pieces) != 2 * len(indices) + 3 or pieces[0] or pieces[-1] or
+        [int(n) for n in pieces[1::2]] != list(range(len(indices) + 1))):
+      pagemsg("WARNING: Sentinels not preserved expanding batch of %s template calls, expanding individually" %
+              len(indices))
+      return None
+    return [piece[:-1] if piece.endswith("\n") else piece for piece in pieces[2:-1:2]]
+
+  for batch_start in range(0, len(to_expand), batch_size):
+    indices = to_expand[batch_start:batch_start + batch_size]
+    batch_results = expand_batch(indices) if len(indices) > 1 else None
+    for n, i in enumerate(indices):
+      if batch_results is None:
+        raw_results[i] = site_expand_text(tempcalls[i], pagetitle, pagemsg)
+      else:
+        raw_results[i] = batch_results[n]
+      if cache:
+        cache.store(tempcalls[i], pagetitle, depsigs[i], raw_results[i])
+
+  return [process_expand_text_result(tempcall, result, pagemsg, verbose, suppress_errors)
+          for tempcall, result in zip(tempcalls, raw_results)]
+
 # For use inside of expand_text in EditParams below.
 def blib_expand_text(tempcall, pagetitle, pagemsg, verbose):
   return expand_text(tempcall, pagetitle, pagemsg, verbose)
@@ -573,7 +1497,7 @@ class EditParams(object):
     self.diff = diff
 
   def pagemsg(self, txt):
-    msg("Page %s %s: %s" % (self.index, self.title, txt))
+    page_msg(self.index, self.title, txt)
 
   def errandpagemsg(self, txt):
     errandmsg("Page %s %s: %s" % (self, index, self, title, txt))
@@ -619,7 +1543,7 @@ def new_do_edit(index, page, func=None, null=False, save=False, verbose=False, d
 def do_edit(page, index, func=None, null=False, save=False, verbose=False, diff=False):
   title = str(page.title())
   def pagemsg(txt):
-    msg("Page %s %s: %s" % (index, title, txt))
+    page_msg(index, title, txt)
   def errandpagemsg(txt):
     errandmsg("Page %s %s: %s" % (index, title, txt))
   while True:
@@ -636,7 +1560,7 @@ def do_edit(page, index, func=None, null=False, save=False, verbose=False, diff=
           try_repeatedly(assign_changed_page, errandpagemsg, "assign changed page to 'page.text'")
           if save:
             pagemsg("Saving with comment = %s" % comment)
-            safe_page_save(page, comment, errandpagemsg)
+            queue_page_save(page, comment, errandpagemsg)
           else:
             pagemsg("Would save with comment = %s" % comment)
         elif null:
@@ -652,6 +1576,9 @@ def do_edit(page, index, func=None, null=False, save=False, verbose=False, diff=
     except urllib.error.HTTPError as e:
       if e.code != 503: # Service unavailable
         raise
+    except PageSaveError:
+      # The failed save was of an earlier page and has already been logged against that page.
+      raise
     except:
       errandpagemsg("WARNING: Error")
       raise
@@ -752,6 +1679,26 @@ def references(page, startprefix = None, endprefix = None, namespaces = None,
   for i, current in iter_items(pages, startprefix, endprefix):
     yield i, current
 
+# Like references(), but if a transclusion index was given using --transclusion-index, the pages transcluding `page` are
+# found in the index (see dumplib.TransclusionIndex), in dump order, rather than using a live query. Pages that only
+# link to `page` aren't found in the index.
+def transclusion_references(page, startprefix=None, endprefix=None, namespaces=None, include_page=False):
+  index = get_transclusion_index()
+  if index is None:
+    for i, current in references(page, startprefix, endprefix, namespaces=namespaces, include_page=include_page):
+      yield i, current
+    return
+  if not isinstance(page, str):
+    page = str(page.title())
+  pages = [pywikibot.Page(site, title) for _, title in index.references(page)]
+  if namespaces:
+    allowed_namespaces = site.namespaces.resolve(namespaces)
+    pages = [current for current in pages if current.namespace() in allowed_namespaces]
+  if include_page:
+    pages = [pywikibot.Page(site, page)] + pages
+  for i, current in iter_items(pages, startprefix, endprefix):
+    yield i, current
+
 def get_contributions(user, startprefix=None, endprefix=None, max=None, namespaces=None):
   """Get contributions for a given user."""
   itemiter = site.usercontribs(user=user, namespaces=namespaces, total=max)
@@ -773,6 +1720,24 @@ def check_cat_filters(page, filter_cats_regex, prune_cats_regex, verbose=False):
       return False
   return True
 
+# Return an iterator over the subcategories of the category `page`. If a category graph was given using
+# --category-graph, the subcategories are taken from the category graph.
+def category_subcategories(page):
+  graph = get_category_graph()
+  if graph is None:
+    return page.subcategories()
+  return (pywikibot.Category(site, title) for title in graph.subcategories(str(page.title())))
+
+# Return an iterator over the members of the category `page` that aren't categories, starting at `startprefix` if
+# given. If a category graph was given using --category-graph, the members are taken from the category graph, and
+# `startprefix` is compared against their titles rather than their sort keys.
+def category_articles(page, startprefix=None):
+  graph = get_category_graph()
+  if graph is None:
+    return page.articles(startprefix=startprefix)
+  return (pywikibot.Page(site, title) for title in graph.articles(str(page.title()))
+          if startprefix is None or title >= startprefix)
+
 def yield_articles(page, seen, startprefix=None, filter_cats_regex=None, prune_cats_regex=None, recurse=False,
                    verbose=False):
   if not check_cat_filters(page, filter_cats_regex, prune_cats_regex, verbose):
@@ -780,7 +1745,7 @@ def yield_articles(page, seen, startprefix=None, filter_cats_regex=None, prune_c
   if not recurse:
     # Only use when non-recursive. Has a recurse= flag but doesn't allow for prune_cats_regex, doesn't correctly
     # ignore subcats and pages that may be seen multiple times.
-    for article in page.articles(startprefix=startprefix):
+    for article in category_articles(page, startprefix=startprefix):
       if seen is None:
         yield article
       else:
@@ -789,9 +1754,11 @@ def yield_articles(page, seen, startprefix=None, filter_cats_regex=None, prune_c
           seen.add(pagetitle)
           yield article
   else:
-    for subcat in yield_subcats(page, seen, filter_cats_regex=filter_cats_regex, prune_cats_regex=prune_cats_regex,
-                                do_this_page=True, recurse=True, verbose=verbose):
-      for article in subcat.articles(startprefix=startprefix):
+    # Even if articles seen before aren't being skipped, each category is visited only once, so that cycles in the
+    # category graph don't lead to infinite loops.
+    for subcat in yield_subcats(page, seen if seen is not None else set(), filter_cats_regex=filter_cats_regex,
+                                prune_cats_regex=prune_cats_regex, do_this_page=True, recurse=True, verbose=verbose):
+      for article in category_articles(subcat, startprefix=startprefix):
         if seen is None:
           yield article
         else:
@@ -832,7 +1799,7 @@ def yield_subcats(page, seen, filter_cats_regex=None, prune_cats_regex=None, do_
     return
   if do_this_page:
     yield page
-  subcats = page.subcategories()
+  subcats = category_subcategories(page)
   if recurse:
     for subcat in subcats:
       for cat in yield_subcats(subcat, seen, filter_cats_regex=filter_cats_regex, prune_cats_regex=prune_cats_regex,
@@ -864,6 +1831,27 @@ def cat_subcats(page, startprefix=None, endprefix=None, seen=None, filter_cats_r
   for i, current in iter_items(pageiter, startprefix, endprefix):
     yield i, current
 
+# Wrap an iterator over (INDEX, PAGE) tuples, reading ahead up to `window` items at a time and loading the text of
+# their pages in batches of `groupsize` pages per request (None means the maximum the server allows), so that
+# accessing `page.text` afterwards doesn't require a separate request per page. The items are yielded unchanged. If
+# bulk loading fails, the pages are yielded anyway and their text is fetched individually when needed.
+def prefetch_page_texts(index_page_iter, window=250, groupsize=None):
+  index_page_iter = iter(index_page_iter)
+  while True:
+    items = list(itertools.islice(index_page_iter, window))
+    if not items:
+      break
+    pages = [page for _, page in items]
+    try:
+      for page in site.preloadpages(pages, groupsize=groupsize):
+        pass
+    except KeyboardInterrupt:
+      raise
+    except Exception as e:
+      errmsg("WARNING: Error prefetching text of %s pages, fetching individually: %s" % (len(pages), e))
+    for item in items:
+      yield item
+
 def prefix_pages(prefix, startprefix=None, endprefix=None, namespace=None, filter_redirects=None):
   pageiter = site.allpages(
     prefix=None if prefix == '-' else prefix, namespace=namespace,
@@ -1142,13 +2130,44 @@ def create_argparser(desc, include_pagefile=False, include_stdin=False,
     no_beginning_line=False, suppress_start_end=False):
   if not no_beginning_line:
     msg("Beginning at %s" % time.ctime(starttime))
-  parser = argparse.ArgumentParser(description=desc)
+  parser = BlibArgumentParser(description=desc)
   if not suppress_start_end:
     parser.add_argument('start', help="Starting page index", nargs="?")
     parser.add_argument('end', help="Ending page index", nargs="?")
-  parser.add_argument('-s', '--save', action="store_true", help="Save results")
+  parser.add_argument('-s', '--save', action=SaveArgAction, help="Save results")
   parser.add_argument('-v', '--verbose', action="store_true", help="More verbose output")
   parser.add_argument('-d', '--diff', action="store_true", help="Show diff of changes")
+  parser.add_argument("--save-workers", dest="save_workers", action=GlobalSettingArgAction, type=int,
+      default=save_workers,
+      help="Number of threads to save pages with, so that processing continues while saves are in flight; 0 to save each page before processing the next one (default %(default)s). The edit rate is limited by Pywikibot's put_throttle.")
+  parser.add_argument("--save-max-tries", dest="save_max_tries", action=GlobalSettingArgAction, type=int,
+      default=save_max_tries,
+      help="Number of times to try saving a page before giving up, with exponential backoff between tries (default %(default)s).")
+  parser.add_argument("--expand-text-cache", dest="expand_text_cache_file", action=GlobalSettingArgAction,
+      help="SQLite file in which to persistently cache the results of expanding templates.")
+  parser.add_argument("--expand-text-cache-max-mb", dest="expand_text_cache_max_mb", action=GlobalSettingArgAction,
+      type=int, default=expand_text_cache_max_mb,
+      help="Maximum size in megabytes of the results cached using --expand-text-cache (default %(default)s).")
+  parser.add_argument("--dump-store", dest="dump_store_file", action=GlobalSettingArgAction,
+      help="Dump store (as created by build_dump_store.py) to look up page text and existence in, in place of live lookups. Ignored when saving, so that edits are based on the current revision of each page.")
+  parser.add_argument("--transclusion-index", dest="transclusion_index_file", action=GlobalSettingArgAction,
+      help="Transclusion index (as created by build_transclusion_index.py) in which to look up the pages transcluding the templates given using --refs or --pages-and-refs or processed by default, in place of live lookups.")
+  parser.add_argument("--category-graph", dest="category_graph_file", action=GlobalSettingArgAction,
+      help="Category graph snapshot (as created by build_category_graph.py) in which to look up the members of the categories given using --cats or --category-file or processed by default, in place of live lookups.")
+  parser.add_argument("--since-state", dest="since_state_file", action=GlobalSettingArgAction,
+      help="When reading pages from a dump or find_regex.py output, SQLite file recording the text of the pages processed by previous runs of the script; pages whose text hasn't changed since they were last processed are skipped.")
+  parser.add_argument("--since-state-full", dest="since_state_full", action=GlobalSettingArgAction, nargs=0,
+      const=True, default=False,
+      help="In conjunction with --since-state, process all pages, not just those that have changed, and record them for the next run.")
+  parser.add_argument("--parse-cache-size", dest="parse_cache_size", action=GlobalSettingArgAction,
+      type=int, default=parse_cache_size,
+      help="Number of texts whose parse trees are cached by parse_text(), or 0 to disable (default %(default)s).")
+  parser.add_argument("--parse-stats", dest="show_parse_stats", action=GlobalSettingArgAction, nargs=0, const=True,
+      default=False, help="Output the number of calls to parse_text() and the time spent in it for each page.")
+  parser.add_argument("--log-format", action=LogFormatArgAction, choices=sorted(log_sinks),
+      help="Format of the messages output to stdout: 'text' (the default) or 'jsonl' (a JSON object per line with fields level, index, title and msg). Can also be set using the environment variable BLIB_LOG_FORMAT.")
+  parser.add_argument("--local-lua", dest="local_lua_dir", action=GlobalSettingArgAction,
+      help="Directory of Lua modules (NAME.lua for Module:NAME) with which to run #invoke calls and known form-generating templates locally, falling back to the wiki when that fails (requires the lupa package; see lualib.py).")
   if include_pagefile:
     parser.add_argument("--pagefile", help="File listing pages to process.")
     parser.add_argument("--pages", help="List of pages to process, comma-separated.")
@@ -1189,14 +2208,17 @@ def create_argparser(desc, include_pagefile=False, include_stdin=False,
     parser.add_argument("--skip-page-file", help="File containing pages to skip.")
     parser.add_argument("--find-regex-output", help="Output as by find_regex.py.", action="store_true")
     parser.add_argument("--no-output", help="In conjunction with --find-regex, don't output processed text.", action="store_true")
+    parser.add_argument("--output-format", help="Format in which to output page text in find_regex.py format: 'text' (the default; in the log along with other messages) or 'binary' (as compressed records with an index, in the file given by --output-file; see convert_find_regex_output.py).", choices=["text", "binary"], default="text")
+    parser.add_argument("--output-file", help="File to write page text to when --output-format binary is given.")
     parser.add_argument("--skip-ignorable-pages", help="Skip 'ignorable' pages (talk pages, user pages, etc.).", action="store_true")
-    # Not implemented yet.
-    #parser.add_argument("--parallel", help="Do in parallel.", action="store_true")
-    #parser.add_argument("--num-workers", help="Number of workers for use with --parallel.", type=int, default=5)
+    parser.add_argument("--prefetch-window", help="Number of pages to read ahead and fetch the text of in bulk before processing them; 0 to disable (default %(default)s).", type=int, default=250)
+    parser.add_argument("--prefetch-batch-size", help="Number of pages whose text is fetched per request when prefetching (default is the maximum allowed by the server).", type=int)
   if include_stdin:
     parser.add_argument("--find-regex", help="Read find_regex.py output from stdin.", action="store_true")
     parser.add_argument("--stdin", help="Read XML dump from stdin.", action="store_true")
     parser.add_argument("--only-lang", help="Only process the section of a page for this language (a canonical language name).")
+    parser.add_argument("--parallel", help="In conjunction with --stdin or --find-regex, process pages in parallel using a pool of worker processes. Output is the same as (and in the same order as) a non-parallel run, but state accumulated across pages by the script (e.g. counts output at the end) is not preserved.", action="store_true")
+    parser.add_argument("--num-workers", help="Number of workers for use with --parallel.", type=int, default=5)
   if include_pagefile or include_stdin:
     parser.add_argument("--ignore-embedded-page-indices", help="When processing find_regex.py or other similar output from stdin or '--pages-from-find-regex', ignore associated page indices and increment sequentially.", action="store_true")
   return parser
@@ -1230,12 +2252,29 @@ def args_has_non_default_pages(args):
       or args.cats or args.category_file or args.refs or args.specials or args.contribs or args.prefix_namespace
       or args.pages_and_refs)
 
-def do_handle_stdin_retval(args, retval, text, prev_comment, pagemsg, is_find_regex, edit):
+# Output the text of a page in find_regex.py format, either as text in the log (the default) or as a record in the
+# binary file specified using --output-file if --output-format binary was given (see FindRegexBinaryWriter). `comment`
+# is the comment associated with the page, if any, and `changed` indicates whether it's the comment of a change made by
+# this run. Binary output requires `index` and `pagetitle`.
+def output_find_regex_text(args, index, pagetitle, text, comment, pagemsg, changed=False):
+  if not text.endswith("\n"):
+    text += "\n"
+  if getattr(args, "output_format", "text") == "binary":
+    if index is None or pagetitle is None:
+      pagemsg("WARNING: Index or page title not available, can't output in binary format, outputting as text")
+    else:
+      get_find_regex_binary_writer(args).add(index, pagetitle, comment, text, changed=changed)
+      return
+  pagemsg("-------- begin text --------\n%s-------- end text --------" % text)
+
+def do_handle_stdin_retval(args, retval, text, prev_comment, pagemsg, is_find_regex, edit, index=None,
+                           pagetitle=None):
   new, this_comment, has_changed = handle_process_page_retval(retval, text, pagemsg, args.verbose, args.diff)
   new = new or text
   if has_changed:
     assert edit, "Changed text without edit=True given"
   if edit:
+    output_comment = None
     if has_changed:
       # Join previous and this comment. Either may be None, a list of individual notes, an empty string (equivalent to
       # None), or a non-empty string specifying a single comment.
@@ -1254,17 +2293,16 @@ def do_handle_stdin_retval(args, retval, text, prev_comment, pagemsg, is_find_re
       if type(comment) is list:
         comment = "; ".join(group_notes(comment))
       pagemsg("Would save with comment = %s" % comment)
+      output_comment = comment
     elif prev_comment:
       if type(prev_comment) is list:
         prev_comment = "; ".join(group_notes(prev_comment))
       pagemsg("Skipped, no changes; previous comment = %s" % prev_comment)
+      output_comment = prev_comment
     elif is_find_regex:
       pagemsg("Skipped, no changes")
     if is_find_regex and not args.no_output:
-      final_newline = ""
-      if not new.endswith("\n"):
-        final_newline = "\n"
-      pagemsg("-------- begin text --------\n%s%s-------- end text --------" % (new, final_newline))
+      output_find_regex_text(args, index, pagetitle, new, output_comment, pagemsg, changed=has_changed)
 
 # Process a run of pages, with the set of pages specified in various possible ways, e.g. from --pagefile, --cats,
 # --refs, or (if --stdin is given) from a Wiktionary dump or find_regex.py output read from stdin. A typical workflow is
@@ -1318,6 +2356,10 @@ def do_handle_stdin_retval(args, retval, text, prev_comment, pagemsg, is_find_re
 #    default_refs[], if either argument is given.
 # 5. Else, an error is thrown.
 #
+# If --parallel is given along with --stdin or --find-regex, pages are processed by a pool of --num-workers worker
+# processes, with the output of each page reassembled in page order (see process_in_parallel()). `process` must not
+# depend on state accumulated across pages in this case, as each worker has its own copy of the script's globals.
+#
 # If `only_lang` is given, it should be a canonical name of a language (e.g. "Latin"), and pages not containing this
 # language will be skipped. (This is especially useful in conjunction with dumps on stdin, where it can greatly speed
 # up processing by avoiding the need to parse every page.) Not to be confused with the --only-lang user-specifiable
@@ -1359,6 +2401,9 @@ def do_pagefile_cats_refs(
       errmsg(" done.")
   if seen is None:
     seen = set() if args.track_seen else None
+  if args.output_format == "binary":
+    # Create the writer now, before any worker processes are started by --parallel.
+    get_find_regex_binary_writer(args)
 
   def page_should_be_filtered_out(pagetitle, errandpagemsg):
     if pagetitle in pages_to_skip or pagetitle in cat_pages_to_skip:
@@ -1440,8 +2485,12 @@ def do_pagefile_cats_refs(
       if pagetitle in seen:
         return
       seen.add(pagetitle)
+    store = get_dump_store()
+    if store is not None:
+      # Take the text from the dump store, as safe_page_text() does, rather than fetching it.
+      page.text = store.get(pagetitle) or ""
     def pagemsg(txt):
-      msg("Page %s %s: %s" % (index, pagetitle, txt))
+      page_msg(index, pagetitle, txt)
     def errandpagemsg(txt):
       errandmsg("Page %s %s: %s" % (index, pagetitle, txt))
     if page_should_be_filtered_out(pagetitle, errandpagemsg):
@@ -1460,18 +2509,34 @@ def do_pagefile_cats_refs(
         else:
           return process(page, index)
 
+    parse_snapshot = parse_stats.snapshot()
     if args.find_regex_output:
       # We are reading from Wiktionary but asked to output in find_regex format.
       retval = do_process_page(page, index)
       pagetext = safe_page_text(page, errandpagemsg)
-      do_handle_stdin_retval(args, retval, pagetext, None, pagemsg, is_find_regex=True, edit=edit)
+      do_handle_stdin_retval(args, retval, pagetext, None, pagemsg, is_find_regex=True, edit=edit, index=index,
+                             pagetitle=pagetitle)
     elif edit:
       do_edit(page, index, do_process_page, save=args.save, verbose=args.verbose,
           diff=args.diff)
     else:
       do_process_page(page, index)
+    if show_parse_stats:
+      pagemsg("parse_text(): %s" % parse_stats.describe(parse_snapshot))
+
+  # Wrap an iterator over (INDEX, PAGE) so that page text is fetched in bulk ahead of processing, when it will be
+  # needed (see prefetch_page_texts()).
+  def prefetch(index_page_iter):
+    if args.prefetch_window and (edit or stdin or only_lang or args.find_regex_output) and get_dump_store() is None:
+      return prefetch_page_texts(index_page_iter, window=args.prefetch_window, groupsize=args.prefetch_batch_size)
+    return index_page_iter
+
+  def titles_to_pages(index_pagetitle_iter):
+    for index, pagetitle in index_pagetitle_iter:
+      yield index, pywikibot.Page(site, pagetitle)
 
   if stdin and (args.stdin or args.find_regex):
+    state = get_since_state()
     pages_to_filter = None
     if args.pages:
       pages_to_filter = set(split_arg(args.pages, canonicalize=canonicalize_pagename))
@@ -1481,76 +2546,112 @@ def do_pagefile_cats_refs(
         pages_to_filter = new_pages_to_filter
       else:
         pages_to_filter |= new_pages_to_filter
+    # Returns a tuple (RETVAL, PROCESSED) where RETVAL is the return value of the processing function and PROCESSED is
+    # False if the page was filtered out without being processed (so it isn't recorded as processed for --since-state).
     def do_process_stdin_text_on_page(index, pagetitle, text, prev_comment):
       index = process_index(index)
       if pages_to_filter is not None and pagetitle not in pages_to_filter:
-        return None
+        return None, False
       def errandpagemsg(txt):
         errandmsg("Page %s %s: %s" % (index, pagetitle, txt))
       if page_should_be_filtered_out(pagetitle, errandpagemsg):
-        return None
+        return None, False
       else:
         def pagemsg(txt):
-          msg("Page %s %s: %s" % (index, pagetitle, txt))
-        return do_process_text_on_page(index, pagetitle, text, prev_comment, pagemsg)
+          page_msg(index, pagetitle, txt)
+        parse_snapshot = parse_stats.snapshot()
+        retval = do_process_text_on_page(index, pagetitle, text, prev_comment, pagemsg)
+        if show_parse_stats:
+          pagemsg("parse_text(): %s" % parse_stats.describe(parse_snapshot))
+        return retval, True
     if args.find_regex:
-      index_pagetitle_text_comment = yield_text_from_find_regex(sys.stdin, args.verbose)
-      for index, (_, pagetitle, text, prev_comment) in iter_items(index_pagetitle_text_comment, start, end,
-          get_name=lambda x:x[1], get_index=None if args.ignore_embedded_page_indices else lambda x:x[0]):
-        retval = do_process_stdin_text_on_page(index, pagetitle, text, prev_comment)
+      def do_process_stdin_find_regex_text_on_page(index, pagetitle, text, prev_comment):
+        retval, processed = do_process_stdin_text_on_page(index, pagetitle, text, prev_comment)
         def pagemsg(txt):
-          msg("Page %s %s: %s" % (process_index(index), pagetitle, txt))
+          page_msg(process_index(index), pagetitle, txt)
         if prev_comment:
           prev_comment = parse_grouped_notes(prev_comment)
-        do_handle_stdin_retval(args, retval, text, prev_comment, pagemsg, is_find_regex=True, edit=edit)
+        do_handle_stdin_retval(args, retval, text, prev_comment, pagemsg, is_find_regex=True, edit=edit,
+                               index=process_index(index), pagetitle=pagetitle)
+        return processed
+      index_pagetitle_text_comment = yield_text_from_find_regex_input(sys.stdin, args.verbose)
+      items = (
+        (index, pagetitle, text, prev_comment) for index, (_, pagetitle, text, prev_comment) in iter_items(
+          index_pagetitle_text_comment, start, end, get_name=lambda x:x[1],
+          get_index=None if args.ignore_embedded_page_indices else lambda x:x[0])
+      )
+      if state:
+        items = state.filter_unchanged(items, lambda item: item[1], lambda item: item[2])
+      if args.parallel:
+        process_in_parallel(items, lambda item: do_process_stdin_find_regex_text_on_page(*item),
+                            num_workers=args.num_workers, item_done=state and state.record_next)
+      else:
+        for item in items:
+          processed = do_process_stdin_find_regex_text_on_page(*item)
+          if state:
+            state.record_next(processed)
     else:
       def do_process_stdin_dump_text_on_page(index, pagetitle, text):
-        retval = do_process_stdin_text_on_page(index, pagetitle, text, None)
+        retval, processed = do_process_stdin_text_on_page(index, pagetitle, text, None)
         def pagemsg(txt):
-          msg("Page %s %s: %s" % (process_index(index), pagetitle, txt))
-        do_handle_stdin_retval(args, retval, text, None, pagemsg, is_find_regex=False, edit=edit)
-      parse_dump(sys.stdin, do_process_stdin_dump_text_on_page, start, end)
+          page_msg(process_index(index), pagetitle, txt)
+        do_handle_stdin_retval(args, retval, text, None, pagemsg, is_find_regex=False, edit=edit,
+                               index=process_index(index), pagetitle=pagetitle)
+        return processed
+      if args.parallel:
+        items = yield_dump_pages(sys.stdin, start, end)
+        if state:
+          items = state.filter_unchanged(items, lambda item: item[1], lambda item: item[2])
+        process_in_parallel(items, lambda item: do_process_stdin_dump_text_on_page(*item),
+                            num_workers=args.num_workers, item_done=state and state.record_next)
+      else:
+        parse_dump(sys.stdin, do_process_stdin_dump_text_on_page, start, end)
 
   elif args_has_non_default_pages(args):
     args_filter_cats = args.filter_cats
     args_prune_cats = args.prune_cats
     if args.pages:
       pages = split_arg(args.pages, canonicalize=canonicalize_pagename)
-      for index, pagetitle in iter_items(pages, start, end):
-        process_pywikibot_page(index, pywikibot.Page(site, pagetitle))
+      for index, page in prefetch(titles_to_pages(iter_items(pages, start, end))):
+        process_pywikibot_page(index, page)
     if args.pagefile:
-      for index, pagetitle in iter_items_from_file(args.pagefile, start, end, canonicalize=canonicalize_pagename):
-        process_pywikibot_page(index, pywikibot.Page(site, pagetitle))
+      for index, page in prefetch(titles_to_pages(
+          iter_items_from_file(args.pagefile, start, end, canonicalize=canonicalize_pagename))):
+        process_pywikibot_page(index, page)
     if args.pages_from_find_regex:
-      index_pagetitle_text_comment = yield_text_from_find_regex(
-        open(args.pages_from_find_regex, "r", encoding="utf-8"), args.verbose
+      find_regex_entries = FindRegexFile(args.pages_from_find_regex).entries
+      index_pagetitle = (
+        (index, pagetitle) for index, (_, pagetitle, _, _, _) in iter_items(find_regex_entries, start, end,
+          get_name=lambda x:x[1], get_index=None if args.ignore_embedded_page_indices else lambda x:x[0])
       )
-      for index, (_, pagetitle, _, _) in iter_items(index_pagetitle_text_comment, start, end,
-          get_name=lambda x:x[1], get_index=None if args.ignore_embedded_page_indices else lambda x:x[0]):
-        process_pywikibot_page(index, pywikibot.Page(site, pagetitle))
+      for index, page in prefetch(titles_to_pages(index_pagetitle)):
+        process_pywikibot_page(index, page)
     if args.pages_from_previous_output:
       index_pagetitle = yield_pages_from_previous_output(
         open(args.pages_from_previous_output, "r", encoding="utf-8"), args.verbose
       )
-      for index, (_, pagetitle) in iter_items(index_pagetitle, start, end,
-          get_name=lambda x:x[1], get_index=None if args.ignore_embedded_page_indices else lambda x:x[0]):
-        process_pywikibot_page(index, pywikibot.Page(site, pagetitle))
+      index_pagetitle = (
+        (index, pagetitle) for index, (_, pagetitle) in iter_items(index_pagetitle, start, end,
+          get_name=lambda x:x[1], get_index=None if args.ignore_embedded_page_indices else lambda x:x[0])
+      )
+      for index, page in prefetch(titles_to_pages(index_pagetitle)):
+        process_pywikibot_page(index, page)
     if args.cats or args.category_file:
       def do_cat(cat):
         if args.do_cat_and_subcats:
-          for index, subcat in cat_subcats(cat, start, end, seen=seen, filter_cats_regex=args_filter_cats,
-                                           prune_cats_regex=args_prune_cats, do_this_page=True,
-                                           recurse=args.recursive, verbose=args.verbose):
+          for index, subcat in prefetch(cat_subcats(cat, start, end, seen=seen, filter_cats_regex=args_filter_cats,
+                                                    prune_cats_regex=args_prune_cats, do_this_page=True,
+                                                    recurse=args.recursive, verbose=args.verbose)):
             process_pywikibot_page(index, subcat, no_check_seen=True)
         elif args.do_subcats:
-          for index, subcat in cat_subcats(cat, start, end, seen=seen, filter_cats_regex=args_filter_cats,
-                                           prune_cats_regex=args_prune_cats, do_this_page=False,
-                                           recurse=args.recursive, verbose=args.verbose):
+          for index, subcat in prefetch(cat_subcats(cat, start, end, seen=seen, filter_cats_regex=args_filter_cats,
+                                                    prune_cats_regex=args_prune_cats, do_this_page=False,
+                                                    recurse=args.recursive, verbose=args.verbose)):
             process_pywikibot_page(index, subcat, no_check_seen=True)
         else:
-          for index, page in cat_articles(cat, start, end, seen=seen, filter_cats_regex=args_filter_cats,
-                                          prune_cats_regex=args_prune_cats, recurse=args.recursive,
-                                          track_seen=args.track_seen, verbose=args.verbose):
+          for index, page in prefetch(cat_articles(cat, start, end, seen=seen, filter_cats_regex=args_filter_cats,
+                                                   prune_cats_regex=args_prune_cats, recurse=args.recursive,
+                                                   track_seen=args.track_seen, verbose=args.verbose)):
             process_pywikibot_page(index, page, no_check_seen=True)
       if args.cats:
         for cat in split_arg(args.cats):
@@ -1561,13 +2662,13 @@ def do_pagefile_cats_refs(
     if args.refs:
       for ref in split_arg(args.refs):
         # We don't use ref_namespaces here because the user might not want it.
-        for index, page in references(ref, start, end, namespaces=args_ref_namespaces):
+        for index, page in prefetch(transclusion_references(ref, start, end, namespaces=args_ref_namespaces)):
           process_pywikibot_page(index, page)
     if args.pages_and_refs:
       for page_and_ref in split_arg(args.pages_and_refs):
         # We don't use ref_namespaces here because the user might not want it.
-        for index, page in references(page_and_ref, start, end, namespaces=args_ref_namespaces,
-            include_page=True):
+        for index, page in prefetch(transclusion_references(page_and_ref, start, end,
+            namespaces=args_ref_namespaces, include_page=True)):
           process_pywikibot_page(index, page)
     if args.specials:
       for special in split_arg(args.specials):
@@ -1586,35 +2687,40 @@ def do_pagefile_cats_refs(
             process_pywikibot_page(index, page)
     if args.contribs:
       for contrib in split_arg(args.contribs):
-        for index, page in query_usercontribs(contrib, start, end, starttime=args.contribs_start, endtime=args.contribs_end):
-          process_pywikibot_page(index, pywikibot.Page(site, page['title']))
+        index_pagetitle = (
+          (index, contrib['title']) for index, contrib in query_usercontribs(
+            contrib, start, end, starttime=args.contribs_start, endtime=args.contribs_end)
+        )
+        for index, page in prefetch(titles_to_pages(index_pagetitle)):
+          process_pywikibot_page(index, page)
     if args.prefix_namespace:
       for prefix in split_arg(args.prefix_pages):
         namespace = args.prefix_namespace
-        for index, page in prefix_pages(
-            prefix, start, end, namespace, filter_redirects=True if args.prefix_redirects_only else None):
+        for index, page in prefetch(prefix_pages(
+            prefix, start, end, namespace, filter_redirects=True if args.prefix_redirects_only else None)):
           process_pywikibot_page(index, page)
 
   elif args_namespaces:
     for namespace in args_namespaces:
-      for index, page in prefix_pages(
-          None, start, end, namespace, filter_redirects=True if args.prefix_redirects_only else None):
+      for index, page in prefetch(prefix_pages(
+          None, start, end, namespace, filter_redirects=True if args.prefix_redirects_only else None)):
         process_pywikibot_page(index, page)
 
   else:
     if not default_pages and not default_cats and not default_refs:
       raise ValueError("One of --pages, --pagefile, --cats, --refs, --specials, --contribs or --prefix-pages should be specified")
-    for index, pagetitle in iter_items(default_pages, start, end):
-      process_pywikibot_page(index, pywikibot.Page(site, pagetitle))
+    for index, page in prefetch(titles_to_pages(iter_items(default_pages, start, end))):
+      process_pywikibot_page(index, page)
     for cat in default_cats:
-      for index, page in cat_articles(cat, start, end, seen=seen, filter_cats_regex=args_filter_cats,
-                                      prune_cats_regex=args_prune_cats, recurse=args.recursive,
-                                      track_seen=args.track_seen, verbose=args.verbose):
+      for index, page in prefetch(cat_articles(cat, start, end, seen=seen, filter_cats_regex=args_filter_cats,
+                                               prune_cats_regex=args_prune_cats, recurse=args.recursive,
+                                               track_seen=args.track_seen, verbose=args.verbose)):
         process_pywikibot_page(index, page, no_check_seen=True)
     for ref in default_refs:
-      for index, page in references(ref, start, end, namespaces=ref_namespaces):
+      for index, page in prefetch(transclusion_references(ref, start, end, namespaces=ref_namespaces)):
         process_pywikibot_page(index, page)
 
+  wait_for_saves()
   elapsed_time()
 
 def elapsed_time():
@@ -1628,32 +2734,55 @@ def elapsed_time():
     msg("Elapsed time: %s hours %s mins %0.2f secs" % (hours, mins, secs))
   else:
     msg("Elapsed time: %s mins %0.2f secs" % (mins, secs))
+  if expand_text_cache:
+    msg("expand_text() cache: %s" % expand_text_cache.stats())
+  if show_parse_stats:
+    msg("parse_text(): %s" % parse_stats.describe())
+  if since_state:
+    msg("--since-state: %s" % since_state.stats())
   msg("Ending at %s" % time.ctime(endtime))
 
-languages = None
-languages_byCode = None
-languages_byCanonicalName = None
-languages_byAlias = None
-
-families = None
-families_byCode = None
-families_byCanonicalName = None
-
-scripts = None
-scripts_byCode = None
-scripts_byCanonicalName = None
-
-etym_languages = None
-etym_languages_byCode = None
-etym_languages_byCanonicalName = None
-etym_languages_byAlias = None
+# Language, family, script, etymology-language and alias data, as returned by functions in [[Module:User:MewBot]].
+# These are fetched on first use (or by calling getLanguageData() etc.) and cached locally; see get_mewbot_data(). The
+# lookup tables languages_byCode, languages_byCanonicalName, etc. are built on first access; see __getattr__() below.
+# Scripts should access all of these as attributes of the blib module (e.g. blib.languages_byCode).
 
 wm_languages = None
 wm_languages_byCode = None
 wm_languages_byCanonicalName = None
 
-language_aliases_to_canonical = None
-
+# Directory in which to cache the data fetched from [[Module:User:MewBot]], and the maximum age in hours of cached data
+# before it is fetched again. These can be set using the environment variables BLIB_LANG_DATA_CACHE_DIR (set to a blank
+# string to disable caching) and BLIB_LANG_DATA_MAX_AGE (set to 0 to force the data to be refreshed).
+lang_data_cache_dir = os.environ.get("BLIB_LANG_DATA_CACHE_DIR",
+  os.path.join(os.path.expanduser("~"), ".cache", "blib"))
+lang_data_max_age = float(os.environ.get("BLIB_LANG_DATA_MAX_AGE", 24))
+# Increment when the format of the cached data changes.
+lang_data_cache_version = 1
+
+# Return the result of {{#invoke:User:MewBot|FUNC}}, decoded from JSON. If `lang_data_cache_dir` is set, the data is
+# cached there in pickled form, preceded by a header recording the cache version and when the data was fetched; cached
+# data is used unless the version has changed or it is older than `lang_data_max_age` hours.
+def get_mewbot_data(func):
+  cache_file = os.path.join(lang_data_cache_dir, "%s.pickle" % func) if lang_data_cache_dir else None
+  if cache_file and os.path.exists(cache_file):
+    try:
+      with open(cache_file, "rb") as fp:
+        header = pickle.load(fp)
+        if (header.get("version") == lang_data_cache_version and
+            time.time() - header["fetched"] < lang_data_max_age * 3600):
+          return pickle.load(fp)
+    except (OSError, EOFError, ValueError, KeyError, AttributeError, pickle.UnpicklingError) as e:
+      errandmsg("WARNING: Error reading cached %s data from %s, fetching again: %s" % (func, cache_file, e))
+  data = json_loads(site.expand_text("{{#invoke:User:MewBot|%s}}" % func))
+  if cache_file:
+    os.makedirs(lang_data_cache_dir, exist_ok=True)
+    temp_file = "%s.%s.tmp" % (cache_file, os.getpid())
+    with open(temp_file, "wb") as fp:
+      pickle.dump({"version": lang_data_cache_version, "fetched": time.time()}, fp, pickle.HIGHEST_PROTOCOL)
+      pickle.dump(data, fp, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, cache_file)
+  return data
 
 def getData():
   getLanguageData()
@@ -1669,70 +2798,94 @@ def json_loads(data):
     print("JSON decode error processing the following: %s" % data)
     raise
 
-def getLanguageData():
-  global languages, languages_byCode, languages_byCanonicalName, languages_byAlias
-
-  jsondata = site.expand_text("{{#invoke:User:MewBot|getLanguageData}}")
-  languages = json_loads(jsondata)
-  languages_byCode = {}
-  languages_byCanonicalName = {}
-  languages_byAlias = defaultdict(list)
-
-  for lang in languages:
-    languages_byCode[lang["code"]] = lang
-    languages_byCanonicalName[lang["canonicalName"]] = lang
-    if "aliases" in lang:
-      for alias in lang["aliases"]:
-        assert(type(alias) is str)
-        languages_byAlias[alias].append(lang)
-
-def getFamilyData():
-  global families, families_byCode, families_byCanonicalName
+# Names of the lazily built lookup tables derived from each of the data lists.
+lang_data_tables = {
+  "languages": ["languages_byCode", "languages_byCanonicalName", "languages_byAlias"],
+  "families": ["families_byCode", "families_byCanonicalName"],
+  "scripts": ["scripts_byCode", "scripts_byCanonicalName"],
+  "etym_languages": ["etym_languages_byCode", "etym_languages_byCanonicalName", "etym_languages_byAlias"],
+}
 
-  families = json_loads(site.expand_text("{{#invoke:User:MewBot|getFamilyData}}"))
-  families_byCode = {}
-  families_byCanonicalName = {}
+# Set the data list `name` (e.g. "languages") to `data`, discarding any lookup tables built from old data.
+def set_lang_data(name, data):
+  globals()[name] = data
+  for table in lang_data_tables[name]:
+    globals().pop(table, None)
 
-  for fam in families:
-    families_byCode[fam["code"]] = fam
-    families_byCanonicalName[fam["canonicalName"]] = fam
+def getLanguageData():
+  set_lang_data("languages", get_mewbot_data("getLanguageData"))
 
+def getFamilyData():
+  set_lang_data("families", get_mewbot_data("getFamilyData"))
 
 def getScriptData():
-  global scripts, scripts_byCode, scripts_byCanonicalName
-
-  scripts = json_loads(site.expand_text("{{#invoke:User:MewBot|getScriptData}}"))
-  scripts_byCode = {}
-  scripts_byCanonicalName = {}
-
-  for sc in scripts:
-    scripts_byCode[sc["code"]] = sc
-    scripts_byCanonicalName[sc["canonicalName"]] = sc
-
+  set_lang_data("scripts", get_mewbot_data("getScriptData"))
 
 def getEtymLanguageData():
-  global etym_languages, etym_languages_byCode, etym_languages_byCanonicalName, etym_languages_byAlias
-
-  etym_languages = json_loads(site.expand_text("{{#invoke:User:MewBot|getEtymLanguageData}}"))
-  etym_languages_byCode = {}
-  etym_languages_byCanonicalName = {}
-  etym_languages_byAlias = defaultdict(list)
-
-  for etyl in etym_languages:
-    etym_languages_byCode[etyl["code"]] = etyl
-    etym_languages_byCanonicalName[etyl["canonicalName"]] = etyl
-    if "aliases" in etyl:
-      for alias in etyl["aliases"]:
-        assert(type(alias) is str)
-        etym_languages_byAlias[alias].append(etyl)
-
+  set_lang_data("etym_languages", get_mewbot_data("getEtymLanguageData"))
 
 def getAliasData():
   global language_aliases_to_canonical
-
-  jsondata = site.expand_text("{{#invoke:User:MewBot|getAliasData}}")
-  language_aliases_to_canonical = json_loads(jsondata)
-
+  language_aliases_to_canonical = get_mewbot_data("getAliasData")
+
+# Build lookup tables NAME_byCode, NAME_byCanonicalName and (if `with_aliases`) NAME_byAlias from the data list NAME.
+def build_lang_data_tables(name, with_aliases):
+  byCode = {}
+  byCanonicalName = {}
+  byAlias = defaultdict(list)
+  for item in getattr(sys.modules[__name__], name):
+    byCode[item["code"]] = item
+    byCanonicalName[item["canonicalName"]] = item
+    if with_aliases and "aliases" in item:
+      for alias in item["aliases"]:
+        assert(type(alias) is str)
+        byAlias[alias].append(item)
+  globals()[name + "_byCode"] = byCode
+  globals()[name + "_byCanonicalName"] = byCanonicalName
+  if with_aliases:
+    globals()[name + "_byAlias"] = byAlias
+
+lang_data_getters = {
+  "languages": getLanguageData,
+  "families": getFamilyData,
+  "scripts": getScriptData,
+  "etym_languages": getEtymLanguageData,
+  "language_aliases_to_canonical": getAliasData,
+}
+
+# Called on access to a module attribute that doesn't exist; fetches the language etc. data and builds the lookup
+# tables on demand.
+def __getattr__(name):
+  if name in lang_data_getters:
+    lang_data_getters[name]()
+    return globals()[name]
+  for dataname, tables in lang_data_tables.items():
+    if name in tables:
+      build_lang_data_tables(dataname, with_aliases=dataname + "_byAlias" in tables)
+      return globals()[name]
+  raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+# Maximum number of seconds to sleep between tries in try_repeatedly().
+max_retry_sleep_time = 300
+
+# Return the number of seconds to sleep before trying again after exception `e`, when `num_tries` tries have failed
+# so far. The delay starts at `sleep_time` and doubles with each failed try, but is at least the delay requested by the
+# server, either in a Retry-After header (which Pywikibot records in the site's throttle) or as the replication lag
+# reported with a maxlag error. Random jitter of up to 50% is added so that several workers that fail at the same
+# time (see SaveScheduler) don't all try again at the same time.
+def get_retry_sleep_time(e, num_tries, sleep_time):
+  delay = sleep_time * 2 ** (num_tries - 1)
+  throttle = getattr(site, "throttle", None)
+  retry_after = getattr(throttle, "retry_after", None)
+  if retry_after:
+    delay = max(delay, retry_after)
+  if getattr(e, "code", None) == "maxlag":
+    try:
+      delay = max(delay, float(e.other.get("lag", 0)))
+    except (AttributeError, TypeError, ValueError):
+      pass
+  delay = min(delay, max_retry_sleep_time)
+  return delay * random.uniform(1, 1.5)
 
 def try_repeatedly(fun, errandpagemsg, operation="save", bad_value_ret=None, max_tries=2, sleep_time=5):
   num_tries = 0
@@ -1741,7 +2894,7 @@ def try_repeatedly(fun, errandpagemsg, operation="save", bad_value_ret=None, max
       txt, operation, ", skipping" if skipping else "", str(e)
     )
     errandpagemsg(txt)
-    traceback.print_exc(file=sys.stdout)
+    msg(traceback.format_exc().rstrip("\n"))
   while True:
     try:
       return fun()
@@ -1787,24 +2940,70 @@ def try_repeatedly(fun, errandpagemsg, operation="save", bad_value_ret=None, max
       if num_tries >= max_tries:
         errandpagemsg("WARNING: Can't %s!!!!!!!" % operation)
         raise
-      errandpagemsg("Sleeping for %s seconds" % sleep_time)
-      time.sleep(sleep_time)
-      #if sleep_time >= 40:
-      #  sleep_time += 40
-      #else:
-      #  sleep_time *= 2
-
+      retry_sleep_time = get_retry_sleep_time(e, num_tries, sleep_time)
+      errandpagemsg("Sleeping for %.1f seconds" % retry_sleep_time)
+      time.sleep(retry_sleep_time)
+
+dump_store_file = None
+dump_store = None
+
+# Return the dump store specified using --dump-store, or None if none was specified. Also None when saving (see
+# --save), so that edits are always based on the current revision of a page rather than on the dump's copy.
+def get_dump_store():
+  global dump_store
+  if saving_pages:
+    return None
+  if dump_store is None and dump_store_file:
+    import dumplib
+    dump_store = dumplib.DumpStore(dump_store_file)
+  return dump_store
+
+transclusion_index_file = None
+transclusion_index = None
+
+# Return the transclusion index specified using --transclusion-index, or None if none was specified.
+def get_transclusion_index():
+  global transclusion_index
+  if transclusion_index is None and transclusion_index_file:
+    import dumplib
+    transclusion_index = dumplib.TransclusionIndex(transclusion_index_file)
+  return transclusion_index
+
+category_graph_file = None
+category_graph = None
+
+# Return the category graph specified using --category-graph, or None if none was specified.
+def get_category_graph():
+  global category_graph
+  if category_graph is None and category_graph_file:
+    import dumplib
+    category_graph = dumplib.CategoryGraph(category_graph_file)
+  return category_graph
+
+# Fetch the text of `page`. If a dump store was given using --dump-store, the text is taken from the dump store, and is
+# a blank string if the page isn't there.
 def safe_page_text(page, errandpagemsg, bad_value_ret=""):
+  store = get_dump_store()
+  if store is not None:
+    return store.get(str(page.title())) or ""
   return try_repeatedly(lambda: page.text, errandpagemsg, "fetch page text", bad_value_ret=bad_value_ret)
 
+# Determine whether `page` exists. If a dump store was given using --dump-store, this checks whether the page is in the
+# dump store.
 def safe_page_exists(page, errandpagemsg):
+  store = get_dump_store()
+  if store is not None:
+    return str(page.title()) in store
   return try_repeatedly(lambda: page.exists(), errandpagemsg, "determine if page exists", bad_value_ret=False)
 
+# Number of times to try saving a page before giving up; set using --save-max-tries.
+save_max_tries = 5
+
 def safe_page_save(page, comment, errandpagemsg):
   def do_save():
     page.save(summary=comment)
     return True
-  return try_repeatedly(do_save, errandpagemsg, "save page", bad_value_ret=False)
+  return try_repeatedly(do_save, errandpagemsg, "save page", bad_value_ret=False, max_tries=save_max_tries)
 
 def safe_page_purge(page, errandpagemsg):
   def do_purge():
@@ -1812,6 +3011,146 @@ def safe_page_purge(page, errandpagemsg):
     return True
   return try_repeatedly(do_purge, errandpagemsg, "purge page", bad_value_ret=False)
 
+# Raised in the processing loop when saving page `pagetitle` in a worker thread of SaveScheduler failed with exception
+# `error`.
+class PageSaveError(Exception):
+  def __init__(self, pagetitle, error):
+    super().__init__("Error saving page %s: %s" % (pagetitle, error))
+    self.pagetitle = pagetitle
+    self.error = error
+
+# Number of worker threads used to save pages edited using do_edit(); set using --save-workers. If 0, pages are saved
+# as soon as they are processed, and the next page isn't processed until the save finishes.
+save_workers = 0
+save_scheduler = None
+
+# Saves pages edited using do_edit() (see queue_page_save()). With `num_workers` > 0, pages to save are put on a queue
+# and saved by a pool of worker threads, so that processing of the following pages continues while saves are in
+# flight, and the round-trip time of each save doesn't limit the edit rate. The rate itself is still limited by
+# Pywikibot's write throttle (`put_throttle` in user-config.py), which is shared between the workers, along with the
+# maxlag and Retry-After handling in Pywikibot and in try_repeatedly(). The queue holds at most two pages per worker,
+# after which the processing loop waits for a worker to become free. If a save raises an exception, it's logged against
+# the page being saved and raised in the processing loop, wrapped in a PageSaveError naming that page, the next time a
+# page is queued (or by wait()). The time taken by each save is recorded, and a summary of the throughput and latency
+# of the saves is output at exit.
+class SaveScheduler(object):
+  def __init__(self, num_workers):
+    self.num_workers = num_workers
+    self.queue = queue.Queue(maxsize=2 * num_workers) if num_workers > 0 else None
+    self.workers = []
+    self.lock = threading.Lock()
+    self.error = None
+    self.latencies = []
+    self.num_failed = 0
+    self.queue_wait_time = 0.0
+    self.first_save_time = None
+    self.last_save_time = None
+    atexit.register(self.finish)
+
+  def save(self, page, comment, errandpagemsg):
+    starttime = time.time()
+    saved = False
+    try:
+      saved = safe_page_save(page, comment, errandpagemsg)
+    finally:
+      endtime = time.time()
+      with self.lock:
+        if self.first_save_time is None:
+          self.first_save_time = starttime
+        self.last_save_time = endtime
+        self.latencies.append(endtime - starttime)
+        if not saved:
+          self.num_failed += 1
+
+  def run_worker(self):
+    while True:
+      item = self.queue.get()
+      try:
+        if item is None:
+          return
+        page, comment, errandpagemsg = item
+        try:
+          self.save(page, comment, errandpagemsg)
+        except Exception as e:
+          errandpagemsg("WARNING: Error saving page: %s" % e)
+          with self.lock:
+            if self.error is None:
+              self.error = PageSaveError(str(page.title()), e)
+      finally:
+        self.queue.task_done()
+
+  def raise_error(self):
+    error = self.error
+    if error is not None:
+      self.error = None
+      raise error from error.error
+
+  def submit(self, page, comment, errandpagemsg):
+    if not self.queue:
+      self.save(page, comment, errandpagemsg)
+      return
+    self.raise_error()
+    if not self.workers:
+      for i in range(self.num_workers):
+        worker = threading.Thread(target=self.run_worker, daemon=True)
+        worker.start()
+        self.workers.append(worker)
+    starttime = time.time()
+    self.queue.put((page, comment, errandpagemsg))
+    self.queue_wait_time += time.time() - starttime
+
+  # Wait for all queued saves to finish.
+  def wait(self):
+    if self.queue:
+      self.queue.join()
+    self.raise_error()
+
+  # Wait for all queued saves to finish, stop the workers and output the save statistics.
+  def finish(self):
+    if self.workers:
+      for worker in self.workers:
+        self.queue.put(None)
+      for worker in self.workers:
+        worker.join()
+      self.workers = []
+    if self.error is not None:
+      errmsg("WARNING: %s" % self.error)
+      self.error = None
+    if self.latencies:
+      msg(self.describe())
+
+  def describe(self):
+    latencies = sorted(self.latencies)
+    num_saves = len(latencies)
+    elapsed = self.last_save_time - self.first_save_time
+    def percentile(pct):
+      return latencies[min(num_saves - 1, int(num_saves * pct / 100))]
+    retval = "Saved %s pages (%s failed) in %.1f seconds using %s: %.1f saves/minute; " % (
+      num_saves - self.num_failed, self.num_failed, elapsed,
+      "%s workers" % self.num_workers if self.num_workers else "no workers",
+      num_saves * 60 / elapsed if elapsed > 0 else 0)
+    retval += "latency mean %.2f, median %.2f, 95th percentile %.2f, max %.2f seconds" % (
+      sum(latencies) / num_saves, percentile(50), percentile(95), latencies[-1])
+    if self.queue:
+      retval += "; waited %.1f seconds for the save queue" % self.queue_wait_time
+    return retval
+
+def get_save_scheduler():
+  global save_scheduler
+  if save_scheduler is None:
+    save_scheduler = SaveScheduler(save_workers)
+  return save_scheduler
+
+# Save `page` with comment `comment`, using the save scheduler (see SaveScheduler). With --save-workers, this returns
+# before the save is done.
+def queue_page_save(page, comment, errandpagemsg):
+  get_save_scheduler().submit(page, comment, errandpagemsg)
+
+# Wait for all pages queued using queue_page_save() to be saved.
+def wait_for_saves():
+  if save_scheduler is not None:
+    save_scheduler.wait()
+
 class ParseException(Exception):
   pass
 
@@ -2150,7 +3489,7 @@ def process_one_page_links(index, pagetitle, text, langs, process_param,
   # changelog actions.
   def do_process_one_page_links(pagetitle, index, parsed, processfn):
     def pagemsg(txt):
-      msg("Page %s %s: %s" % (index, pagetitle, txt))
+      page_msg(index, pagetitle, txt)
 
     actions = []
     for t in parsed.filter_templates():
@@ -3094,6 +4433,10 @@ class WikiDumpHandler(xml.sax.ContentHandler):
     self.title = None
     self.text = None
     self.cur = None
+    # Namespaces listed in the <siteinfo> of the dump, mapping namespace numbers to names.
+    self.namespaces = {}
+    self.namespace_key = None
+    self.namespace_name = None
 
   def startElement(self, name, attrs):
     if name == "title":
@@ -3102,10 +4445,16 @@ class WikiDumpHandler(xml.sax.ContentHandler):
     elif name == "text":
       self.cur = "text"
       self.text = []
+    elif name == "namespace":
+      self.cur = "namespace"
+      self.namespace_key = attrs.get("key")
+      self.namespace_name = ""
 
   def endElement(self, name):
     if name == "text":
       self.pagecallback(self.title, "".join(self.text))
+    elif name == "namespace" and self.namespace_key is not None:
+      self.namespaces[int(self.namespace_key)] = self.namespace_name
     self.cur = None
 
   def characters(self, content):
@@ -3113,6 +4462,135 @@ class WikiDumpHandler(xml.sax.ContentHandler):
       self.title += content
     elif self.cur == "text":
       self.text.append(content)
+    elif self.cur == "namespace":
+      self.namespace_name += content
+
+# Record of the pages processed by previous runs of a script over a dump, enabled using --since-state FILE (see
+# create_argparser()), so that a run over a later dump only processes the pages that have changed since then. The state
+# is kept in an SQLite file, which records a hash of the text of each page processed, along with the name and version
+# of the script that processed it; several scripts can share the same file. The version of a script is a hash of its
+# source and of the arguments it was run with (see get_since_state()), so changing either causes all pages to be
+# processed again, as does --since-state-full. A page is recorded only once it has been processed, so after an
+# interrupted run, the pages not yet processed are processed next time, and pages skipped without being processed
+# (e.g. because of --pages) aren't recorded.
+# Page text is read from a dump by parse_dump() and do_pagefile_cats_refs() with --stdin, or from find_regex.py output
+# by do_pagefile_cats_refs() with --find-regex.
+class SinceState(object):
+  def __init__(self, filename, script, version, full=False):
+    self.filename = filename
+    self.script = script
+    self.version = version
+    self.full = full
+    self.skipped = 0
+    self.processed = 0
+    # (PAGETITLE, HASH) of pages passed through by filter_unchanged() and not yet recorded as processed.
+    self.pending = deque()
+    self.pending_writes = 0
+    self.conn = None
+    # With --parallel, filter_unchanged() is run by the worker pool in a separate thread from record_next().
+    self.lock = threading.RLock()
+    atexit.register(self.commit)
+
+  def connect(self):
+    if self.conn is None:
+      self.conn = sqlite3.connect(self.filename, timeout=60, check_same_thread=False)
+      self.conn.execute("CREATE TABLE IF NOT EXISTS scripts (script TEXT PRIMARY KEY, version TEXT)")
+      self.conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+        script TEXT, pagetitle TEXT, hash TEXT, PRIMARY KEY (script, pagetitle))""")
+      row = self.conn.execute("SELECT version FROM scripts WHERE script = ?", (self.script,)).fetchone()
+      if self.full or row is None or row[0] != self.version:
+        self.conn.execute("DELETE FROM pages WHERE script = ?", (self.script,))
+        self.conn.execute("INSERT OR REPLACE INTO scripts VALUES (?, ?)", (self.script, self.version))
+        self.conn.commit()
+    return self.conn
+
+  def commit(self):
+    with self.lock:
+      if self.conn is not None and self.pending_writes:
+        self.conn.commit()
+        self.pending_writes = 0
+
+  @staticmethod
+  def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+  # Return True if `pagetitle` was processed by a previous run when it had text whose hash is `texthash`.
+  def is_unchanged(self, pagetitle, texthash):
+    with self.lock:
+      row = self.connect().execute("SELECT hash FROM pages WHERE script = ? AND pagetitle = ?",
+                                   (self.script, pagetitle)).fetchone()
+    if row is not None and row[0] == texthash:
+      self.skipped += 1
+      return True
+    return False
+
+  # Record that `pagetitle` has been processed with text whose hash is `texthash`.
+  def record(self, pagetitle, texthash):
+    with self.lock:
+      self.connect().execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?)", (self.script, pagetitle, texthash))
+      self.processed += 1
+      self.pending_writes += 1
+      if self.pending_writes >= 1000:
+        self.commit()
+
+  # Yield the items in `items` for pages that have changed since they were last processed, where `get_title` and
+  # `get_text` extract the page title and text from an item. Call record_next() after each item has been processed.
+  def filter_unchanged(self, items, get_title, get_text):
+    for item in items:
+      pagetitle = get_title(item)
+      texthash = self.text_hash(get_text(item))
+      if not self.is_unchanged(pagetitle, texthash):
+        self.pending.append((pagetitle, texthash))
+        yield item
+
+  # Record that the oldest item yielded by filter_unchanged() and not yet recorded has been processed. If `processed` is
+  # False, the item was skipped without being processed (e.g. because of --pages or --filter-pages), so it isn't
+  # recorded and will be processed by the next run that doesn't skip it.
+  def record_next(self, processed=True):
+    pagetitle, texthash = self.pending.popleft()
+    if processed:
+      self.record(pagetitle, texthash)
+
+  def stats(self):
+    return "%s unchanged pages skipped, %s pages processed" % (self.skipped, self.processed)
+
+since_state_file = None
+since_state_full = False
+since_state = None
+
+# Arguments that don't affect how a page is processed, and so aren't part of the version of a script for --since-state.
+# This includes the arguments selecting which pages to process, since pages skipped because of them aren't recorded.
+since_state_ignored_args = {
+  "start", "end", "diff", "save_workers", "save_max_tries", "expand_text_cache_file", "expand_text_cache_max_mb",
+  "dump_store_file", "transclusion_index_file", "category_graph_file", "since_state_file", "since_state_full",
+  "parse_cache_size", "show_parse_stats", "log_format", "local_lua_dir", "pagefile", "pages", "filter_pages",
+  "filter_pages_not", "skip_pages", "skip_page_file", "namespaces", "skip_ignorable_pages", "output_file",
+  "prefetch_window", "prefetch_batch_size", "find_regex", "stdin", "parallel", "num_workers",
+  "ignore_embedded_page_indices",
+}
+
+# Return the state of previous runs specified using --since-state, or None if none was specified. The version of the
+# script includes the arguments it was run with (other than those in `since_state_ignored_args`), so that e.g. running
+# find_regex.py with a different regex processes all pages again.
+def get_since_state():
+  global since_state
+  if since_state is None and since_state_file:
+    script = sys.argv[0]
+    try:
+      with open(script, "rb") as fp:
+        version = hashlib.sha1(fp.read()).hexdigest()
+    except IOError:
+      version = ""
+    if parsed_args is not None:
+      args = sorted((dest, repr(value)) for dest, value in vars(parsed_args).items()
+                    if dest not in since_state_ignored_args)
+    else:
+      # The script doesn't use create_argparser(), so we can't tell which arguments matter.
+      args = sys.argv[1:]
+    version += ":" + hashlib.sha1(repr(args).encode("utf-8")).hexdigest()
+    since_state = SinceState(since_state_file, re.sub(r"\.py$", "", os.path.basename(script)), version,
+                             full=since_state_full)
+  return since_state
 
 class DumpExitException(Exception):
   pass
@@ -3121,13 +4599,21 @@ def parse_dump(fp, pagecallback, startprefix=None, endprefix=None,
     skip_ignorable_pages=False):
   item_handler = ProcessItems(startprefix=startprefix, endprefix=endprefix,
       skip_ignorable_pages=skip_ignorable_pages)
+  state = get_since_state()
 
   def mycallback(title, text):
     retval = item_handler.should_process(title)
     if retval is None:
       raise DumpExitException
     if retval != False:
-      pagecallback(retval, title, text)
+      if state:
+        texthash = state.text_hash(text)
+        if state.is_unchanged(title, texthash):
+          return
+      processed = pagecallback(retval, title, text)
+      # A callback returning False skipped the page without processing it, so don't record it.
+      if state and processed is not False:
+        state.record(title, texthash)
 
   handler = WikiDumpHandler(mycallback)
   try:
@@ -3135,9 +4621,54 @@ def parse_dump(fp, pagecallback, startprefix=None, endprefix=None,
   except DumpExitException as e:
     return
 
+# Like parse_dump() but a generator, yielding (INDEX, TITLE, TEXT) tuples rather than invoking a callback. The dump is
+# fed incrementally to the SAX parser in chunks of `bufsize` bytes, so only a chunk's worth of pages is held in memory
+# at a time. If `namespaces` is given, it should be a dictionary, which is filled in with the namespaces listed in the
+# <siteinfo> of the dump (mapping namespace numbers to names) before the first page is yielded.
+def yield_dump_pages(fp, startprefix=None, endprefix=None, skip_ignorable_pages=False, bufsize=1 << 20,
+    namespaces=None):
+  item_handler = ProcessItems(startprefix=startprefix, endprefix=endprefix,
+      skip_ignorable_pages=skip_ignorable_pages)
+
+  pages = []
+  handler = WikiDumpHandler(lambda title, text: pages.append((title, text)))
+  if namespaces is not None:
+    handler.namespaces = namespaces
+  parser = xml.sax.make_parser()
+  parser.setContentHandler(handler)
+  # Read bytes if possible so expat handles the decoding according to the XML declaration.
+  fp = getattr(fp, "buffer", fp)
+  while True:
+    data = fp.read(bufsize)
+    if data:
+      parser.feed(data)
+    else:
+      parser.close()
+    for title, text in pages:
+      retval = item_handler.should_process(title)
+      if retval is None:
+        return
+      if retval != False:
+        yield retval, title, text
+    del pages[:]
+    if not data:
+      break
+
+# Regexes matching the messages containing the comment and text of a page in find_regex.py output, as found in JSON
+# log records (see JSONLogSink).
+find_regex_comment_msg_re = re.compile(r"\A(?:Would save with comment|Skipped, no changes; previous comment) = (.*)\Z",
+                                       re.S)
+find_regex_text_msg_re = re.compile(r"\A-+ begin text -+\n((?:.*\n)?)-+ end text -+\Z", re.S)
+
 def yield_text_from_find_regex(lines, verbose):
   in_multiline = False
   comment = None
+  def check_comment():
+    nonlocal comment
+    if comment is not None and (pagenum != comment_pagenum or pagename != comment_pagename):
+      errmsg("WARNING: Processing text for index %s, page '%s' but saw comment '%s' for different index %s, page '%s'; ignoring"
+        % (pagenum, pagename, comment, comment_pagenum, comment_pagename))
+      comment = None
   while True:
     try:
       line = next(lines)
@@ -3153,6 +4684,21 @@ def yield_text_from_find_regex(lines, verbose):
           errmsg("WARNING: Possible missing ----- end text -----: %s" % line.rstrip('\n'))
       templines.append(line)
     else:
+      record = decode_log_record(line)
+      if record is not None:
+        m = "title" in record and find_regex_comment_msg_re.search(record["msg"])
+        if m:
+          comment_pagenum, comment_pagename, comment = record["index"], record["title"], m.group(1)
+          continue
+        m = "title" in record and find_regex_text_msg_re.search(record["msg"])
+        if m:
+          pagenum, pagename = record["index"], record["title"]
+          check_comment()
+          yield pagenum, pagename, m.group(1), comment
+          comment = None
+        elif verbose:
+          msg("Skipping: %s" % line.rstrip('\n'))
+        continue
       line = line.rstrip('\n')
       #if line.endswith(':'):
       #  pagename = "Template:%s" % line[:-1]
@@ -3160,6 +4706,229 @@ def yield_text_from_find_regex(lines, verbose):
       #  templines = []
       #else:
       m = re.search("^Page ([0-9]+) (.*): (?:Would save with comment|Skipped, no changes; previous comment) = (.*)$", line)
+      if m:
+        comment_pagenum, comment_pagename, comment = m.groups()
+        comment_pagenum = int(comment_pagenum)
+      else:
+        m = re.search("^Page ([0-9]+) (.*): -+ begin text -+$", line)
+        if m:
+          pagenum, pagename = m.groups()
+          pagenum = int(pagenum)
+          check_comment()
+          in_multiline = True
+          templines = []
+        elif verbose:
+          msg("Skipping: %s" % line)
+
+# Binary find_regex.py output format, selected using --output-format binary. The file begins with
+# `find_regex_binary_magic` and is followed by one record per page, each consisting of the length of the record data
+# (packed as `find_regex_binary_length_struct`) followed by the data, which is zlib-compressed and consists of the
+# page's index, flags, title length and comment length (packed as `find_regex_binary_record_struct`) followed by the
+# UTF-8-encoded title, comment and text. The flags indicate whether there is a comment and whether it's the comment of
+# a change (as opposed to a comment carried over from previous find_regex.py output). A record length of 0 marks the
+# end of the records and is followed by the index, which is a zlib-compressed JSON list of entries in the format used by
+# FindRegexFile, then the offset and length of the index (packed as `find_regex_binary_footer_struct`) and
+# `find_regex_binary_magic` again. A file whose writer didn't get to finish (e.g. due to a crash) has no index but can
+# still be read sequentially.
+find_regex_binary_magic = b"BLIBFINDREGEX1\n"
+find_regex_binary_length_struct = struct.Struct("<I")
+find_regex_binary_record_struct = struct.Struct("<qBII")
+find_regex_binary_footer_struct = struct.Struct("<QQ")
+FIND_REGEX_HAS_COMMENT = 1
+FIND_REGEX_CHANGED = 2
+
+def encode_find_regex_record(index, pagetitle, comment, text, changed=False):
+  pagetitle = pagetitle.encode("utf-8")
+  flags = (FIND_REGEX_HAS_COMMENT if comment is not None else 0) | (FIND_REGEX_CHANGED if changed else 0)
+  comment = (comment or "").encode("utf-8")
+  data = zlib.compress(find_regex_binary_record_struct.pack(index, flags, len(pagetitle), len(comment)) + pagetitle +
+                       comment + text.encode("utf-8"))
+  return find_regex_binary_length_struct.pack(len(data)) + data
+
+# Decode the data of a record (not including the length prefix). Return a tuple (INDEX, TITLE, TEXT, COMMENT, CHANGED).
+def decode_find_regex_record(data):
+  data = zlib.decompress(data)
+  index, flags, title_len, comment_len = find_regex_binary_record_struct.unpack_from(data)
+  pos = find_regex_binary_record_struct.size
+  pagetitle = data[pos:pos + title_len].decode("utf-8")
+  pos += title_len
+  comment = data[pos:pos + comment_len].decode("utf-8") if flags & FIND_REGEX_HAS_COMMENT else None
+  pos += comment_len
+  return index, pagetitle, data[pos:].decode("utf-8"), comment, bool(flags & FIND_REGEX_CHANGED)
+
+# Read records sequentially from binary find_regex.py output in `fp` (opened in binary mode), positioned just after
+# the magic header. Yield tuples (OFFSET, LENGTH, DATA) where OFFSET and LENGTH cover the length prefix and data.
+def yield_find_regex_binary_records(fp, offset=len(find_regex_binary_magic)):
+  while True:
+    header = fp.read(find_regex_binary_length_struct.size)
+    if len(header) < find_regex_binary_length_struct.size:
+      break
+    length = find_regex_binary_length_struct.unpack(header)[0]
+    if length == 0:
+      break
+    data = fp.read(length)
+    if len(data) < length:
+      errmsg("WARNING: Truncated record at offset %s in binary find_regex output, stopping" % offset)
+      break
+    yield offset, len(header) + length, data
+    offset += len(header) + length
+
+class FindRegexBinaryWriter(object):
+  def __init__(self, filename):
+    self.fp = open(filename, "wb")
+    self.fp.write(find_regex_binary_magic)
+    self.entries = []
+    # Records generated in a worker process of process_in_parallel(), to be written by the parent.
+    self.pending = []
+    atexit.register(self.close)
+
+  def add(self, index, pagetitle, comment, text, changed=False):
+    record = encode_find_regex_record(index, pagetitle, comment, text, changed=changed)
+    if in_parallel_worker:
+      self.pending.append((record, index, pagetitle, comment))
+    else:
+      self.write_record(record, index, pagetitle, comment)
+
+  def write_record(self, record, index, pagetitle, comment):
+    self.entries.append([index, pagetitle, self.fp.tell(), len(record), comment])
+    self.fp.write(record)
+
+  def take_pending(self):
+    pending = self.pending
+    self.pending = []
+    return pending
+
+  def close(self):
+    if self.fp.closed:
+      return
+    self.fp.write(find_regex_binary_length_struct.pack(0))
+    index_offset = self.fp.tell()
+    index = zlib.compress(json.dumps(self.entries).encode("utf-8"))
+    self.fp.write(index)
+    self.fp.write(find_regex_binary_footer_struct.pack(index_offset, len(index)))
+    self.fp.write(find_regex_binary_magic)
+    self.fp.close()
+
+find_regex_binary_writer = None
+
+def get_find_regex_binary_writer(args):
+  global find_regex_binary_writer
+  if find_regex_binary_writer is None:
+    if not args.output_file:
+      raise ValueError("--output-file must be given with --output-format binary")
+    find_regex_binary_writer = FindRegexBinaryWriter(args.output_file)
+  return find_regex_binary_writer
+
+# Like yield_text_from_find_regex() but reads from the file object `fp` (e.g. sys.stdin), which may contain either
+# text or binary find_regex.py output; the format is detected automatically.
+def yield_text_from_find_regex_input(fp, verbose):
+  buf = getattr(fp, "buffer", None)
+  if buf is not None and hasattr(buf, "peek") and buf.peek(len(find_regex_binary_magic)).startswith(
+      find_regex_binary_magic):
+    buf.read(len(find_regex_binary_magic))
+    for _, _, data in yield_find_regex_binary_records(buf):
+      index, pagetitle, text, comment, _ = decode_find_regex_record(data)
+      yield index, pagetitle, text, comment
+  else:
+    for retval in yield_text_from_find_regex(fp, verbose):
+      yield retval
+
+find_regex_index_version = 2
+
+# Random-access reader for a find_regex.py output file (or any file in the same format). On first use, the file is
+# scanned once (following the same rules as yield_text_from_find_regex()) to build an index giving, for each page, its
+# index, title, any preceding comment and the byte offset and length of its text. The index is saved in a sidecar file
+# (FILENAME + ".idx") and reused as long as the output file's size and modification time are unchanged. The file itself
+# is memory-mapped and page text is only decoded when requested. Each entry in `entries` is a list
+# [INDEX, TITLE, OFFSET, LENGTH, COMMENT], in file order; `by_title` maps titles to entries (the last one, if a title
+# occurs more than once). If the output is in JSON format (see JSONLogSink), OFFSET and LENGTH are those of the JSON
+# record containing the text.
+class FindRegexFile(object):
+  def __init__(self, filename, use_sidecar=True):
+    self.filename = filename
+    self.fp = open(filename, "rb")
+    stat = os.fstat(self.fp.fileno())
+    self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+    self.entries = None
+    self.binary = self.mm[0:len(find_regex_binary_magic)] == find_regex_binary_magic
+    self.jsonl = False
+    sidecar = filename + ".idx"
+    if self.binary:
+      # Binary files contain their own index; no sidecar needed.
+      use_sidecar = False
+      self.entries = self.read_binary_index()
+    if use_sidecar:
+      try:
+        with open(sidecar, "r", encoding="utf-8") as fp:
+          index = json.load(fp)
+        if (index["version"] == find_regex_index_version and index["size"] == stat.st_size and
+            index["mtime_ns"] == stat.st_mtime_ns):
+          self.entries = index["entries"]
+          self.jsonl = index["jsonl"]
+      except (OSError, ValueError, KeyError):
+        pass
+    if self.entries is None:
+      self.entries = self.scan()
+      if use_sidecar:
+        try:
+          with open(sidecar, "w", encoding="utf-8") as fp:
+            json.dump({"version": find_regex_index_version, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                       "jsonl": self.jsonl, "entries": self.entries}, fp)
+        except OSError as e:
+          errmsg("WARNING: Unable to write find_regex index %s: %s" % (sidecar, e))
+    self.by_title = {entry[1]: entry for entry in self.entries}
+    self.indices = [entry[0] for entry in self.entries]
+    self.indices_sorted = all(x <= y for x, y in zip(self.indices, self.indices[1:]))
+
+  # Return the entries of a binary file from the index at the end, or by scanning the records if there's no index.
+  def read_binary_index(self):
+    footer_offset = len(self.mm) - find_regex_binary_footer_struct.size - len(find_regex_binary_magic)
+    if (footer_offset > len(find_regex_binary_magic) and
+        self.mm[footer_offset + find_regex_binary_footer_struct.size:] == find_regex_binary_magic):
+      index_offset, index_len = find_regex_binary_footer_struct.unpack_from(self.mm, footer_offset)
+      return json.loads(zlib.decompress(self.mm[index_offset:index_offset + index_len]).decode("utf-8"))
+    errmsg("WARNING: No index in binary find_regex output %s, scanning records" % self.filename)
+    self.fp.seek(len(find_regex_binary_magic))
+    entries = []
+    for offset, length, data in yield_find_regex_binary_records(self.fp):
+      index, pagetitle, _, comment, _ = decode_find_regex_record(data)
+      entries.append([index, pagetitle, offset, length, comment])
+    return entries
+
+  def scan(self):
+    entries = []
+    in_multiline = False
+    comment = None
+    offset = 0
+    json_prefix = log_record_prefix.encode("utf-8")
+    for line in iter(self.mm.readline, b"") if self.mm else []:
+      line_offset = offset
+      offset += len(line)
+      if in_multiline:
+        if line.startswith(b"-") and re.search(rb"^-+ end text -+$", line):
+          in_multiline = False
+          entries.append([pagenum, pagename, text_offset, line_offset - text_offset, comment])
+          comment = None
+        continue
+      if line.startswith(json_prefix):
+        record = decode_log_record(line.decode("utf-8"))
+        if record is None or "title" not in record:
+          continue
+        self.jsonl = True
+        m = find_regex_comment_msg_re.search(record["msg"])
+        if m:
+          comment_pagenum, comment_pagename, comment = record["index"], record["title"], m.group(1)
+        elif find_regex_text_msg_re.search(record["msg"]):
+          pagenum, pagename = record["index"], record["title"]
+          if comment is not None and (pagenum != comment_pagenum or pagename != comment_pagename):
+            errmsg("WARNING: Processing text for index %s, page '%s' but saw comment '%s' for different index %s, page '%s'; ignoring"
+              % (pagenum, pagename, comment, comment_pagenum, comment_pagename))
+            comment = None
+          entries.append([pagenum, pagename, line_offset, offset - line_offset, comment])
+          comment = None
+        continue
+      line = line.decode("utf-8").rstrip("\n")
+      m = re.search("^Page ([0-9]+) (.*): (?:Would save with comment|Skipped, no changes; previous comment) = (.*)$", line)
       if m:
         comment_pagenum, comment_pagename, comment = m.groups()
         comment_pagenum = int(comment_pagenum)
@@ -3173,9 +4942,58 @@ def yield_text_from_find_regex(lines, verbose):
               % (pagenum, pagename, comment, comment_pagenum, comment_pagename))
             comment = None
           in_multiline = True
-          templines = []
-        elif verbose:
-          msg("Skipping: %s" % line)
+          text_offset = offset
+    return entries
+
+  def __len__(self):
+    return len(self.entries)
+
+  # Return the text of `entry` as a memoryview into the file, without copying or decoding it. For binary and JSON-format
+  # files, the record has to be decoded, so the memoryview is into the decoded, UTF-8-encoded text.
+  def raw_text(self, entry):
+    if self.binary or self.jsonl:
+      return memoryview(self.text(entry).encode("utf-8"))
+    _, _, offset, length, _ = entry
+    return memoryview(self.mm)[offset:offset + length]
+
+  def text(self, entry):
+    _, _, offset, length, _ = entry
+    if self.binary:
+      header_len = find_regex_binary_length_struct.size
+      return decode_find_regex_record(self.mm[offset + header_len:offset + length])[2]
+    if self.jsonl:
+      record = json.loads(self.mm[offset:offset + length].decode("utf-8"))
+      return find_regex_text_msg_re.search(record["msg"]).group(1)
+    return self.mm[offset:offset + length].decode("utf-8")
+
+  # Return the text of page `pagetitle`, or None if not present.
+  def get_text(self, pagetitle):
+    entry = self.by_title.get(pagetitle)
+    return None if entry is None else self.text(entry)
+
+  # Return the entries whose index is between `start` and `end` (inclusive; either may be None). If the indices in the
+  # file are in order, this jumps straight to the first relevant entry rather than scanning.
+  def entries_in_range(self, start=None, end=None):
+    if not self.indices_sorted:
+      return [entry for entry in self.entries
+              if (start is None or entry[0] >= start) and (end is None or entry[0] <= end)]
+    lo = 0 if start is None else bisect.bisect_left(self.indices, start)
+    hi = len(self.entries) if end is None else bisect.bisect_right(self.indices, end)
+    return self.entries[lo:hi]
+
+  # Iterate over (INDEX, TITLE, TEXT, COMMENT) tuples as returned by yield_text_from_find_regex(), optionally
+  # restricted to the index range `start` to `end`. Non-integer `start` or `end` values (page title prefixes) are
+  # ignored; use iter_items() to handle them.
+  def iter_pages(self, start=None, end=None):
+    for entry in self.entries_in_range(start if isinstance(start, int) else None,
+                                       end if isinstance(end, int) else None):
+      yield entry[0], entry[1], self.text(entry), entry[4]
+
+  # Iterate over (ENTRY, OTHER_ENTRY) pairs for each entry in this file, where OTHER_ENTRY is the entry for the same
+  # title in `other` (another FindRegexFile), or None.
+  def join_by_title(self, other):
+    for entry in self.entries:
+      yield entry, other.by_title.get(entry[1])
 
 def yield_text_from_diff(lines, verbose):
   in_multiline = False
@@ -3184,6 +5002,21 @@ def yield_text_from_diff(lines, verbose):
       line = next(lines)
     except StopIteration:
       break
+    record = decode_log_record(line)
+    if record is not None:
+      if in_multiline and "title" in record:
+        in_multiline = False
+        yield pagenum, pagename, "".join(templines)
+      elif in_multiline:
+        templines.append(record["msg"] + "\n")
+      elif "title" in record and record["msg"] == "Diff:":
+        pagenum = str(record["index"])
+        pagename = record["title"]
+        in_multiline = True
+        templines = []
+      elif verbose:
+        msg("Skipping: %s" % line.rstrip('\n'))
+      continue
     if in_multiline and re.search("^Page [0-9]+", line):
       in_multiline = False
       yield pagenum, pagename, "".join(templines)
@@ -3208,53 +5041,77 @@ def yield_pages_from_previous_output(lines, verbose):
       line = next(lines)
     except StopIteration:
       break
-    line = line.rstrip('\n')
-    m = re.search("^Page ([0-9]+) (.*?): ", line)
-    if m:
+    record = decode_log_record(line)
+    if record is not None:
+      if not isinstance(record.get("index"), int):
+        continue
+      pagenum = record["index"]
+      pagename = record["title"]
+    else:
+      m = re.search("^Page ([0-9]+) (.*?): ", line.rstrip('\n'))
+      if not m:
+        continue
       pagenum = int(m.group(1))
       pagename = m.group(2)
-      if pagenum != prev_pagenum or pagename != prev_pagename:
-        yield pagenum, pagename
-      prev_pagenum = pagenum
-      prev_pagename = pagename
-
-def do_process(q, iolock, process):
-  while True:
-    item = q.get()
-    if item is None:
-      break
-    process(item, iolock)
-
-def process_in_parallel(generator, process, num_workers=5):
-  q = mp.Queue(maxsize=num_workers)
-  iolock = mp.Lock()
-  pool = mp.Pool(num_workers, initializer=do_process, initargs=(q, iolock, process))
-  for index, item in enumerate(generator):
-    q.put(item)  # blocks until q below its max size
-    with iolock:
-      msg("Queued item #%s" % (index + 1))
-  for _ in range(num_workers):  # tell workers we're done
-    q.put(None)
-  pool.close()
-  pool.join()
-
-# From wikibooks
-def levenshtein(s1, s2):
-    if len(s1) < len(s2):
-        return levenshtein(s2, s1)
-
-    # len(s1) >= len(s2)
-    if len(s2) == 0:
-        return len(s1)
-
-    previous_row = list(range(len(s2) + 1))
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1 # j+1 instead of j since previous_row and current_row are one character longer
-            deletions = current_row[j] + 1       # than s2
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-
-    return previous_row[-1]
+    if pagenum != prev_pagenum or pagename != prev_pagename:
+      yield pagenum, pagename
+    prev_pagenum = pagenum
+    prev_pagename = pagename
+
+# Function called on each item by the worker processes of process_in_parallel(). It's set before the worker pool is
+# created so that the (forked) workers inherit it; this way it needn't be picklable, which closures aren't.
+parallel_process_fn = None
+# True in the worker processes of process_in_parallel().
+in_parallel_worker = False
+
+# Returns the captured stdout and any records destined for the binary find_regex.py output file, which is written only
+# by the parent process.
+def call_parallel_process_fn(item):
+  global in_parallel_worker
+  in_parallel_worker = True
+  saved_stdout = sys.stdout
+  sys.stdout = io.StringIO()
+  try:
+    result = parallel_process_fn(item)
+    log_sink.flush()
+    return (sys.stdout.getvalue(), find_regex_binary_writer.take_pending() if find_regex_binary_writer else [],
+            result)
+  finally:
+    sys.stdout = saved_stdout
+
+# Call `process` on each item yielded by `items` using a pool of `num_workers` worker processes. Anything written to
+# stdout while processing an item is captured in the worker and written out by the parent process in the order the
+# items were yielded, so the output is the same as when processing serially. Items are handed to the workers in
+# groups of `chunksize` to reduce interprocess overhead. `process` runs in a separate process, so any changes it makes
+# to global state (e.g. counts of templates seen) are not visible in the parent process. If given, `item_done` is
+# called in the parent process after the output of each item has been written, with the return value of `process` for
+# the item (which must therefore be picklable).
+def process_in_parallel(items, process, num_workers=5, chunksize=20, item_done=None):
+  global parallel_process_fn
+  parallel_process_fn = process
+  # Flush any pending output so it isn't duplicated by the workers when they flush their inherited copy on exit.
+  log_sink.flush()
+  if find_regex_binary_writer:
+    find_regex_binary_writer.fp.flush()
+  pool = mp.get_context("fork").Pool(num_workers)
+  try:
+    for output, records, result in pool.imap(call_parallel_process_fn, items, chunksize):
+      if output:
+        sys.stdout.write(output)
+      for record in records:
+        find_regex_binary_writer.write_record(*record)
+      if item_done:
+        item_done(result)
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+    parallel_process_fn = None
+
+# Return the Levenshtein distance between S1 and S2. If MAX_DISTANCE is given and the distance is greater, return
+# MAX_DISTANCE + 1. See editdist.py.
+def levenshtein(s1, s2, max_distance=None):
+  import editdist
+  return editdist.distance(s1, s2, max_distance)
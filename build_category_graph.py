@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Build a snapshot of the category graph of a Wiktionary XML dump (see dumplib.CategoryGraph), for traversing
+# categories using --category-graph in place of live queries. The dump is read from the file given using --dump (which
+# may be compressed using bzip2) or else from stdin. Category memberships added by templates can be supplied using
+# --memberships.
+
+import sys, bz2, argparse
+
+import blib
+from blib import msg
+import dumplib
+
+parser = argparse.ArgumentParser(description="Build a snapshot of the category graph of a dump.")
+parser.add_argument("--dump", help="XML dump to read, optionally compressed using bzip2; default is to read from stdin.")
+parser.add_argument("--memberships", help="File of additional category memberships, each line consisting of a page title and a category name (with or without the Category: prefix) separated by a tab; optionally compressed using bzip2.")
+parser.add_argument("--no-dump", action="store_true", help="Don't read a dump; use only the memberships given using --memberships.")
+parser.add_argument("--output", help="Category graph file to write.", required=True)
+parser.add_argument("--dump-date", help="Date of the dump (e.g. 2024-01-01T00:00:00Z), recorded in the snapshot.")
+args = parser.parse_args()
+
+writer = dumplib.CategoryGraphWriter(args.output)
+if args.dump_date:
+  writer.set_meta("dump_date", args.dump_date)
+
+if not args.no_dump:
+  if not args.dump:
+    fp = sys.stdin
+  elif args.dump.endswith(".bz2"):
+    fp = bz2.open(args.dump, "rb")
+  else:
+    fp = open(args.dump, "rb")
+  for index, title, text in blib.yield_dump_pages(fp):
+    writer.add_page(title, text)
+
+if args.memberships:
+  if args.memberships.endswith(".bz2"):
+    fp = bz2.open(args.memberships, "rt", encoding="utf-8")
+  else:
+    fp = open(args.memberships, "r", encoding="utf-8")
+  for lineno, line in enumerate(fp, 1):
+    line = line.rstrip("\n")
+    if not line:
+      continue
+    parts = line.split("\t")
+    if len(parts) != 2:
+      msg("WARNING: Line %s of %s doesn't have two tab-separated fields, skipping: %s" % (
+        lineno, args.memberships, line))
+      continue
+    title, category = parts
+    writer.add_membership(dumplib.normalize_title(title), dumplib.category_title(category))
+
+writer.close()
+msg("Recorded %s category memberships of %s pages in %s" % (writer.num_memberships, writer.num_pages, args.output))
+blib.elapsed_time()
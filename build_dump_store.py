@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Convert a Wiktionary XML dump into a dump store (see dumplib.py), for offline lookup of page text and existence
+# using --dump-store. The dump is read from the file given using --dump (which may be compressed using bzip2) or else
+# from stdin.
+
+import sys, bz2, argparse
+
+import blib
+from blib import msg, errmsg
+import dumplib
+
+parser = argparse.ArgumentParser(description="Convert a Wiktionary XML dump into a dump store.")
+parser.add_argument("--dump", help="XML dump to read, optionally compressed using bzip2; default is to read from stdin.")
+parser.add_argument("--output", help="Dump store file to write.", required=True)
+parser.add_argument("--block-size", help="Approximate size in bytes of each compressed block of page text (default %(default)s).",
+    type=int, default=dumplib.default_block_size)
+args = parser.parse_args()
+
+if not args.dump:
+  fp = sys.stdin
+elif args.dump.endswith(".bz2"):
+  fp = bz2.open(args.dump, "rb")
+else:
+  fp = open(args.dump, "rb")
+
+writer = dumplib.DumpStoreWriter(args.output, block_size=args.block_size)
+num_pages = 0
+for index, title, text in blib.yield_dump_pages(fp):
+  if writer.add_page(index, title, text):
+    num_pages += 1
+  else:
+    errmsg("Page %s %s: WARNING: Duplicate page title, skipping" % (index, title))
+writer.close()
+msg("Wrote %s pages to %s" % (num_pages, args.output))
+blib.elapsed_time()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Build an index of the heads, inflections and adjective forms on all Russian pages in a Wiktionary XML dump, for use
+# with --head-index in place of live page lookups by ruheadlib.lookup_heads_and_inflections() (e.g. in
+# auto_accent_auto_bracket_ru.py). The dump is read from the file given using --dump (which may be compressed using
+# bzip2) or else from stdin. Finding the heads of {{ru-noun+}} and the forms of {{ru-decl-adj}} requires expanding
+# templates, which is much faster with --local-lua and/or --expand-text-cache.
+
+import sys, re, bz2
+
+import blib
+from blib import msg
+import ruheadlib
+
+parser = blib.create_argparser("Build an index of the heads and inflections on Russian pages in a dump.",
+    suppress_start_end=True)
+parser.add_argument("--dump", help="XML dump to read, optionally compressed using bzip2; default is to read from stdin.")
+parser.add_argument("--output", help="Head index file to write.", required=True)
+parser.add_argument("--dump-date", help="Date of the dump (e.g. 2024-01-01T00:00:00Z), used by --head-index-overlay to find the pages changed since the dump.")
+args = parser.parse_args()
+
+if not args.dump:
+  fp = sys.stdin
+elif args.dump.endswith(".bz2"):
+  fp = bz2.open(args.dump, "rb")
+else:
+  fp = open(args.dump, "rb")
+
+index = ruheadlib.RuHeadIndex(args.output)
+if args.dump_date:
+  index.set_meta("dump_date", args.dump_date)
+num_pages = 0
+for pageind, pagetitle, text in blib.yield_dump_pages(fp):
+  def pagemsg(txt):
+    if args.verbose:
+      msg("Page %s %s: %s" % (pageind, pagetitle, txt))
+  if re.match("#redirect", text, re.I):
+    # Only Russian terms are looked up, so only redirects from Cyrillic titles are needed.
+    if not re.search("[Ѐ-ӿ]", pagetitle):
+      continue
+  elif "==Russian==" not in text:
+    continue
+  info, yoful_page = ruheadlib.find_heads_and_inflections(pagetitle, text, pagemsg)
+  if info == "no-russian":
+    continue
+  index.add(pagetitle, info, yoful_page)
+  num_pages += 1
+  if num_pages % 1000 == 0:
+    index.commit()
+index.commit()
+msg("Indexed %s pages in %s" % (num_pages, args.output))
+blib.elapsed_time()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Build an index of the pages transcluded by each page in a Wiktionary XML dump (see dumplib.TransclusionIndex), for
+# finding the pages that transclude a template using --transclusion-index in place of live queries. The dump is read
+# from the file given using --dump (which may be compressed using bzip2) or else from stdin. The namespaces listed in
+# the <siteinfo> of the dump are used to recognize namespace prefixes.
+
+import sys, bz2, argparse
+
+import blib
+from blib import msg
+import dumplib
+
+parser = argparse.ArgumentParser(description="Build an index of the pages transcluded by each page in a dump.")
+parser.add_argument("--dump", help="XML dump to read, optionally compressed using bzip2; default is to read from stdin.")
+parser.add_argument("--output", help="Transclusion index file to write.", required=True)
+parser.add_argument("--dump-date", help="Date of the dump (e.g. 2024-01-01T00:00:00Z), recorded in the index.")
+args = parser.parse_args()
+
+if not args.dump:
+  fp = sys.stdin
+elif args.dump.endswith(".bz2"):
+  fp = bz2.open(args.dump, "rb")
+else:
+  fp = open(args.dump, "rb")
+
+writer = dumplib.TransclusionIndexWriter(args.output)
+if args.dump_date:
+  writer.set_meta("dump_date", args.dump_date)
+namespaces = {}
+for index, title, text in blib.yield_dump_pages(fp, namespaces=namespaces):
+  if writer.num_pages == 0 and namespaces:
+    writer.set_namespaces(namespaces)
+  writer.add_page(index, title, text)
+writer.close()
+msg("Indexed %s pages in %s" % (writer.num_pages, args.output))
+blib.elapsed_time()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Check that blib.scan_templates() finds the same templates (with the same names and parameters) as a full parse with
+# blib.parse_text(), and compare the time taken by the two. Normally run on a dump using --stdin. With --check-modify,
+# also check that modifying each template found by scan_templates() produces the same text as making the same
+# modification to the parse tree. Pages that scan_templates() has to parse in full are counted separately.
+
+import pywikibot, re, sys, argparse, time
+
+import blib
+from blib import getparam, rmparam, msg, site, tname
+
+parser = blib.create_argparser("Compare blib.scan_templates() against a full parse", include_pagefile=True,
+  include_stdin=True)
+parser.add_argument("--names", help="Comma-separated template names to pass to scan_templates().")
+parser.add_argument("--check-modify", action="store_true", help="Also check modifying each template.")
+args = parser.parse_args()
+start, end = blib.parse_start_end(args.start, args.end)
+
+names = args.names.split(",") if args.names else None
+# Don't let the parse cache make either method look faster.
+blib.parse_cache_size = 0
+
+stats = {"pages": 0, "scanned": 0, "fallback": 0, "prefiltered": 0, "mismatched": 0, "templates": 0}
+times = {"parse": 0.0, "scan": 0.0}
+
+def template_contents(t):
+  return (str(t), str(t.name), [(str(param.name), str(param.value), param.showkey) for param in t.params])
+
+def process_text_on_page(index, pagetitle, text):
+  def pagemsg(txt):
+    msg("Page %s %s: %s" % (index, pagetitle, txt))
+
+  stats["pages"] += 1
+  starttime = time.time()
+  parsed_templates = blib.parse_text(text).filter_templates()
+  if names is not None:
+    parsed_templates = [t for t in parsed_templates if tname(t) in names]
+  parsed_contents = [template_contents(t) for t in parsed_templates]
+  times["parse"] += time.time() - starttime
+
+  starttime = time.time()
+  scanned = blib.scan_templates(text, names)
+  scanned_contents = [template_contents(t) for t in scanned.filter_templates()]
+  times["scan"] += time.time() - starttime
+
+  if scanned.parsed is not None:
+    stats["fallback"] += 1
+  elif names is not None and not any(name in text for name in names):
+    stats["prefiltered"] += 1
+  else:
+    stats["scanned"] += 1
+  stats["templates"] += len(parsed_contents)
+  if scanned_contents != parsed_contents:
+    stats["mismatched"] += 1
+    pagemsg("WARNING: Scanned templates differ from parsed templates")
+    for parsed_t, scanned_t in zip(parsed_contents, scanned_contents):
+      if parsed_t != scanned_t:
+        pagemsg("  Parsed: %s" % (parsed_t,))
+        pagemsg("  Scanned: %s" % (scanned_t,))
+        break
+    else:
+      pagemsg("  Parsed %s templates, scanned %s" % (len(parsed_contents), len(scanned_contents)))
+    return
+
+  if args.check_modify and scanned.parsed is None:
+    for i in range(len(parsed_contents)):
+      parsed = blib.parse_text(text)
+      parsed_t = [t for t in parsed.filter_templates() if names is None or tname(t) in names][i]
+      scanned = blib.scan_templates(text, names)
+      scanned_t = scanned.filter_templates()[i]
+      for t in [parsed_t, scanned_t]:
+        blib.set_param_chain(t, ["scan-test-1", "scan-test-2"], "scantest")
+        if t.has("1"):
+          t.get("1").value = "scan-test"
+        if t.params:
+          rmparam(t, blib.pname(t.params[-1]))
+        t.name = "scan-test-" + tname(t)
+      if str(scanned) != str(parsed):
+        stats["mismatched"] += 1
+        pagemsg("WARNING: Modifying scanned template #%s gives different text: %s" % (i + 1, str(scanned_t)))
+        return
+
+blib.do_pagefile_cats_refs(args, start, end, process_text_on_page, stdin=True)
+msg("%s pages: %s scanned, %s prefiltered, %s parsed in full; %s templates; %s mismatched" % (
+  stats["pages"], stats["scanned"], stats["prefiltered"], stats["fallback"], stats["templates"],
+  stats["mismatched"]))
+msg("Full parse: %.1f ms, scan: %.1f ms (%.2fx)" % (times["parse"] * 1000, times["scan"] * 1000,
+  times["parse"] / times["scan"] if times["scan"] > 0 else 0))
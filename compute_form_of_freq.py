@@ -19,7 +19,7 @@ def process_text_on_page(pagetitle, index, text):
     pagemsg("WARNING: Page should be ignored")
     return None, None
 
-  parsed = blib.parse_text(text)
+  parsed = blib.scan_templates(text, ["form of"])
   for t in parsed.filter_templates():
     tn = tname(t)
     if tn == "form of":
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Convert find_regex.py output between the legacy text format (suitable for manual editing and for
+# push_find_regex_changes.py) and the binary format produced using --output-format binary. The format of the input
+# file is detected automatically. Text output goes to stdout.
+
+import argparse
+
+import blib
+from blib import msg
+
+parser = argparse.ArgumentParser(description="Convert find_regex.py output between text and binary formats.")
+parser.add_argument("--input", help="find_regex.py output file to convert (text or binary).", required=True)
+parser.add_argument("--to", help="Format to convert to.", choices=["text", "binary"], default="text")
+parser.add_argument("--output", help="Output file when converting to binary.")
+args = parser.parse_args()
+
+infile = blib.FindRegexFile(args.input)
+
+if args.to == "binary":
+  if not args.output:
+    raise ValueError("--output must be given when converting to binary")
+  writer = blib.FindRegexBinaryWriter(args.output)
+  for index, pagetitle, text, comment in infile.iter_pages():
+    if not text.endswith("\n"):
+      text += "\n"
+    writer.add(index, pagetitle, comment, text)
+  writer.close()
+else:
+  for entry in infile.entries:
+    index, pagetitle, _, _, comment = entry
+    def pagemsg(txt):
+      msg("Page %s %s: %s" % (index, pagetitle, txt))
+    if infile.binary:
+      _, _, text, comment, changed = blib.decode_find_regex_record(
+        infile.mm[entry[2] + blib.find_regex_binary_length_struct.size:entry[2] + entry[3]])
+    else:
+      text = infile.text(entry)
+      changed = False
+    if comment is not None:
+      if changed:
+        pagemsg("Would save with comment = %s" % comment)
+      else:
+        pagemsg("Skipped, no changes; previous comment = %s" % comment)
+    blib.output_find_regex_text(None, index, pagetitle, text, comment, pagemsg)
@@ -5,6 +5,7 @@ import pywikibot, re, sys, argparse, unicodedata, json
 
 import blib
 from blib import getparam, rmparam, msg, errandmsg, site, tname, pname, rsub_repeatedly
+import editdist
 
 module_name = "zlw-lch-IPA"
 
@@ -546,7 +547,7 @@ def process_text_on_page(index, pagetitle, text):
             levenshtein_respellings.append("-")
           else:
             levenshtein_respellings.append(
-              str(blib.levenshtein(re.sub("[ ,.-]", "", pagetitle), re.sub("[ ,'.-]", "", respelling))))
+              str(editdist.distance(re.sub("[ ,.-]", "", pagetitle), re.sub("[ ,'.-]", "", respelling))))
         levenshtein_respellings = ",".join(levenshtein_respellings)
         msg("NEW Page\t%s.%03d\t%s\t%s\t%s\t%s\t%s\t{{pl-pr%s}}\t%s\t%s\t%s\t<begin> %s <end>" % (
           index, template_index, pagetitle, pagetitle[::-1], origt, levenshtein_respellings, joined_pl_p_prons,
@@ -866,9 +866,16 @@ def create_inflection_entry(program_args, save, index, inflections, lemma,
       warn("Skipping form because in skip_form_pages for lemma %s" % skip_lemma)
       return warnings
 
-  # Remove any redundant manual translit
-  lemma, lemmatr = check_for_redundant_translit(lemma, lemmatr, pagemsg, warn, expand_text)
-  inflections = [check_for_redundant_translit(infl, infltr, pagemsg, warn, expand_text) for infl, infltr in inflections]
+  # Remove any redundant manual translit. Generate all the needed translits in one request.
+  xlit_calls = ["{{xlit|ru|%s}}" % ru for ru, tr in [(lemma, lemmatr)] + inflections if tr]
+  xlits = dict(zip(xlit_calls, blib.expand_text_batch(xlit_calls, pagename, pagemsg, verbose)))
+  def expand_xlit_text(tempcall):
+    if tempcall in xlits:
+      return xlits[tempcall]
+    return expand_text(tempcall)
+  lemma, lemmatr = check_for_redundant_translit(lemma, lemmatr, pagemsg, warn, expand_xlit_text)
+  inflections = [check_for_redundant_translit(infl, infltr, pagemsg, warn, expand_xlit_text)
+                 for infl, infltr in inflections]
 
   is_participle = "_part" in infltype
   is_adverbial_participle = "adv_part" in infltype
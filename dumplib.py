@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Support for a local, indexed snapshot of the pages in a Wiktionary dump ("dump store"), allowing the text of
+# arbitrary pages to be looked up offline without re-parsing the dump or making a live request. Use
+# build_dump_store.py to create a dump store from an XML dump and the --dump-store argument (see blib.py) to make
+# blib.safe_page_text() and blib.safe_page_exists() consult it.
+#
+# A dump store is a single file laid out as follows:
+#
+# 1. A header consisting of `magic`.
+# 2. The page texts, grouped in dump order into blocks of approximately `default_block_size` bytes (before
+#    compression), each block compressed separately using zlib. The texts in a block are simply concatenated.
+# 3. The block table: for each block, its file offset and compressed length, packed using `block_struct`.
+# 4. The titles, encoded in UTF-8 and concatenated, in sorted order.
+# 5. The entry table: for each page, sorted by UTF-8-encoded title, the offset and length of its title in the
+#    title section, the block containing its text, the offset and length of its text in the uncompressed block and
+#    its index in the dump, packed using `entry_struct`.
+# 6. A footer, packed using `footer_struct`, giving the offsets of the above sections and the number of blocks and
+#    entries, followed by `magic`.
+#
+# Lookups binary-search the memory-mapped entry table, so only the blocks actually needed are read and decompressed.
+# Recently used blocks are cached.
+
+import json, mmap, re, sqlite3, struct, zlib
+from array import array
+from collections import OrderedDict
+
+magic = b"BLIBDUMPSTORE1\n"
+block_struct = struct.Struct("<QI")
+entry_struct = struct.Struct("<QIIIII")
+footer_struct = struct.Struct("<QQQQQ")
+default_block_size = 1 << 18
+
+class DumpStoreError(Exception):
+  pass
+
+# Write a dump store. Call add_page() on each page in dump order, then close().
+class DumpStoreWriter(object):
+  def __init__(self, filename, block_size=default_block_size, compress_level=6):
+    self.fp = open(filename, "wb")
+    self.fp.write(magic)
+    self.block_size = block_size
+    self.compress_level = compress_level
+    self.block_parts = []
+    self.block_len = 0
+    self.blocks = []
+    self.titles = []
+    self.seen_titles = set()
+    self.entry_block = array("I")
+    self.entry_offset = array("I")
+    self.entry_length = array("I")
+    self.entry_index = array("I")
+
+  def flush_block(self):
+    if not self.block_parts:
+      return
+    data = zlib.compress(b"".join(self.block_parts), self.compress_level)
+    self.blocks.append((self.fp.tell(), len(data)))
+    self.fp.write(data)
+    self.block_parts = []
+    self.block_len = 0
+
+  # Add a page. If a page with the same title has already been added, the new one is ignored and False returned.
+  def add_page(self, index, title, text):
+    title = title.encode("utf-8")
+    if title in self.seen_titles:
+      return False
+    self.seen_titles.add(title)
+    text = text.encode("utf-8")
+    self.titles.append(title)
+    self.entry_block.append(len(self.blocks))
+    self.entry_offset.append(self.block_len)
+    self.entry_length.append(len(text))
+    self.entry_index.append(index)
+    self.block_parts.append(text)
+    self.block_len += len(text)
+    if self.block_len >= self.block_size:
+      self.flush_block()
+    return True
+
+  def close(self):
+    self.flush_block()
+    block_table_offset = self.fp.tell()
+    for block_offset, block_len in self.blocks:
+      self.fp.write(block_struct.pack(block_offset, block_len))
+    titles_offset = self.fp.tell()
+    order = sorted(range(len(self.titles)), key=self.titles.__getitem__)
+    title_offsets = []
+    title_offset = 0
+    for i in order:
+      self.fp.write(self.titles[i])
+      title_offsets.append(title_offset)
+      title_offset += len(self.titles[i])
+    entries_offset = self.fp.tell()
+    for title_offset, i in zip(title_offsets, order):
+      self.fp.write(entry_struct.pack(title_offset, len(self.titles[i]), self.entry_block[i],
+                                      self.entry_offset[i], self.entry_length[i], self.entry_index[i]))
+    self.fp.write(footer_struct.pack(block_table_offset, len(self.blocks), titles_offset, entries_offset,
+                                     len(self.titles)))
+    self.fp.write(magic)
+    self.fp.close()
+    self.seen_titles = None
+
+# Read a dump store. Lookups are by title, which should be given as it appears in the dump, including any namespace
+# prefix (i.e. in the same form as str(page.title()) in Pywikibot).
+class DumpStore(object):
+  def __init__(self, filename, num_cached_blocks=16):
+    self.filename = filename
+    self.fp = open(filename, "rb")
+    self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+    footer_offset = len(self.mm) - footer_struct.size - len(magic)
+    if (footer_offset < len(magic) or self.mm[0:len(magic)] != magic or
+        self.mm[footer_offset + footer_struct.size:] != magic):
+      raise DumpStoreError("%s is not a dump store" % filename)
+    (self.block_table_offset, self.num_blocks, self.titles_offset, self.entries_offset,
+        self.num_entries) = footer_struct.unpack_from(self.mm, footer_offset)
+    self.num_cached_blocks = num_cached_blocks
+    self.cached_blocks = OrderedDict()
+
+  def __len__(self):
+    return self.num_entries
+
+  def entry(self, i):
+    return entry_struct.unpack_from(self.mm, self.entries_offset + i * entry_struct.size)
+
+  def entry_title(self, i):
+    title_offset, title_len = struct.unpack_from("<QI", self.mm, self.entries_offset + i * entry_struct.size)
+    start = self.titles_offset + title_offset
+    return self.mm[start:start + title_len]
+
+  # Return the position in the entry table of the first title >= `title`.
+  def lower_bound(self, title):
+    title = title.encode("utf-8")
+    lo = 0
+    hi = self.num_entries
+    while lo < hi:
+      mid = (lo + hi) // 2
+      if self.entry_title(mid) < title:
+        lo = mid + 1
+      else:
+        hi = mid
+    return lo
+
+  # Return the position of `title` in the entry table, or None if not found.
+  def find(self, title):
+    i = self.lower_bound(title)
+    if i < self.num_entries and self.entry_title(i) == title.encode("utf-8"):
+      return i
+    return None
+
+  def __contains__(self, title):
+    return self.find(title) is not None
+
+  def block(self, blockno):
+    if blockno in self.cached_blocks:
+      self.cached_blocks.move_to_end(blockno)
+      return self.cached_blocks[blockno]
+    block_offset, block_len = block_struct.unpack_from(self.mm, self.block_table_offset + blockno * block_struct.size)
+    data = zlib.decompress(self.mm[block_offset:block_offset + block_len])
+    self.cached_blocks[blockno] = data
+    if len(self.cached_blocks) > self.num_cached_blocks:
+      self.cached_blocks.popitem(last=False)
+    return data
+
+  def entry_text(self, i):
+    _, _, blockno, offset, length, _ = self.entry(i)
+    return self.block(blockno)[offset:offset + length].decode("utf-8")
+
+  # Return the text of page `title`, or None if the page isn't in the store.
+  def get(self, title):
+    i = self.find(title)
+    if i is None:
+      return None
+    return self.entry_text(i)
+
+  # Return the index of page `title` in the dump, or None if the page isn't in the store.
+  def get_index(self, title):
+    i = self.find(title)
+    if i is None:
+      return None
+    return self.entry(i)[5]
+
+  # Iterate over titles in sorted order (by UTF-8 encoding), starting at `start` if given.
+  def titles(self, start=None):
+    i = 0 if start is None else self.lower_bound(start)
+    while i < self.num_entries:
+      yield self.entry_title(i).decode("utf-8")
+      i += 1
+
+  # Iterate over (INDEX, TITLE, TEXT) for all pages, in dump order.
+  def iter_pages(self):
+    order = sorted(range(self.num_entries), key=lambda i: self.entry(i)[5])
+    for i in order:
+      yield self.entry(i)[5], self.entry_title(i).decode("utf-8"), self.entry_text(i)
+
+  def close(self):
+    self.mm.close()
+    self.fp.close()
+
+# Index of the templates (and other pages) transcluded by each page in a dump, for finding the pages that transclude a
+# given template offline, in place of live queries using blib.references(). Use build_transclusion_index.py to create
+# one from an XML dump and the --transclusion-index argument (see blib.py) to make --refs and the `default_refs` of
+# blib.do_pagefile_cats_refs() consult it.
+#
+# The index is an SQLite file recording, for each page in the dump, its title, its index in the dump and the pages it
+# directly transcludes, as found in its text. For pages in the Template namespace, the pages transcluded when the page
+# is itself transcluded (i.e. not counting <noinclude> sections, or counting only <onlyinclude> sections if any) are
+# recorded separately, along with template redirects. The pages transcluding a template are those directly
+# transcluding it, a redirect to it or (recursively) a template that transcludes it, similarly to the templatelinks
+# table consulted by live queries. Unlike live queries, modules loaded using require() aren't tracked, and only
+# transclusions are found, not links. The namespaces of the dump, as given using set_namespaces(), are recorded in the
+# `namespaces` meta entry, so that titles are looked up the same way they were indexed.
+class TransclusionIndexWriter(object):
+  def __init__(self, filename):
+    self.conn = sqlite3.connect(filename)
+    for table in ["pages", "names", "transclusions", "includes", "redirects", "meta"]:
+      self.conn.execute("DROP TABLE IF EXISTS %s" % table)
+    self.conn.execute("CREATE TABLE pages (id INTEGER PRIMARY KEY, title TEXT, dump_index INTEGER)")
+    self.conn.execute("CREATE TABLE names (id INTEGER PRIMARY KEY, title TEXT UNIQUE)")
+    self.conn.execute("CREATE TABLE transclusions (name INTEGER, page INTEGER)")
+    self.conn.execute("CREATE TABLE includes (name INTEGER, template INTEGER)")
+    self.conn.execute("CREATE TABLE redirects (name INTEGER, target INTEGER)")
+    self.conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    self.name_ids = {}
+    self.num_pages = 0
+    self.pending = {"pages": [], "transclusions": [], "includes": [], "redirects": []}
+    self.namespace_names = default_namespace_names
+
+  def set_meta(self, key, value):
+    self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+  # Use `namespaces`, a dictionary mapping namespace numbers to names (e.g. as read from the <siteinfo> of the dump),
+  # to recognize namespace prefixes in the titles of the pages added afterwards.
+  def set_namespaces(self, namespaces):
+    self.namespace_names = namespace_names(namespaces)
+    self.set_meta("namespaces", json.dumps({str(number): name for number, name in namespaces.items()}))
+
+  def name_id(self, title):
+    name_id = self.name_ids.get(title)
+    if name_id is None:
+      name_id = len(self.name_ids) + 1
+      self.name_ids[title] = name_id
+      self.conn.execute("INSERT INTO names VALUES (?, ?)", (name_id, title))
+    return name_id
+
+  def flush(self):
+    for table, rows in self.pending.items():
+      if rows:
+        self.conn.executemany("INSERT INTO %s VALUES (%s)" % (table, ", ".join("?" * len(rows[0]))), rows)
+        del rows[:]
+
+  def add_page(self, index, title, text):
+    self.num_pages += 1
+    page_id = self.num_pages
+    self.pending["pages"].append((page_id, title, index))
+    for transcluded in transcluded_titles(text, transcluding=False, namespace_names=self.namespace_names):
+      self.pending["transclusions"].append((self.name_id(transcluded), page_id))
+    if title.startswith("Template:"):
+      name_id = self.name_id(title)
+      m = redirect_re.match(text)
+      if m:
+        target = normalize_title(m.group(1), namespace_names=self.namespace_names)
+        if target:
+          self.pending["redirects"].append((name_id, self.name_id(target)))
+      else:
+        for transcluded in transcluded_titles(text, transcluding=True, namespace_names=self.namespace_names):
+          self.pending["includes"].append((self.name_id(transcluded), name_id))
+    if len(self.pending["transclusions"]) >= 100000:
+      self.flush()
+
+  def close(self):
+    self.flush()
+    self.conn.execute("CREATE INDEX transclusions_name ON transclusions (name)")
+    self.conn.execute("CREATE INDEX includes_name ON includes (name)")
+    self.conn.execute("CREATE INDEX redirects_target ON redirects (target)")
+    self.conn.commit()
+    self.conn.close()
+
+# Read a transclusion index (see TransclusionIndexWriter).
+class TransclusionIndex(object):
+  def __init__(self, filename):
+    self.filename = filename
+    self.conn = sqlite3.connect(filename)
+    namespaces = self.get_meta("namespaces")
+    if namespaces:
+      self.namespace_names = namespace_names({int(number): name for number, name in json.loads(namespaces).items()})
+    else:
+      self.namespace_names = default_namespace_names
+
+  def get_meta(self, key):
+    row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+  # Return the IDs of `title` and of the templates that transclude it, directly or indirectly, or redirect to it.
+  def transcluding_name_ids(self, title):
+    row = self.conn.execute("SELECT id FROM names WHERE title = ?",
+                            (normalize_title(title, namespace_names=self.namespace_names),)).fetchone()
+    if not row:
+      return set()
+    name_ids = {row[0]}
+    to_check = [row[0]]
+    while to_check:
+      name_id = to_check.pop()
+      for (other_id,) in self.conn.execute(
+          "SELECT template FROM includes WHERE name = ? UNION SELECT name FROM redirects WHERE target = ?",
+          (name_id, name_id)):
+        if other_id not in name_ids:
+          name_ids.add(other_id)
+          to_check.append(other_id)
+    return name_ids
+
+  # Return a list of (INDEX, TITLE) for the pages transcluding `title` (see TransclusionIndexWriter), in dump order,
+  # where INDEX is the index of the page in the dump.
+  def references(self, title):
+    page_ids = set()
+    name_ids = list(self.transcluding_name_ids(title))
+    # Stay under SQLite's limit on the number of parameters in a query.
+    for i in range(0, len(name_ids), 500):
+      group = name_ids[i:i + 500]
+      page_ids.update(page_id for (page_id,) in self.conn.execute(
+        "SELECT page FROM transclusions WHERE name IN (%s)" % ", ".join("?" * len(group)), group))
+    pages = []
+    for page_id in page_ids:
+      title, index = self.conn.execute("SELECT title, dump_index FROM pages WHERE id = ?", (page_id,)).fetchone()
+      pages.append((index, title))
+    return sorted(pages)
+
+  def close(self):
+    self.conn.close()
+
+redirect_re = re.compile(r"\s*#redirect\s*:?\s*\[\[([^\[\]|#]*)", re.I)
+transclusion_re = re.compile(r"(?<!\{)\{\{(?!\{)\s*([^{}|\[\]<>\n]*?)\s*(?=\||\}\})")
+# Text not rendered on a page (`transcluding` is False) or when it is transcluded (`transcluding` is True).
+not_rendered_re = {
+  False: re.compile(r"<!--.*?(?:-->|\Z)|<nowiki>.*?</nowiki>|<includeonly>.*?(?:</includeonly>|\Z)", re.S),
+  True: re.compile(r"<!--.*?(?:-->|\Z)|<nowiki>.*?</nowiki>|<noinclude>.*?(?:</noinclude>|\Z)", re.S),
+}
+onlyinclude_re = re.compile(r"<onlyinclude>(.*?)(?:</onlyinclude>|\Z)", re.S)
+
+# Namespaces of the English Wiktionary by number, used when those of a dump aren't known.
+default_namespaces = {
+  1: "Talk", 2: "User", 3: "User talk", 4: "Wiktionary", 5: "Wiktionary talk", 6: "File", 7: "File talk",
+  8: "MediaWiki", 9: "MediaWiki talk", 10: "Template", 11: "Template talk", 12: "Help", 13: "Help talk",
+  14: "Category", 15: "Category talk", 100: "Appendix", 101: "Appendix talk", 106: "Rhymes", 107: "Rhymes talk",
+  110: "Thesaurus", 111: "Thesaurus talk", 114: "Citations", 115: "Citations talk", 118: "Reconstruction",
+  119: "Reconstruction talk", 828: "Module", 829: "Module talk", -1: "Special", -2: "Media",
+}
+# Namespace aliases, which aren't listed in the <siteinfo> of a dump.
+namespace_aliases = {"Project": 4, "Project talk": 5, "WT": 4, "Image": 6, "Image talk": 7, "T": 10, "Cat": 14,
+                     "MOD": 828}
+
+# Return a dictionary mapping the lowercased names and aliases of the namespaces in `namespaces` (a dictionary mapping
+# namespace numbers to names) to their names, for use with normalize_title().
+def namespace_names(namespaces):
+  names = {name.lower(): name for name in namespaces.values() if name}
+  for alias, number in namespace_aliases.items():
+    if namespaces.get(number):
+      names[alias.lower()] = namespaces[number]
+  return names
+
+default_namespace_names = namespace_names(default_namespaces)
+
+# Normalize a page title as found in wikitext: underscores become spaces, runs of spaces are collapsed and a namespace
+# prefix is replaced by the name of the namespace (so that e.g. "template:", "T:" and "Template:" are all the same).
+# Titles in Wiktionary are case-sensitive, so the title proper is left alone. Only the namespaces in `namespace_names`
+# (see namespace_names()) are recognized; other prefixes before a colon are part of the title proper (e.g.
+# "R:Webster 1913"). `default_namespace`, if given, is prefixed to titles without a namespace; a leading colon means
+# no namespace.
+def normalize_title(title, default_namespace=None, namespace_names=default_namespace_names):
+  title = re.sub("[ _]+", " ", title).strip()
+  explicit = title.startswith(":")
+  if explicit:
+    title = title[1:].strip()
+  if ":" in title:
+    prefix, rest = title.split(":", 1)
+    namespace = namespace_names.get(prefix.strip().lower())
+    if namespace:
+      return "%s:%s" % (namespace, rest.strip())
+  if default_namespace and not explicit:
+    return "%s:%s" % (default_namespace, title)
+  return title
+
+# Parser functions that take an argument after a colon (e.g. {{lc:...}}), whose names are case-insensitive.
+parser_functions = {
+  "anchorencode", "bidi", "canonicalurl", "canonicalurle", "dateformat", "filepath", "formatdate", "formatnum",
+  "fullurl", "fullurle", "gender", "grammar", "int", "language", "lc", "lcfirst", "localurl", "localurle", "msgnw",
+  "ns", "nse", "padleft", "padright", "plural", "special", "speciale", "tag", "uc", "ucfirst", "urlencode",
+}
+# Variables that take an argument after a colon (e.g. {{PAGENAME:...}}), whose names are case-sensitive.
+magic_variables = {
+  "ARTICLEPAGENAME", "ARTICLEPAGENAMEE", "ARTICLESPACE", "ARTICLESPACEE", "BASEPAGENAME", "BASEPAGENAMEE",
+  "CASCADINGSOURCES", "DEFAULTCATEGORYSORT", "DEFAULTSORT", "DEFAULTSORTKEY", "DISPLAYTITLE", "FULLPAGENAME",
+  "FULLPAGENAMEE", "NAMESPACE", "NAMESPACEE", "NAMESPACENUMBER", "NUMBERINGROUP", "NUMINGROUP", "PAGEID",
+  "PAGENAME", "PAGENAMEE", "PAGESINCAT", "PAGESINCATEGORY", "PAGESIZE", "PROTECTIONEXPIRY", "PROTECTIONLEVEL",
+  "REVISIONDAY", "REVISIONDAY2", "REVISIONID", "REVISIONMONTH", "REVISIONMONTH1", "REVISIONTIMESTAMP",
+  "REVISIONUSER", "REVISIONYEAR", "ROOTPAGENAME", "ROOTPAGENAMEE", "SUBJECTPAGENAME", "SUBJECTPAGENAMEE",
+  "SUBJECTSPACE", "SUBJECTSPACEE", "SUBPAGENAME", "SUBPAGENAMEE", "TALKPAGENAME", "TALKPAGENAMEE", "TALKSPACE",
+  "TALKSPACEE",
+}
+# Modifiers that can precede the name of a transcluded page.
+transclusion_modifier_re = re.compile(r"^(?:msg|raw)\s*:\s*", re.I)
+
+# Return the set of titles of the pages transcluded by `text`, when rendered as a page in its own right (`transcluding`
+# is False) or when transcluded into another page (`transcluding` is True), recognizing the namespaces in
+# `namespace_names` (see normalize_title()). Modules invoked using {{#invoke:...}} are included. Other parser
+# functions, magic words and substitutions are skipped, as are names built from template parameters.
+def transcluded_titles(text, transcluding, namespace_names=default_namespace_names):
+  if "{{" not in text:
+    return set()
+  if transcluding and "<onlyinclude>" in text:
+    text = "".join(onlyinclude_re.findall(text))
+  if "<" in text:
+    text = not_rendered_re[transcluding].sub("", text)
+  titles = set()
+  for m in transclusion_re.finditer(text):
+    name = m.group(1)
+    if name.startswith("#invoke:"):
+      name = ":Module:" + name[8:]
+    elif (not name or name.startswith("#") or re.search("^[A-Z]+$", name) or
+          re.search("^(safe)?subst:", name, re.I)):
+      continue
+    else:
+      name = transclusion_modifier_re.sub("", name)
+      if ":" in name:
+        prefix = name.split(":", 1)[0].strip()
+        if (prefix.lower() not in namespace_names and
+            (prefix.lower() in parser_functions or prefix in magic_variables)):
+          continue
+    title = normalize_title(name, "Template", namespace_names)
+    if title and not title.endswith(":"):
+      titles.add(title)
+  return titles
+
+# Snapshot of the category graph of a dump, for traversing categories offline in place of live queries using
+# blib.cat_articles() and blib.cat_subcats(). Use build_category_graph.py to create one from an XML dump and the
+# --category-graph argument (see blib.py) to make --cats, --category-file and the `default_cats` of
+# blib.do_pagefile_cats_refs() consult it.
+#
+# The snapshot is an SQLite file recording the members of each category as an adjacency list, clustered by category so
+# that the members of a category are stored together. Memberships are taken from the [[Category:...]] links in the
+# text of each page in the dump (not counting <includeonly> sections). Most categories on Wiktionary are added by
+# templates and modules, which can't be determined from the dump, so memberships can also be read from a file with a
+# page title and a category name separated by a tab on each line, e.g. as exported from the categorylinks table.
+# Members are returned sorted by title rather than by sort key as in live queries.
+class CategoryGraphWriter(object):
+  def __init__(self, filename):
+    self.conn = sqlite3.connect(filename)
+    for table in ["titles", "members", "meta"]:
+      self.conn.execute("DROP TABLE IF EXISTS %s" % table)
+    self.conn.execute("CREATE TABLE titles (id INTEGER PRIMARY KEY, title TEXT UNIQUE)")
+    self.conn.execute("CREATE TABLE members (category INTEGER, member INTEGER, PRIMARY KEY (category, member)) "
+        "WITHOUT ROWID")
+    self.conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    self.title_ids = {}
+    self.num_pages = 0
+    self.num_memberships = 0
+    self.pending = []
+
+  def set_meta(self, key, value):
+    self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+  def title_id(self, title):
+    title_id = self.title_ids.get(title)
+    if title_id is None:
+      title_id = len(self.title_ids) + 1
+      self.title_ids[title] = title_id
+      self.conn.execute("INSERT INTO titles VALUES (?, ?)", (title_id, title))
+    return title_id
+
+  def flush(self):
+    self.conn.executemany("INSERT OR IGNORE INTO members VALUES (?, ?)", self.pending)
+    del self.pending[:]
+
+  # Record that `title` is a member of `category` (a title in the Category namespace).
+  def add_membership(self, title, category):
+    self.num_memberships += 1
+    self.pending.append((self.title_id(category), self.title_id(title)))
+    if len(self.pending) >= 100000:
+      self.flush()
+
+  # Record the categories `title` belongs to according to the category links in `text`.
+  def add_page(self, title, text):
+    self.num_pages += 1
+    for category in linked_categories(text):
+      self.add_membership(title, category)
+
+  def close(self):
+    self.flush()
+    self.conn.commit()
+    self.conn.close()
+
+# Read a category graph snapshot (see CategoryGraphWriter).
+class CategoryGraph(object):
+  def __init__(self, filename):
+    self.filename = filename
+    self.conn = sqlite3.connect(filename)
+
+  def get_meta(self, key):
+    row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+  # Return a sorted list of the titles of the members of `category` (with or without the Category: prefix).
+  def members(self, category):
+    return sorted(title for (title,) in self.conn.execute(
+      "SELECT member_titles.title FROM titles AS category_titles "
+      "JOIN members ON members.category = category_titles.id "
+      "JOIN titles AS member_titles ON member_titles.id = members.member "
+      "WHERE category_titles.title = ?", (category_title(category),)))
+
+  # Return a sorted list of the titles of the subcategories of `category`.
+  def subcategories(self, category):
+    return [title for title in self.members(category) if title.startswith("Category:")]
+
+  # Return a sorted list of the titles of the members of `category` that aren't categories.
+  def articles(self, category):
+    return [title for title in self.members(category) if not title.startswith("Category:")]
+
+  def close(self):
+    self.conn.close()
+
+# Return the normalized title of the category named `category`, with or without the Category: prefix. Category names
+# may themselves contain colons (e.g. "en:Birds").
+def category_title(category):
+  if not category.startswith("Category:"):
+    category = "Category:" + category
+  return normalize_title(category)
+
+category_link_re = re.compile(r"\[\[\s*(?i:category)\s*:([^\[\]{}|#<>\n]*)(?:#[^\[\]|]*)?(?:\|[^\[\]]*)?\]\]")
+
+# Return the set of titles of the categories that `text` links to using [[Category:...]], when rendered as a page in
+# its own right.
+def linked_categories(text):
+  if "[[" not in text:
+    return set()
+  if "<" in text:
+    text = not_rendered_re[False].sub("", text)
+  categories = set()
+  for m in category_link_re.finditer(text):
+    name = m.group(1).strip()
+    if name:
+      categories.add(category_title(name))
+  return categories
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Levenshtein (edit) distance between strings, with support for a maximum distance of interest and an index for
+# finding the strings in a large set that are close to a given string.
+#
+# Distances are computed using the bit-parallel algorithm of Myers (1999), as formulated for edit distance by Hyyrö
+# (2001): each column of the dynamic-programming matrix is represented as a pair of bit vectors (Python integers) of
+# vertical deltas, so comparing strings of lengths M and N takes O(N) integer operations rather than O(M*N) Python
+# operations. When a maximum distance K is given, the computation stops as soon as the distance is known to exceed K,
+# in which case K + 1 is returned, so callers can simply compare the result with K.
+#
+# BKTree is a Burkhard-Keller tree, which uses the triangle inequality to avoid comparing a query string against most
+# of the strings in the tree when looking for those within a given distance.
+
+# Return a dictionary mapping each character of PATTERN to a bit mask of the positions at which it occurs.
+def pattern_masks(pattern):
+  masks = {}
+  for i, ch in enumerate(pattern):
+    masks[ch] = masks.get(ch, 0) | (1 << i)
+  return masks
+
+# Return the Levenshtein distance between PATTERN and TEXT, given MASKS = pattern_masks(PATTERN). If MAX_DISTANCE is
+# given and the distance is greater, return MAX_DISTANCE + 1.
+def masks_distance(masks, pattern, text, max_distance=None):
+  m = len(pattern)
+  n = len(text)
+  if max_distance is not None and abs(m - n) > max_distance:
+    return max_distance + 1
+  if m == 0:
+    return n
+  all_bits = (1 << m) - 1
+  high_bit = 1 << (m - 1)
+  # Bit vectors of the positive and negative vertical deltas in the current column; the first column is 0, 1, ..., m.
+  vp = all_bits
+  vn = 0
+  # The distance between PATTERN and the part of TEXT processed so far.
+  score = m
+  remaining = n
+  for ch in text:
+    eq = masks.get(ch, 0)
+    xv = eq | vn
+    xh = ((((eq & vp) + vp) & all_bits) ^ vp) | eq
+    hp = vn | (~(xh | vp) & all_bits)
+    hn = vp & xh
+    if hp & high_bit:
+      score += 1
+    elif hn & high_bit:
+      score -= 1
+    hp = ((hp << 1) | 1) & all_bits
+    hn = (hn << 1) & all_bits
+    vp = hn | (~(xv | hp) & all_bits)
+    vn = hp & xv
+    remaining -= 1
+    # Each remaining character of TEXT can lower the distance by at most one.
+    if max_distance is not None and score - remaining > max_distance:
+      return max_distance + 1
+  return score
+
+# Return the Levenshtein distance between S1 and S2. If MAX_DISTANCE is given and the distance is greater, return
+# MAX_DISTANCE + 1.
+def distance(s1, s2, max_distance=None):
+  if s1 == s2:
+    return 0
+  # Use the shorter string as the pattern, to keep the bit vectors small.
+  if len(s1) < len(s2):
+    s1, s2 = s2, s1
+  return masks_distance(pattern_masks(s2), s2, s1, max_distance)
+
+# Return True if the Levenshtein distance between S1 and S2 is at most MAX_DISTANCE.
+def within_distance(s1, s2, max_distance):
+  return distance(s1, s2, max_distance) <= max_distance
+
+# Return a list of the Levenshtein distances between QUERY and each string in CANDIDATES. If MAX_DISTANCE is given,
+# distances greater than MAX_DISTANCE are returned as MAX_DISTANCE + 1. The preprocessing of QUERY is done only once.
+def distances(query, candidates, max_distance=None):
+  masks = pattern_masks(query)
+  return [masks_distance(masks, query, candidate, max_distance) for candidate in candidates]
+
+# Return a list of (DISTANCE, CANDIDATE) for the strings in CANDIDATES within MAX_DISTANCE of QUERY, sorted by
+# distance and otherwise in the order of CANDIDATES.
+def candidates_within_distance(query, candidates, max_distance):
+  masks = pattern_masks(query)
+  retval = []
+  for candidate in candidates:
+    dist = masks_distance(masks, query, candidate, max_distance)
+    if dist <= max_distance:
+      retval.append((dist, candidate))
+  return sorted(retval, key=lambda x: x[0])
+
+class BKTree(object):
+  def __init__(self, strings=[]):
+    # Each node is a pair (STRING, CHILDREN), where CHILDREN maps a distance to the child node whose string is at that
+    # distance from STRING.
+    self.root = None
+    self.size = 0
+    for string in strings:
+      self.add(string)
+
+  def __len__(self):
+    return self.size
+
+  # Add STRING to the tree, unless it's already present.
+  def add(self, string):
+    if self.root is None:
+      self.root = (string, {})
+      self.size += 1
+      return
+    node = self.root
+    while True:
+      dist = distance(string, node[0])
+      if dist == 0:
+        return
+      child = node[1].get(dist)
+      if child is None:
+        node[1][dist] = (string, {})
+        self.size += 1
+        return
+      node = child
+
+  # Return a list of (DISTANCE, STRING) for the strings in the tree within MAX_DISTANCE of QUERY, sorted by distance and
+  # then by string.
+  def search(self, query, max_distance):
+    retval = []
+    if self.root is None:
+      return retval
+    masks = pattern_masks(query)
+    nodes = [self.root]
+    while nodes:
+      string, children = nodes.pop()
+      dist = masks_distance(masks, query, string)
+      if dist <= max_distance:
+        retval.append((dist, string))
+      # By the triangle inequality, only children at a distance between DIST - MAX_DISTANCE and
+      # DIST + MAX_DISTANCE from STRING can be within MAX_DISTANCE of QUERY.
+      for child_dist, child in children.items():
+        if dist - max_distance <= child_dist <= dist + max_distance:
+          nodes.append(child)
+    return sorted(retval)
+
+  # Return a list of (DISTANCE, STRING) for the strings in the tree closest to QUERY (there may be more than one at
+  # the same distance), sorted by string. If MAX_DISTANCE is given, only strings within that distance are considered.
+  def nearest(self, query, max_distance=None):
+    retval = []
+    if self.root is None:
+      return retval
+    masks = pattern_masks(query)
+    best = max_distance
+    nodes = [self.root]
+    while nodes:
+      string, children = nodes.pop()
+      dist = masks_distance(masks, query, string)
+      if best is None or dist < best:
+        best = dist
+        retval = [(dist, string)]
+      elif dist == best:
+        retval.append((dist, string))
+      for child_dist, child in children.items():
+        if best is None or dist - best <= child_dist <= dist + best:
+          nodes.append(child)
+    return sorted(retval)
@@ -3,6 +3,7 @@
 
 import re, sys, argparse
 
+import blib
 from blib import msg, errmsg
 import rulib
 
@@ -14,6 +15,9 @@ start, end = blib.parse_start_end(args.start, args.end)
 lemmas = set()
 
 for lineno, line in blib.iter_items_from_file(args.direcfile, start, end):
+  record = blib.decode_log_record(line)
+  if record is not None:
+    line = record["msg"]
   if "Would save with comment" in line:
     m = re.search("Would save with comment.* (?:of|dictionary form) (.*?)(,| after| before| \(add| \(modify| \(update|$)", line)
     if not m:
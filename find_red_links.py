@@ -36,9 +36,11 @@ for i, line in blib.iter_items_from_file(args.pagefile, start, end):
         outtext = "exists%s" % pagetype
         break
       else:
+        def errandpagemsg(txt):
+          blib.errandmsg("Page %s %s: %s" % (i, pagenm, txt))
         page = pywikibot.Page(site, pagenm)
-        if page.exists():
-          text = str(page.text)
+        if blib.safe_page_exists(page, errandpagemsg):
+          text = blib.safe_page_text(page, errandpagemsg)
           if re.search("#redirect", text, re.I):
             outtext = "exists%s as redirect" % pagetype
           elif re.search(r"\{\{superlative of", text):
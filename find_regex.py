@@ -5,32 +5,142 @@
 
 import blib, re, sys
 import pywikibot
+try:
+  import re._parser as sre_parse
+  import re._constants as sre_constants
+except ImportError:
+  import sre_parse
+  import sre_constants
 
 import blib
 from blib import getparam, rmparam, msg, site
 
+# Return a list of literal strings required by `regex`, for use as a cheap prefilter before doing a full regex search.
+# Each element of the list is itself a list of alternative literals, at least one of which must occur in any text that
+# `regex` matches (most elements have only one alternative; more than one results from a top-level alternation such as
+# 'foo|bar'). Returns an empty list (no prefilter) if nothing useful can be determined, e.g. for case-insensitive
+# regexes.
+def required_literals(regex):
+  try:
+    parsed = sre_parse.parse(regex)
+  except Exception:
+    return []
+  if parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+    return []
+  repeat_ops = [sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT]
+  if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    repeat_ops.append(sre_constants.POSSESSIVE_REPEAT)
+
+  def literals_of_seq(items):
+    required = []
+    run = []
+    def end_run():
+      if run:
+        required.append(["".join(run)])
+        del run[:]
+    for op, av in items:
+      if op is sre_constants.LITERAL:
+        run.append(chr(av))
+        continue
+      end_run()
+      if op is sre_constants.SUBPATTERN:
+        _, add_flags, _, sub = av
+        if not add_flags & sre_constants.SRE_FLAG_IGNORECASE:
+          required.extend(literals_of_seq(list(sub)))
+      elif op in repeat_ops:
+        min_repeat, _, sub = av
+        if min_repeat >= 1:
+          required.extend(literals_of_seq(list(sub)))
+      elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+        required.extend(literals_of_seq(list(av)))
+      elif op is sre_constants.BRANCH:
+        # Each alternative must contribute a literal for the alternation as a whole to require anything.
+        alts = []
+        for alt in av[1]:
+          single_literals = [lits[0] for lits in literals_of_seq(list(alt)) if len(lits) == 1]
+          if not single_literals:
+            alts = None
+            break
+          alts.append(max(single_literals, key=len))
+        if alts:
+          required.append(sorted(set(alts)))
+    end_run()
+    return required
+
+  return literals_of_seq(list(parsed))
+
+# Return True if `text` might match a regex whose required literals (as returned by required_literals()) are
+# `literals`. `has_literal`, if given, is used to check for a given literal in the text, e.g. to memoize the checks.
+def literals_present(literals, text, has_literal=None):
+  if has_literal is None:
+    has_literal = lambda lit: lit in text
+  return all(any(has_literal(lit) for lit in alts) for alts in literals)
+
+required_literals_by_regex = {}
+
+def get_required_literals(regex):
+  if regex not in required_literals_by_regex:
+    required_literals_by_regex[regex] = required_literals(regex)
+  return required_literals_by_regex[regex]
+
+def split_langs(lang):
+  return set(re.split(",(?!= )", lang))
+
+# Return True if any of the languages in `langs` might have a section in `text`. This is a plain substring check on the
+# language name, so it may return True when there is no such section, but never returns False when there is one.
+def langs_may_be_present(text, langs):
+  return any(lang in text for lang in langs)
+
+def extract_text_to_search(text, lang, pagemsg):
+  if not lang:
+    return text
+  text_to_search = []
+  langs = split_langs(lang)
+  if not langs_may_be_present(text, langs):
+    return ""
+  sections, sections_by_lang, _ = blib.split_text_into_sections(text, pagemsg)
+
+  for seclang, secind in sections_by_lang.items():
+    if seclang in langs:
+      if len(langs) == 1:
+        text_to_search = [sections[secind]]
+        break
+      text_to_search.append(sections[secind - 1] + sections[secind])
+  return "".join(text_to_search)
+
+# Number of pages rejected by process_text_on_page() before splitting into sections or running the regex, because the
+# page can't contain the requested language section or a literal string required by the regex.
+num_rejected_early = 0
+
+# If `outfp` is given, messages are written there rather than to stdout (used with --pattern-file).
 def process_text_on_page(index, pagetitle, text, prev_comment, regex, invert, verbose,
-                         include_text, all_matches, lang, from_to, begin_end, encode_embedded_newlines):
+                         include_text, all_matches, lang, from_to, begin_end, encode_embedded_newlines,
+                         args=None, outfp=None):
   def pagemsg(txt):
-    msg("Page %s %s: %s" % (index, pagetitle, txt))
+    if outfp:
+      print("Page %s %s: %s" % (index, pagetitle, txt), file=outfp)
+    else:
+      msg("Page %s %s: %s" % (index, pagetitle, txt))
+
+  global num_rejected_early
 
   if verbose:
     pagemsg("Processing")
 
-  if not lang:
-    text_to_search = text
-  else:
-    text_to_search = []
-    langs = set(re.split(",(?!= )", lang))
-    sections, sections_by_lang, _ = blib.split_text_into_sections(text, pagemsg)
-
-    for seclang, secind in sections_by_lang.items():
-      if seclang in langs:
-        if len(langs) == 1:
-          text_to_search = [sections[secind]]
-          break
-        text_to_search.append(sections[secind - 1] + sections[secind])
-    text_to_search = "".join(text_to_search)
+  # Fast path: reject pages that can't match before doing any splitting or regex work. A page without the requested
+  # language produces no output even with --not, but one without a required literal must still be processed with --not.
+  # When searching several languages, the text searched isn't a substring of the page text (literals could in
+  # principle span the boundary between sections), so only check literals in the page text for zero or one languages.
+  langs = split_langs(lang) if lang else set()
+  if langs and not langs_may_be_present(text, langs):
+    num_rejected_early += 1
+    return
+  if (regex is not None and not invert and len(langs) <= 1 and
+      not literals_present(get_required_literals(regex), text)):
+    num_rejected_early += 1
+    return
+
+  text_to_search = extract_text_to_search(text, lang, pagemsg)
 
   def encode(txt):
     if encode_embedded_newlines:
@@ -62,18 +172,16 @@ def process_text_on_page(index, pagetitle, text, prev_comment, regex, invert, ve
     if not found_match and invert:
       pagemsg("Didn't find match for regex: %s" % regex)
     if include_text:
-      if not text_to_search.endswith("\n"):
-        text_to_search += "\n"
       if found_match == (not invert):
         if prev_comment:
           pagemsg("Skipped, no changes; previous comment = %s" % prev_comment)
-        pagemsg("-------- begin text --------\n%s-------- end text --------" % text_to_search)
+        blib.output_find_regex_text(args, index, pagetitle, text_to_search, prev_comment, pagemsg)
 
 def search_pages(args, regex, invert, input_from_diff, start, end, lang):
 
   def do_process_text_on_page(index, title, text, prev_comment):
     process_text_on_page(index, title, text, prev_comment, regex, invert, args.verbose,
-        args.text, args.all, lang, args.from_to, args.begin_end, args.encode_embedded_newlines)
+        args.text, args.all, lang, args.from_to, args.begin_end, args.encode_embedded_newlines, args)
 
   if input_from_diff:
     lines = open(input_from_diff, "r", encoding="utf-8")
@@ -81,9 +189,60 @@ def search_pages(args, regex, invert, input_from_diff, start, end, lang):
     for _, (index, pagename, text) in blib.iter_items(index_pagename_and_text, start, end,
         get_name=lambda x:x[1], get_index=lambda x:x[0]):
       do_process_text_on_page(index, pagename, text, None)
-    return
+  else:
+    blib.do_pagefile_cats_refs(args, start, end, do_process_text_on_page, stdin=True, include_comment=True)
+  # Pages processed in parallel workers aren't counted in the parent.
+  if not args.parallel:
+    msg("Rejected %s pages early (language section or literal string required by the regex not present)" %
+        num_rejected_early)
+
+# Read a --pattern-file, consisting of lines of the form 'NAME REGEX', where NAME can't contain spaces. Blank lines and
+# lines beginning with # are ignored. Return a list of (NAME, REGEX) tuples.
+def read_pattern_file(filename):
+  patterns = []
+  for lineno, line in enumerate(open(filename, "r", encoding="utf-8"), 1):
+    line = line.rstrip("\n")
+    if not line.strip() or line.startswith("#"):
+      continue
+    m = re.search(r"^(\S+)\s+(.*)$", line)
+    if not m:
+      raise ValueError("Line %s of %s: Expected 'NAME REGEX': %s" % (lineno, filename, line))
+    patterns.append(m.groups())
+  return patterns
+
+# Search for several named patterns in a single pass over the pages, writing the output for each pattern to its own
+# file PREFIX.NAME.out, where PREFIX is given by --pattern-output-prefix. The output of each file is as if find_regex.py
+# had been run with that pattern alone. Each page's language sections are extracted only once, and a pattern's regex is
+# only run if the literals it requires (see required_literals()) all occur in the text; each distinct literal is
+# checked only once per page.
+def search_pages_multi(args, patterns, invert, start, end, lang):
+  named_patterns = []
+  for name, regex in patterns:
+    outfile = "%s.%s.out" % (args.pattern_output_prefix, name)
+    named_patterns.append((name, regex, required_literals(regex), open(outfile, "w", encoding="utf-8")))
+  num_searched = {name: 0 for name, _, _, _ in named_patterns}
+
+  def do_process_text_on_page(index, title, text, prev_comment):
+    def pagemsg(txt):
+      msg("Page %s %s: %s" % (index, title, txt))
+    text_to_search = extract_text_to_search(text, lang, pagemsg)
+    literals_seen = {}
+    def has_literal(lit):
+      if lit not in literals_seen:
+        literals_seen[lit] = lit in text_to_search
+      return literals_seen[lit]
+    for name, regex, literals, outfp in named_patterns:
+      # With --not, pages failing the prefilter still need to be output.
+      if not invert and not literals_present(literals, text_to_search, has_literal):
+        continue
+      num_searched[name] += 1
+      process_text_on_page(index, title, text_to_search, prev_comment, regex, invert, args.verbose,
+          args.text, args.all, None, args.from_to, args.begin_end, args.encode_embedded_newlines, args, outfp)
 
   blib.do_pagefile_cats_refs(args, start, end, do_process_text_on_page, stdin=True, include_comment=True)
+  for name, regex, literals, outfp in named_patterns:
+    outfp.close()
+    msg("Pattern %s: searched %s pages; prefilter literals %s" % (name, num_searched[name], literals))
 
 if __name__ == "__main__":
   parser = blib.create_argparser("Search on pages", include_pagefile=True,
@@ -98,11 +257,21 @@ if __name__ == "__main__":
   parser.add_argument('--encode-embedded-newlines', help="Convert embedded newlines to '\\n', to keep everything on one line.", action="store_true")
   parser.add_argument('--text', help="Include full text of page or language section.", action="store_true")
   parser.add_argument('--lang', help="Only search the specified language section(s) (comma-separated).")
+  parser.add_argument('--pattern-file', help="Search for all the patterns in the specified file in a single pass, one per line in the format 'NAME REGEX'. Output for each pattern goes to a separate file named using --pattern-output-prefix and NAME. Not compatible with --parallel or --output-format binary.")
+  parser.add_argument('--pattern-output-prefix', help="Prefix of output files when --pattern-file is given (default %(default)s).", default="find_regex")
   args = parser.parse_args()
   start, end = blib.parse_start_end(args.start, args.end)
 
-  if not args.regex and not args.text:
+  if args.pattern_file:
+    if args.regex:
+      raise ValueError("Can't combine -e (--regex) with --pattern-file")
+    if args.input_from_diff or args.parallel or args.output_format == "binary":
+      raise ValueError("Can't combine --pattern-file with --input-from-diff, --parallel or --output-format binary")
+  elif not args.regex and not args.text:
     raise ValueError("-e (--regex) must be given unless --text is given")
   if args.not_ and args.all:
     raise ValueError("Can't combine --not with --all")
-  search_pages(args, args.regex, args.not_, args.input_from_diff, start, end, args.lang)
+  if args.pattern_file:
+    search_pages_multi(args, read_pattern_file(args.pattern_file), args.not_, start, end, args.lang)
+  else:
+    search_pages(args, args.regex, args.not_, args.input_from_diff, start, end, args.lang)
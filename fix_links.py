@@ -26,6 +26,7 @@ import pywikibot, re, sys, argparse
 
 import blib
 from blib import getparam, rmparam, msg, site, rsub_repeatedly
+import editdist
 
 # blib.getData()
 
@@ -274,6 +275,22 @@ language_names_to_properties = {
   for langcode, langprops in language_codes_to_properties.items()
 }
 
+# Return the maximum Levenshtein distance between an explicit and an automatic translit, the shorter of which has
+# length TRANLEN, for the explicit translit to be accepted as a variant of the automatic one.
+def max_translit_levenshtein_distance(tranlen):
+  if tranlen >= 9:
+    return 5
+  elif tranlen >= 7:
+    return 4
+  elif tranlen >= 5:
+    return 3
+  elif tranlen >= 4:
+    return 2
+  elif tranlen >= 3:
+    return 1
+  else:
+    return 0
+
 def do_remove_diacritics(text, patterns, remove_diacritics):
   pass
 
@@ -396,26 +413,27 @@ def process_text_on_page(index, pagetitle, text):
               # Translit same as explicit translit, ignore
               pass
             else:
-              levdist = blib.levenshtein(accented_translit, translit)
               tranlen = min(len(translit), len(accented_translit))
+              max_levdist = max_translit_levenshtein_distance(tranlen)
+              levdist = editdist.distance(accented_translit, translit, max_levdist)
+              # The exact distance isn't computed once it's too big.
+              levdist_text = str(levdist) if levdist <= max_levdist else "more than %s" % max_levdist
               if accented_translit[0].isupper() != translit[0].isupper():
                 pagemsg("WARNING: Upper/lower mismatch between explicit %s and auto %s, not treating as translit (%s) in %s" %
                   (translit, accented_translit, accented, linktext()))
                 post_translit_arg = " (%s)" % orig_translit
               elif thislangcode == "grc" and (translit.endswith("ic") or translit.endswith("an")):
                 pagemsg("WARNING: Explicit translit %s ends with -ic or -an, not treating as translit vs. auto-translit %s (Levenshtein distance %s, %s in %s)" %
-                  (translit, accented_translit, levdist, accented, linktext()))
+                  (translit, accented_translit, levdist_text, accented, linktext()))
                 post_translit_arg = " (%s)" % orig_translit
-              elif (levdist == 1 and tranlen >= 3 or levdist == 2 and tranlen >= 4
-                  or levdist == 3 and tranlen >= 5 or levdist == 4 and tranlen >= 7
-                  or levdist == 5 and tranlen >= 9):
+              elif levdist <= max_levdist:
                 pagemsg("Levenshtein distance %s and length %s, accept translit difference between explicit %s and auto %s (%s) in %s" %
                   (levdist, tranlen, translit, accented_translit, accented, linktext()))
                 if not this_ignore_translit:
                   translit_arg = "|tr=%s" % translit
               else:
                 pagemsg("WARNING: Levenshtein distance %s too big for length %s, not treating %s as transliteration of %s (%s) in %s" %
-                  (levdist, tranlen, translit, accented_translit, accented, linktext()))
+                  (levdist_text, tranlen, translit, accented_translit, accented, linktext()))
                 post_translit_arg = " (%s)" % orig_translit
 
           if page:
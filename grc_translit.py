@@ -6,6 +6,7 @@ import re
 import unicodedata
 
 from blib import remove_links, msg
+import translitlib
 
 # FIXME:
 #
@@ -133,22 +134,34 @@ iotate_vowel = {"α":"ᾳ", "Α":"ᾼ",
                 "η":"ῃ", "Ε":"ῌ",
                 "ω":"ῳ", "Ω":"ῼ",}
 
+# Contextual rules for tr(), applied along with the table in tt in a single
+# pass; see translitlib.py.
+tr_rules = [
+    # γ before a velar becomes n
+    ("γ" + ch, "n" + tt[ch]) for ch in "γκξχ"
+] + [
+    ("ρρ", "rrh"),
+]
+
+tr_transliterator = translitlib.Transliterator(tr_rules, tt)
+
 # Transliterates text, which should be a single word or phrase. It should
 # include stress marks, which are then preserved in the transliteration.
 def tr(text, lang=None, sc=None, msgfun=msg):
     text = remove_links(text)
     text = tr_canonicalize_greek(text)
 
-    text = rsub(text, "γ([γκξχ])", r"n\1")
-    text = rsub(text, "ρρ", "rrh")
-
-    text = rsub(text, '.', tt)
+    text = tr_transliterator.tr(text)
 
     # compose accented characters, fix hA and similar
     text = tr_canonicalize_latin(text)
 
     return text
 
+# Transliterate each string in TEXTS, returning a list of the results.
+def tr_many(texts, lang=None, sc=None, msgfun=msg):
+    return translitlib.tr_many(lambda text: tr(text, lang, sc, msgfun), texts)
+
 ############################################################################
 #                      Transliterate from Latin to Greek                   #
 ############################################################################
@@ -0,0 +1,1197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Local execution of Wiktionary Lua modules, so that #invoke calls (e.g. to generate the inflected forms of a lemma)
+# can be run offline at CPU speed rather than through the expandtemplates API. Use the --local-lua argument (see
+# blib.py) to make blib.expand_text() route #invoke calls and the known wrapper templates in `local_lua_templates`
+# through a LuaEngine, falling back to the wiki when a call can't be handled locally.
+#
+# This requires the `lupa` package (preferably with its bundled Lua 5.1, which matches Scribunto). Modules are taken
+# from a local directory, as NAME.lua for Module:NAME; modules not found there are fetched from the wiki once and saved
+# under the subdirectory `fetched`. Only a subset of the Scribunto `mw` library is implemented:
+#
+# 1. mw.ustring, implemented by translating Lua patterns into Python regexes, except that %b (balanced match) isn't
+#    supported.
+# 2. mw.text (except mw.text.truncate), mw.title (without page IDs, protection levels, etc.; `exists` and getContent()
+#    call back into Python), mw.loadData, mw.clone, mw.log, mw.dumpObject, mw.getContentLanguage() (English only),
+#    mw.uri, mw.site.namespaces, mw.hash and mw.getCurrentFrame().
+# 3. Frames support args, getParent(), getTitle(), getArgument(), newChild() and (by calling back into the wiki)
+#    expandTemplate(), preprocess(), callParserFunction() and extensionTag().
+#
+# In particular mw.html, mw.wikibase and mw.message are missing; modules that use them fail with a Lua error, in which
+# case the caller should fall back to the wiki. Modules are loaded once and shared by all calls, like mw.loadData()
+# data in Scribunto, so module-level state persists between calls.
+
+import os, re, json, hashlib, unicodedata, sys
+from urllib.parse import quote
+
+# Known wrapper templates whose expansion is a single #invoke using the template's own arguments as the parent frame's
+# arguments. Maps the template name to (MODULE, FUNCTION, FRAME_ARGS).
+local_lua_templates = {
+  "la-generate-noun-forms": ("la-nominal", "generate_noun_forms", {}),
+  "la-generate-adj-forms": ("la-nominal", "generate_adj_forms", {}),
+  "la-generate-verb-forms": ("la-verb", "generate_forms", {}),
+  "ru-generate-noun-forms": ("ru-noun", "generate_forms", {}),
+  "ru-generate-adj-forms": ("ru-adjective", "generate_forms", {}),
+  "ru-generate-verb-forms": ("ru-verb", "generate_forms", {}),
+}
+
+namespaces = {
+  0: "", 1: "Talk", 2: "User", 3: "User talk", 4: "Wiktionary", 5: "Wiktionary talk", 6: "File", 7: "File talk",
+  8: "MediaWiki", 9: "MediaWiki talk", 10: "Template", 11: "Template talk", 12: "Help", 13: "Help talk",
+  14: "Category", 15: "Category talk", 100: "Appendix", 101: "Appendix talk", 106: "Rhymes", 107: "Rhymes talk",
+  110: "Thesaurus", 111: "Thesaurus talk", 114: "Citations", 115: "Citations talk", 118: "Reconstruction",
+  119: "Reconstruction talk", 828: "Module", 829: "Module talk",
+}
+namespace_aliases = {"Project": 4, "WT": 4, "Image": 6, "T": 10, "Cat": 14, "CAT": 14, "MOD": 828}
+
+class LuaEngineError(Exception):
+  pass
+
+class LuaPatternError(Exception):
+  pass
+
+def lua_number_to_string(num):
+  if isinstance(num, bool):
+    return "true" if num else "false"
+  if isinstance(num, int):
+    return str(num)
+  if num == int(num) and abs(num) < 1e15:
+    return "%d" % num
+  return "%.14g" % num
+
+def to_str(val):
+  if isinstance(val, str):
+    return val
+  if isinstance(val, bytes):
+    return val.decode("utf-8", errors="replace")
+  if isinstance(val, (int, float)):
+    return lua_number_to_string(val)
+  raise LuaPatternError("string expected, got %s" % type(val).__name__)
+
+# Convert a Lua string index (1-based, negative from the end) into a Python one, as posrelat() in the Lua source.
+def posrelat(pos, length):
+  pos = int(pos)
+  if pos < 0:
+    pos += length + 1
+  return pos if pos >= 0 else 0
+
+################################################################################
+#                     Lua pattern to Python regex translation                  #
+################################################################################
+
+# Contents of a regex character set for each Lua character class, following Scribunto's Unicode definitions. Computed
+# on first use, since most require a scan of all code points.
+ustring_class_categories = {
+  "a": lambda cat: cat[0] == "L",
+  "c": lambda cat: cat == "Cc",
+  "d": lambda cat: cat == "Nd",
+  "l": lambda cat: cat == "Ll",
+  "p": lambda cat: cat[0] == "P",
+  "u": lambda cat: cat == "Lu",
+  "w": lambda cat: cat[0] == "L" or cat == "Nd",
+}
+ustring_classes = {
+  "s": r"\s",
+  "x": "0-9A-Fa-f０-９Ａ-Ｆａ-ｆ",
+}
+
+def set_escape(char):
+  return "\\" + char if char in "\\]-[^" else char
+
+def ustring_class(letter):
+  if letter not in ustring_classes:
+    in_class = ustring_class_categories[letter]
+    ranges = []
+    range_start = None
+    for cp in range(sys.maxunicode + 2):
+      if cp <= sys.maxunicode and in_class(unicodedata.category(chr(cp))):
+        if range_start is None:
+          range_start = cp
+      elif range_start is not None:
+        if range_start == cp - 1:
+          ranges.append(set_escape(chr(range_start)))
+        else:
+          ranges.append("%s-%s" % (set_escape(chr(range_start)), set_escape(chr(cp - 1))))
+        range_start = None
+    ustring_classes[letter] = "".join(ranges)
+  return ustring_classes[letter]
+
+# Parse a Lua set beginning at pat[i] == "[". Return the equivalent regex (matching a single character) and the index
+# after the set.
+def translate_lua_set(pat, i):
+  n = len(pat)
+  i += 1
+  negate = False
+  if i < n and pat[i] == "^":
+    negate = True
+    i += 1
+  items = []
+  negated_classes = []
+  first = True
+  while True:
+    if i >= n:
+      raise LuaPatternError("malformed pattern (missing ']')")
+    c = pat[i]
+    if c == "]" and not first:
+      i += 1
+      break
+    first = False
+    if c == "%":
+      if i + 1 >= n:
+        raise LuaPatternError("malformed pattern (missing ']')")
+      d = pat[i + 1]
+      if d.lower() in "acdlpsuwx" and d.isalpha():
+        if d.isupper():
+          negated_classes.append(ustring_class(d.lower()))
+        else:
+          items.append(ustring_class(d))
+      else:
+        items.append(set_escape(d))
+      i += 2
+    elif i + 2 < n and pat[i + 1] == "-" and pat[i + 2] != "]":
+      items.append("%s-%s" % (set_escape(c), set_escape(pat[i + 2])))
+      i += 3
+    else:
+      items.append(set_escape(c))
+      i += 1
+  items = "".join(items)
+  if not negated_classes:
+    return "[%s%s]" % ("^" if negate else "", items), i
+  if not negate:
+    alternatives = (["[%s]" % items] if items else []) + ["[^%s]" % cls for cls in negated_classes]
+    return "(?:%s)" % "|".join(alternatives), i
+  # [^...%A...] matches characters not in any of the items and in all of the negated classes.
+  return "(?:%s%s[%s])" % ("(?![%s])" % items if items else "",
+    "".join("(?=[%s])" % cls for cls in negated_classes[:-1]), negated_classes[-1]), i
+
+# Parse a single-character class beginning at pat[i]. Return the equivalent regex and the index after the class.
+def translate_lua_single(pat, i):
+  c = pat[i]
+  if c == ".":
+    return ".", i + 1
+  if c == "[":
+    return translate_lua_set(pat, i)
+  if c == "%":
+    if i + 1 >= len(pat):
+      raise LuaPatternError("malformed pattern (ends with '%')")
+    d = pat[i + 1]
+    if d.lower() in "acdlpsuwx" and d.isalpha():
+      cls = ustring_class(d.lower())
+      return ("[^%s]" if d.isupper() else "[%s]") % cls, i + 2
+    return re.escape(d), i + 2
+  return re.escape(c), i + 1
+
+# Translate a Lua pattern into a Python regex. Return a tuple (REGEX, ANCHORED, CAPTURES) where REGEX is compiled,
+# ANCHORED indicates whether the pattern began with ^ and CAPTURES is a list of "pos" (position capture) or "str" for
+# each capture, named g1, g2, ... in the regex.
+def translate_lua_pattern(pat):
+  n = len(pat)
+  i = 0
+  anchored = pat.startswith("^")
+  if anchored:
+    i = 1
+  out = []
+  captures = []
+  open_captures = []
+  while i < n:
+    c = pat[i]
+    if c == "(":
+      if pat.startswith("()", i):
+        captures.append("pos")
+        out.append("(?P<g%s>)" % len(captures))
+        i += 2
+      else:
+        captures.append("str")
+        open_captures.append(len(captures))
+        out.append("(?P<g%s>" % len(captures))
+        i += 1
+      continue
+    if c == ")":
+      if not open_captures:
+        raise LuaPatternError("invalid pattern capture")
+      open_captures.pop()
+      out.append(")")
+      i += 1
+      continue
+    if c == "$" and i == n - 1:
+      out.append(r"\Z")
+      i += 1
+      continue
+    if c == "%" and i + 1 < n:
+      d = pat[i + 1]
+      if d == "b":
+        raise LuaPatternError("%b is not supported")
+      if d == "f":
+        if i + 2 >= n or pat[i + 2] != "[":
+          raise LuaPatternError("missing '[' after '%f' in pattern")
+        setre, i = translate_lua_set(pat, i + 2)
+        # The Lua frontier pattern treats the positions before the start and after the end of the string as \0.
+        nul_in_set = re.match(setre, "\0") is not None
+        out.append("(?<!%s)%s" % (setre, "(?<=.)" if nul_in_set else ""))
+        out.append(r"(?:(?=%s)|\Z)" % setre if nul_in_set else "(?=%s)" % setre)
+        continue
+      if d.isdigit():
+        k = int(d)
+        if k < 1 or k > len(captures) or k in open_captures or captures[k - 1] != "str":
+          raise LuaPatternError("invalid capture index %%%s" % d)
+        out.append("(?P=g%s)" % k)
+        i += 2
+        continue
+    single, i = translate_lua_single(pat, i)
+    if i < n and pat[i] in "*+?-":
+      out.append(single + {"*": "*", "+": "+", "?": "?", "-": "*?"}[pat[i]])
+      i += 1
+    else:
+      out.append(single)
+  if open_captures:
+    raise LuaPatternError("unfinished capture")
+  try:
+    regex = re.compile("".join(out), re.S)
+  except re.error as e:
+    raise LuaPatternError("can't translate pattern %s: %s" % (pat, e))
+  return regex, anchored, captures
+
+translated_patterns = {}
+
+def get_lua_pattern(pat):
+  if pat not in translated_patterns:
+    if len(translated_patterns) >= 10000:
+      translated_patterns.clear()
+    translated_patterns[pat] = translate_lua_pattern(pat)
+  return translated_patterns[pat]
+
+def match_captures(m, captures, whole_if_none):
+  if not captures:
+    return (m.group(0),) if whole_if_none else ()
+  return tuple(m.start(k) + 1 if kind == "pos" else m.group(k) for k, kind in enumerate(captures, 1))
+
+################################################################################
+#                               mw.ustring                                     #
+################################################################################
+
+def ustring_find(s, pattern, init=1, plain=False):
+  s = to_str(s)
+  pattern = to_str(pattern)
+  pos = posrelat(1 if init is None else init, len(s))
+  if pos < 1:
+    pos = 1
+  if pos > len(s) + 1:
+    return None
+  if plain:
+    found = s.find(pattern, pos - 1)
+    return None if found < 0 else (found + 1, found + len(pattern))
+  regex, anchored, captures = get_lua_pattern(pattern)
+  m = regex.match(s, pos - 1) if anchored else regex.search(s, pos - 1)
+  if not m:
+    return None
+  return (m.start() + 1, m.end()) + match_captures(m, captures, False)
+
+def ustring_match(s, pattern, init=1):
+  s = to_str(s)
+  pattern = to_str(pattern)
+  pos = posrelat(1 if init is None else init, len(s))
+  if pos < 1:
+    pos = 1
+  if pos > len(s) + 1:
+    return None
+  regex, anchored, captures = get_lua_pattern(pattern)
+  m = regex.match(s, pos - 1) if anchored else regex.search(s, pos - 1)
+  if not m:
+    return None
+  return match_captures(m, captures, True)
+
+def ustring_gmatch(s, pattern):
+  s = to_str(s)
+  regex, anchored, captures = get_lua_pattern(to_str(pattern))
+  state = {"pos": 0}
+  def iterate(*args):
+    pos = state["pos"]
+    if pos > len(s):
+      return None
+    m = regex.match(s, pos) if anchored else regex.search(s, pos)
+    if not m:
+      state["pos"] = len(s) + 1
+      return None
+    state["pos"] = m.end() + 1 if m.end() == m.start() else m.end()
+    if anchored:
+      state["pos"] = len(s) + 1
+    return match_captures(m, captures, True)
+  return iterate
+
+def make_ustring_gsub(lua_type):
+  def gsub_replacement(m, captures, repl, repl_type):
+    caps = match_captures(m, captures, True)
+    if repl_type == "string":
+      def replace_capture_ref(cm):
+        d = cm.group(1)
+        if d == "0":
+          return m.group(0)
+        if d.isdigit():
+          k = int(d)
+          if k > len(caps):
+            raise LuaPatternError("invalid capture index %%%s in replacement string" % d)
+          return to_str(caps[k - 1])
+        return d
+      return re.sub("%(.)", replace_capture_ref, repl, flags=re.S)
+    if repl_type == "table":
+      value = repl[caps[0]]
+    else:
+      value = repl(*caps)
+      if isinstance(value, tuple):
+        value = value[0] if value else None
+    if value is None or value is False:
+      return m.group(0)
+    if isinstance(value, (str, bytes, int, float)):
+      return to_str(value)
+    raise LuaPatternError("invalid replacement value (a %s)" % lua_type(value))
+
+  def ustring_gsub(s, pattern, repl, max_replacements=None):
+    s = to_str(s)
+    regex, anchored, captures = get_lua_pattern(to_str(pattern))
+    if isinstance(repl, (str, bytes, int, float)):
+      repl_type = "string"
+      repl = to_str(repl)
+    else:
+      repl_type = lua_type(repl)
+      if repl_type not in ["table", "function"]:
+        raise LuaPatternError("bad argument #3 to 'gsub' (string/function/table expected)")
+    out = []
+    pos = 0
+    count = 0
+    length = len(s)
+    while max_replacements is None or count < max_replacements:
+      m = regex.match(s, pos) if anchored else regex.search(s, pos)
+      if not m:
+        break
+      count += 1
+      out.append(s[pos:m.start()])
+      out.append(gsub_replacement(m, captures, repl, repl_type))
+      if m.end() > m.start():
+        pos = m.end()
+      elif m.start() < length:
+        out.append(s[m.start()])
+        pos = m.start() + 1
+      else:
+        pos = length
+        break
+      if anchored:
+        break
+    out.append(s[pos:])
+    return "".join(out), count
+  return ustring_gsub
+
+def ustring_sub(s, i=1, j=-1):
+  s = to_str(s)
+  length = len(s)
+  i = posrelat(1 if i is None else i, length)
+  j = posrelat(-1 if j is None else j, length)
+  if i < 1:
+    i = 1
+  if j > length:
+    j = length
+  return s[i - 1:j] if i <= j else ""
+
+def ustring_codepoint(s, i=1, j=None):
+  s = to_str(s)
+  i = posrelat(1 if i is None else i, len(s))
+  j = i if j is None else posrelat(j, len(s))
+  if i < 1:
+    i = 1
+  if j > len(s):
+    j = len(s)
+  return tuple(ord(c) for c in s[i - 1:j])
+
+def ustring_gcodepoint(s, i=1, j=None):
+  codepoints = list(ustring_codepoint(s, i, -1 if j is None else j))
+  state = {"pos": 0}
+  def iterate(*args):
+    if state["pos"] >= len(codepoints):
+      return None
+    state["pos"] += 1
+    return codepoints[state["pos"] - 1]
+  return iterate
+
+################################################################################
+#                                Lua side                                      #
+################################################################################
+
+# Lua code run when creating an engine, passed a table of the Python helper functions. Returns a table of functions
+# used by LuaEngine.
+lua_bootstrap = r"""
+local py = ...
+
+unpack = unpack or table.unpack
+loadstring = loadstring or load
+
+mw = {}
+
+local ustring = {}
+mw.ustring = ustring
+ustring.find = py.ustring_find
+ustring.match = py.ustring_match
+ustring.gmatch = py.ustring_gmatch
+ustring.gsub = py.ustring_gsub
+ustring.len = py.ustring_len
+ustring.sub = py.ustring_sub
+ustring.char = py.ustring_char
+ustring.codepoint = py.ustring_codepoint
+ustring.gcodepoint = function(s, i, j) return py.ustring_gcodepoint(s, i, j), nil, nil end
+ustring.lower = py.ustring_lower
+ustring.upper = py.ustring_upper
+ustring.ulower = py.ustring_lower
+ustring.uupper = py.ustring_upper
+ustring.toNFC = py.ustring_toNFC
+ustring.toNFD = py.ustring_toNFD
+ustring.toNFKC = py.ustring_toNFKC
+ustring.toNFKD = py.ustring_toNFKD
+ustring.byte = string.byte
+ustring.format = string.format
+ustring.rep = string.rep
+ustring.isutf8 = function(s) return true end
+ustring.maxPatternLength = math.huge
+ustring.maxStringLength = math.huge
+
+local text = {}
+mw.text = text
+
+function text.trim(s, charset)
+  charset = charset or "\t\r\n\f "
+  s = ustring.gsub(s, "^[" .. charset .. "]*(.-)[" .. charset .. "]*$", "%1")
+  return s
+end
+
+function text.gsplit(s, pattern, plain)
+  local pos, len = 1, ustring.len(s)
+  return function()
+    if pos then
+      local e, n = ustring.find(s, pattern, pos, plain)
+      local ret
+      if not e then
+        ret = ustring.sub(s, pos)
+        pos = nil
+      elseif n < e then
+        -- Empty separator.
+        ret = ustring.sub(s, pos, e)
+        if e < len then
+          pos = e + 1
+        else
+          pos = nil
+        end
+      else
+        ret = e > pos and ustring.sub(s, pos, e - 1) or ""
+        pos = n + 1
+      end
+      return ret
+    end
+  end, nil, nil
+end
+
+function text.split(s, pattern, plain)
+  local ret = {}
+  for piece in text.gsplit(s, pattern, plain) do
+    ret[#ret + 1] = piece
+  end
+  return ret
+end
+
+function text.listToText(list, separator, conjunction)
+  separator = separator or ", "
+  conjunction = conjunction or " and "
+  local n = #list
+  if n == 0 then
+    return ""
+  elseif n == 1 then
+    return list[1]
+  end
+  return table.concat(list, separator, 1, n - 1) .. conjunction .. list[n]
+end
+
+local nowiki_entities = {
+  ['"'] = "&#34;", ["&"] = "&#38;", ["'"] = "&#39;", ["<"] = "&#60;", ["="] = "&#61;", [">"] = "&#62;",
+  ["["] = "&#91;", ["]"] = "&#93;", ["{"] = "&#123;", ["|"] = "&#124;", ["}"] = "&#125;",
+}
+function text.nowiki(s)
+  s = ustring.gsub(s, '["&\'<=>%[%]{|}]', nowiki_entities)
+  s = ustring.gsub(s, "^([#*:; ])", function(c) return "&#" .. string.byte(c) .. ";" end)
+  s = ustring.gsub(s, "\n([#*:; ])", function(c) return "\n&#" .. string.byte(c) .. ";" end)
+  s = ustring.gsub(s, "\n\n", "\n&#10;")
+  s = ustring.gsub(s, "^%-%-%-%-", "&#45;---")
+  s = ustring.gsub(s, "\n%-%-%-%-", "\n&#45;---")
+  s = ustring.gsub(s, "://", "&#58;//")
+  return s
+end
+
+function text.encode(s, charset)
+  charset = charset or '<>&"\' \194\160'
+  s = ustring.gsub(s, "[" .. charset .. "]", function(c)
+    return "&#" .. ustring.codepoint(c) .. ";"
+  end)
+  return s
+end
+
+function text.unstrip(s) return s end
+function text.unstripNoWiki(s) return s end
+function text.killMarkers(s) return s end
+
+function text.tag(name, attrs, content)
+  local parts = {"<" .. name}
+  for k, v in pairs(attrs or {}) do
+    if v == true then
+      parts[#parts + 1] = " " .. k
+    elseif v then
+      parts[#parts + 1] = " " .. k .. '="' .. text.encode(tostring(v)) .. '"'
+    end
+  end
+  if content == nil or content == false then
+    return table.concat(parts) .. ">"
+  end
+  return table.concat(parts) .. ">" .. content .. "</" .. name .. ">"
+end
+
+text.jsonEncode = py.json_encode
+text.jsonDecode = py.json_decode
+text.JSON_PRESERVE_KEYS = 1
+text.JSON_TRY_FIXING = 2
+text.JSON_PRETTY = 4
+
+function mw.clone(val)
+  local refs = {}
+  local function clone(val)
+    if type(val) ~= "table" then
+      return val
+    end
+    if refs[val] then
+      return refs[val]
+    end
+    local ret = {}
+    refs[val] = ret
+    for k, v in pairs(val) do
+      ret[clone(k)] = clone(v)
+    end
+    local mt = getmetatable(val)
+    if mt then
+      setmetatable(ret, mt)
+    end
+    return ret
+  end
+  return clone(val)
+end
+
+function mw.dumpObject(obj)
+  local seen = {}
+  local function dump(obj, indent)
+    if type(obj) == "string" then
+      return string.format("%q", obj)
+    elseif type(obj) ~= "table" then
+      return tostring(obj)
+    elseif seen[obj] then
+      return "{ <recursion> }"
+    end
+    seen[obj] = true
+    local parts = {}
+    local keys = {}
+    for k in pairs(obj) do
+      keys[#keys + 1] = k
+    end
+    table.sort(keys, function(a, b)
+      if type(a) == type(b) and (type(a) == "number" or type(a) == "string") then
+        return a < b
+      end
+      return type(a) < type(b)
+    end)
+    for _, k in ipairs(keys) do
+      local key = type(k) == "string" and string.format("%q", k) or tostring(k)
+      parts[#parts + 1] = indent .. "  [" .. key .. "] = " .. dump(obj[k], indent .. "  ") .. ",\n"
+    end
+    return "table#1 {\n" .. table.concat(parts) .. indent .. "}"
+  end
+  return dump(obj, "")
+end
+
+function mw.log(...)
+  local parts = {}
+  for i = 1, select("#", ...) do
+    parts[#parts + 1] = tostring((select(i, ...)))
+  end
+  py.log(table.concat(parts, "\t"))
+end
+
+function mw.logObject(obj, prefix)
+  py.log((prefix and prefix .. " = " or "") .. mw.dumpObject(obj))
+end
+
+function mw.isSubsting() return false end
+
+mw.loadData = function(name) return require(name) end
+mw.loadJsonData = function(name)
+  local title = mw.title.new(name)
+  return text.jsonDecode(title and title:getContent() or error("can't load " .. name))
+end
+
+local language = {}
+function language:getCode() return "en" end
+function language:lc(s) return ustring.lower(s) end
+function language:uc(s) return ustring.upper(s) end
+function language:lcfirst(s) return ustring.lower(ustring.sub(s, 1, 1)) .. ustring.sub(s, 2) end
+function language:ucfirst(s) return ustring.upper(ustring.sub(s, 1, 1)) .. ustring.sub(s, 2) end
+function language:formatNum(n) return py.format_num(n) end
+function language:isRTL() return false end
+mw.language = {
+  getContentLanguage = function() return language end,
+  fetchLanguageName = function(code) return py.fetch_language_name(code) end,
+}
+mw.getContentLanguage = mw.language.getContentLanguage
+mw.getLanguage = mw.language.getContentLanguage
+
+mw.uri = {
+  encode = py.uri_encode,
+  decode = py.uri_decode,
+  anchorEncode = py.anchor_encode,
+}
+local function page_url(prefix, page, query)
+  local title = tostring(page)
+  local url = prefix .. py.uri_encode(ustring.gsub(title, " ", "_"), "WIKI")
+  if type(query) == "table" then
+    local parts = {}
+    for k, v in pairs(query) do
+      parts[#parts + 1] = py.uri_encode(tostring(k)) .. "=" .. py.uri_encode(tostring(v))
+    end
+    table.sort(parts)
+    query = table.concat(parts, "&")
+  end
+  if query and query ~= "" then
+    url = url .. "?" .. query
+  end
+  return url
+end
+mw.uri.fullUrl = function(page, query) return page_url("//en.wiktionary.org/wiki/", page, query) end
+mw.uri.localUrl = function(page, query) return page_url("/wiki/", page, query) end
+mw.uri.canonicalUrl = function(page, query) return page_url("https://en.wiktionary.org/wiki/", page, query) end
+
+mw.hash = {
+  hashValue = py.hash_value,
+}
+
+mw.site = {
+  server = "//en.wiktionary.org",
+  siteName = "Wiktionary",
+  namespaces = {},
+}
+for id, name in pairs(py.namespaces()) do
+  local ns = {id = id, name = name, canonicalName = name}
+  mw.site.namespaces[id] = ns
+  if name ~= "" then
+    mw.site.namespaces[name] = ns
+  end
+end
+
+local title_methods = {}
+local title_mt = {}
+
+local function make_title(fields)
+  if not fields then
+    return nil
+  end
+  return setmetatable(fields, title_mt)
+end
+
+title_mt.__tostring = function(t) return t.prefixedText end
+title_mt.__eq = function(a, b) return a.prefixedText == b.prefixedText end
+title_mt.__lt = function(a, b) return a.prefixedText < b.prefixedText end
+
+function title_methods:getContent()
+  return py.title_content(self.prefixedText)
+end
+function title_methods:inNamespace(ns)
+  return self.namespace == (type(ns) == "number" and ns or py.namespace_id(ns))
+end
+function title_methods:inNamespaces(...)
+  for i = 1, select("#", ...) do
+    if self:inNamespace((select(i, ...))) then
+      return true
+    end
+  end
+  return false
+end
+function title_methods:subPageTitle(text)
+  return mw.title.makeTitle(self.namespace, self.text .. "/" .. text)
+end
+function title_methods:partialUrl()
+  return py.uri_encode(ustring.gsub(self.text, " ", "_"), "WIKI")
+end
+function title_methods:fullUrl(query) return mw.uri.fullUrl(self.prefixedText, query) end
+function title_methods:localUrl(query) return mw.uri.localUrl(self.prefixedText, query) end
+function title_methods:canonicalUrl(query) return mw.uri.canonicalUrl(self.prefixedText, query) end
+
+mw.title = {}
+function mw.title.new(text, namespace)
+  if type(text) == "number" then
+    return nil
+  end
+  return make_title(py.title_fields(text, namespace))
+end
+function mw.title.makeTitle(namespace, text, fragment)
+  return make_title(py.make_title_fields(namespace, text, fragment))
+end
+function mw.title.equals(a, b) return a.prefixedText == b.prefixedText end
+function mw.title.compare(a, b)
+  if a.prefixedText < b.prefixedText then
+    return -1
+  elseif a.prefixedText > b.prefixedText then
+    return 1
+  end
+  return 0
+end
+function mw.title.getCurrentTitle()
+  return mw.title.new(py.current_title())
+end
+title_mt.__index = function(t, k)
+  if k == "exists" then
+    return py.title_exists(t.prefixedText)
+  elseif k == "basePageTitle" then
+    return mw.title.makeTitle(t.namespace, t.baseText)
+  elseif k == "rootPageTitle" then
+    return mw.title.makeTitle(t.namespace, t.rootText)
+  elseif k == "talkPageTitle" then
+    return t.namespace % 2 == 0 and mw.title.makeTitle(t.namespace + 1, t.text) or nil
+  elseif k == "subjectPageTitle" then
+    return mw.title.makeTitle(t.namespace - t.namespace % 2, t.text)
+  end
+  return title_methods[k]
+end
+
+local current_frame
+
+local function template_call(name, args)
+  local parts = {"{{" .. name}
+  local n = 0
+  for k, v in pairs(args or {}) do
+    if type(k) == "number" and k > n then
+      n = k
+    end
+  end
+  for i = 1, n do
+    local v = args[i]
+    if v == nil then
+      parts[#parts + 1] = "|" .. i .. "="
+    else
+      parts[#parts + 1] = "|" .. tostring(v)
+    end
+  end
+  local named = {}
+  for k, v in pairs(args or {}) do
+    if type(k) ~= "number" then
+      named[#named + 1] = k
+    end
+  end
+  table.sort(named)
+  for _, k in ipairs(named) do
+    parts[#parts + 1] = "|" .. k .. "=" .. tostring(args[k])
+  end
+  return table.concat(parts) .. "}}"
+end
+
+local function new_frame(title, args, parent)
+  local frame = {args = args or {}}
+  function frame:getParent() return parent end
+  function frame:getTitle() return title end
+  function frame:getArgument(name)
+    local val = self.args[name]
+    if val == nil then
+      return nil
+    end
+    return {expand = function() return val end}
+  end
+  function frame:newChild(opt)
+    opt = opt or {}
+    return new_frame(opt.title or title, opt.args, frame)
+  end
+  function frame:expandTemplate(opt)
+    local name = opt.title
+    if type(name) == "table" then
+      name = name.prefixedText
+    end
+    if ustring.find(name, "^Template:") then
+      name = ustring.sub(name, 10)
+    end
+    return py.preprocess(template_call(name, opt.args))
+  end
+  function frame:preprocess(text)
+    if type(text) == "table" then
+      text = text.text
+    end
+    return py.preprocess(text)
+  end
+  function frame:callParserFunction(name, args, ...)
+    if type(name) == "table" then
+      name, args = name.name, name.args
+    elseif type(args) ~= "table" then
+      args = {args, ...}
+    end
+    local first = args[1]
+    local rest = {}
+    for k, v in pairs(args) do
+      if type(k) == "number" then
+        if k > 1 then
+          rest[k - 1] = v
+        end
+      else
+        rest[k] = v
+      end
+    end
+    return py.preprocess(template_call(name .. ":" .. (first or ""), rest))
+  end
+  function frame:extensionTag(name, content, args)
+    if type(name) == "table" then
+      name, content, args = name.name, name.content, name.args
+    end
+    return py.preprocess(text.tag(name, type(args) == "table" and args or {}, content or ""))
+  end
+  return frame
+end
+
+mw.getCurrentFrame = function() return current_frame end
+
+-- Built-in Scribunto libraries that modules may require.
+package.loaded["strict"] = true
+package.loaded["libraryUtil"] = {
+  checkType = function(name, argIdx, arg, expectType, nilOk)
+    if arg == nil and nilOk then
+      return
+    end
+    if type(arg) ~= expectType then
+      error(string.format("bad argument #%d to '%s' (%s expected, got %s)", argIdx, name, expectType, type(arg)), 3)
+    end
+  end,
+  checkTypeMulti = function(name, argIdx, arg, expectTypes)
+    local argType = type(arg)
+    for _, expectType in ipairs(expectTypes) do
+      if argType == expectType then
+        return
+      end
+    end
+    error(string.format("bad argument #%d to '%s' (%s expected, got %s)", argIdx, name,
+      table.concat(expectTypes, " or "), argType), 3)
+  end,
+  checkTypeForIndex = function(index, value, expectType)
+    if type(value) ~= expectType then
+      error(string.format("value for index '%s' must be %s, %s given", index, expectType, type(value)), 3)
+    end
+  end,
+  checkTypeForNamedArg = function(name, argName, arg, expectType, nilOk)
+    if arg == nil and nilOk then
+      return
+    end
+    if type(arg) ~= expectType then
+      error(string.format("bad named argument %s to '%s' (%s expected, got %s)", argName, name, expectType, type(arg)), 3)
+    end
+  end,
+  makeCheckSelfFunction = function(libraryName, varName, selfObj, selfObjDesc)
+    return function(self, method)
+      if self ~= selfObj then
+        error(string.format("%s: invalid %s. Did you call %s with a dot instead of a colon, i.e. %s.%s() instead of %s:%s()?",
+          libraryName, selfObjDesc, method, varName, method, varName, method), 3)
+      end
+    end
+  end,
+}
+
+local modules = {}
+local lua_require = require
+function require(name)
+  if package.loaded[name] ~= nil then
+    return package.loaded[name]
+  end
+  local modname = py.module_name(name)
+  if not modname then
+    return lua_require(name)
+  end
+  if modules[modname] == nil then
+    local source = py.module_source(modname)
+    if not source then
+      error("module '" .. name .. "' not found")
+    end
+    local chunk, err = loadstring(source, "=Module:" .. modname)
+    if not chunk then
+      error(err)
+    end
+    local ret = chunk()
+    modules[modname] = ret == nil and true or ret
+  end
+  return modules[modname]
+end
+
+local function invoke(modname, funcname, args, parent_args, parent_title)
+  local mod = require("Module:" .. modname)
+  if type(mod) ~= "table" then
+    error("module '" .. modname .. "' did not return a table")
+  end
+  local func = mod[funcname]
+  if type(func) ~= "function" then
+    error("function '" .. funcname .. "' does not exist in module '" .. modname .. "'")
+  end
+  local parent = new_frame(parent_title, parent_args)
+  local frame = new_frame("Module:" .. modname, args, parent)
+  current_frame = frame
+  local results = {n = 0}
+  local function collect(...)
+    results.n = select("#", ...)
+    for i = 1, results.n do
+      results[i] = (select(i, ...))
+    end
+  end
+  collect(func(frame))
+  local out = {}
+  for i = 1, results.n do
+    if results[i] ~= nil then
+      out[#out + 1] = tostring(results[i])
+    end
+  end
+  return table.concat(out)
+end
+
+return {invoke = invoke}
+"""
+
+################################################################################
+#                                 LuaEngine                                    #
+################################################################################
+
+# Normalize a page title as MediaWiki does, except that the first letter is capitalized only for namespace names (the
+# English Wiktionary is case-sensitive). Return (NAMESPACE, TEXT, FRAGMENT) or None if the title is invalid.
+def normalize_title(text, default_namespace=0):
+  text = re.sub("[_ ]+", " ", text).strip()
+  fragment = ""
+  if "#" in text:
+    text, fragment = text.split("#", 1)
+    text = text.strip()
+  if text.startswith(":"):
+    text = text[1:].strip()
+    default_namespace = 0
+  namespace = default_namespace
+  m = re.search("^([^:]+?) *: *(.*)$", text)
+  if m:
+    prefix = m.group(1)
+    prefix = prefix[0].upper() + prefix[1:].lower() if prefix else prefix
+    if prefix in namespace_aliases or m.group(1) in namespace_aliases:
+      namespace = namespace_aliases.get(prefix, namespace_aliases.get(m.group(1)))
+      text = m.group(2)
+    else:
+      for nsid, nsname in namespaces.items():
+        if nsname and nsname.lower() == m.group(1).lower():
+          namespace = nsid
+          text = m.group(2)
+          break
+  if not text or re.search(r"[<>\[\]|{}\n]", text):
+    return None
+  if namespace != 0:
+    text = text[0].upper() + text[1:]
+  return namespace, text, fragment
+
+def title_fields(namespace, text, fragment):
+  nstext = namespaces.get(namespace, "")
+  prefixed = "%s:%s" % (nstext, text) if nstext else text
+  # Subpages are enabled in all namespaces except main and File.
+  has_subpages = namespace not in [0, 6]
+  parts = text.split("/") if has_subpages else [text]
+  return {
+    "namespace": namespace, "nsText": nstext, "text": text, "prefixedText": prefixed,
+    "fullText": prefixed + ("#" + fragment if fragment else ""), "fragment": fragment,
+    "baseText": "/".join(parts[:-1]) if len(parts) > 1 else text, "rootText": parts[0],
+    "subpageText": parts[-1], "isSubpage": len(parts) > 1, "isTalkPage": namespace % 2 == 1,
+    "isContentPage": namespace in [0, 100, 110, 114, 118], "isExternal": False, "isLocal": True,
+    "interwiki": "", "id": 0, "contentModel": "Scribunto" if namespace == 828 else "wikitext",
+    "isSpecialPage": False, "isRedirect": False,
+  }
+
+def json_to_lua(lua, val):
+  if isinstance(val, dict):
+    return lua.table_from({k: json_to_lua(lua, v) for k, v in val.items()})
+  if isinstance(val, list):
+    return lua.table_from([json_to_lua(lua, v) for v in val])
+  return val
+
+def lua_to_json(lua_type, val):
+  if lua_type(val) != "table":
+    return val
+  keys = list(val.keys())
+  if all(isinstance(k, int) for k in keys) and sorted(keys) == list(range(1, len(keys) + 1)):
+    return [lua_to_json(lua_type, val[k]) for k in range(1, len(keys) + 1)]
+  return {lua_number_to_string(k) if isinstance(k, (int, float)) else k: lua_to_json(lua_type, v)
+          for k, v in val.items()}
+
+# Run Lua modules locally. `module_dir` is the directory containing module sources, as NAME.lua for Module:NAME (with
+# a slash in NAME replaced by %2F). `fetch_module_source`, if given, is called with a module name (without the Module:
+# prefix) for modules not found locally and should return its source or None; fetched sources are saved under
+# MODULE_DIR/fetched. `expand_remote(text, pagetitle)` is called to preprocess wikitext that can't be handled locally
+# (e.g. for frame:expandTemplate()); `page_exists(title)` and `page_text(title)` are used for mw.title. If not given,
+# the corresponding operations raise a Lua error.
+class LuaEngine(object):
+  def __init__(self, module_dir, fetch_module_source=None, expand_remote=None, page_exists=None, page_text=None):
+    try:
+      import lupa.lua51 as lupa_module
+    except ImportError:
+      try:
+        import lupa as lupa_module
+      except ImportError:
+        raise LuaEngineError("The lupa package is required to run Lua modules locally")
+    self.lupa = lupa_module
+    self.module_dir = module_dir
+    self.fetch_module_source = fetch_module_source
+    self.expand_remote = expand_remote
+    self.page_exists = page_exists
+    self.page_text = page_text
+    self.pagetitle = ""
+    self.log_lines = []
+    self.missing_modules = set()
+    self.lua = lupa_module.LuaRuntime(encoding="utf-8", unpack_returned_tuples=True)
+    lua_type = lupa_module.lua_type
+    py = {
+      "ustring_find": ustring_find,
+      "ustring_match": ustring_match,
+      "ustring_gmatch": ustring_gmatch,
+      "ustring_gsub": make_ustring_gsub(lua_type),
+      "ustring_len": lambda s: len(to_str(s)),
+      "ustring_sub": ustring_sub,
+      "ustring_char": lambda *codepoints: "".join(chr(int(cp)) for cp in codepoints),
+      "ustring_codepoint": ustring_codepoint,
+      "ustring_gcodepoint": ustring_gcodepoint,
+      "ustring_lower": lambda s: to_str(s).lower(),
+      "ustring_upper": lambda s: to_str(s).upper(),
+      "ustring_toNFC": lambda s: unicodedata.normalize("NFC", to_str(s)),
+      "ustring_toNFD": lambda s: unicodedata.normalize("NFD", to_str(s)),
+      "ustring_toNFKC": lambda s: unicodedata.normalize("NFKC", to_str(s)),
+      "ustring_toNFKD": lambda s: unicodedata.normalize("NFKD", to_str(s)),
+      "json_encode": lambda val, flags=None: json.dumps(lua_to_json(lua_type, val), ensure_ascii=False,
+                                                        indent=4 if flags and int(flags) & 4 else None),
+      "json_decode": lambda s, flags=None: json_to_lua(self.lua, json.loads(to_str(s))),
+      "log": self.log_lines.append,
+      "format_num": lambda n: "{:,}".format(int(n) if n == int(n) else n),
+      "fetch_language_name": lambda code: "English" if code == "en" else "",
+      "uri_encode": self.uri_encode,
+      "uri_decode": self.uri_decode,
+      "anchor_encode": lambda s: re.sub(" ", "_", to_str(s)),
+      "hash_value": lambda algo, s: hashlib.new(to_str(algo), to_str(s).encode("utf-8")).hexdigest(),
+      "namespaces": lambda: self.lua.table_from(namespaces),
+      "namespace_id": self.namespace_id,
+      "title_fields": self.title_fields,
+      "make_title_fields": self.make_title_fields,
+      "title_exists": self.title_exists,
+      "title_content": self.title_content,
+      "current_title": lambda: self.pagetitle,
+      "preprocess": self.preprocess,
+      "module_name": self.module_name,
+      "module_source": self.module_source,
+    }
+    self.functions = self.lua.execute(lua_bootstrap, self.lua.table_from(py))
+    self.lua_invoke = self.functions["invoke"]
+
+  def uri_encode(self, s, enctype="QUERY"):
+    s = to_str(s)
+    if enctype == "WIKI":
+      return quote(s, safe=";@$!*(),/:")
+    if enctype == "PATH":
+      return quote(s, safe="")
+    return quote(s, safe="").replace("%20", "+")
+
+  def uri_decode(self, s, enctype="QUERY"):
+    from urllib.parse import unquote, unquote_plus
+    return unquote(to_str(s)) if enctype == "PATH" else unquote_plus(to_str(s))
+
+  def namespace_id(self, name):
+    name = to_str(name)
+    if name in namespace_aliases:
+      return namespace_aliases[name]
+    for nsid, nsname in namespaces.items():
+      if nsname.lower() == name.lower():
+        return nsid
+    return None
+
+  def title_fields(self, text, namespace=None):
+    if namespace is None:
+      default_namespace = 0
+    elif isinstance(namespace, (int, float)):
+      default_namespace = int(namespace)
+    else:
+      default_namespace = self.namespace_id(namespace)
+      if default_namespace is None:
+        return None
+    normalized = normalize_title(to_str(text), default_namespace)
+    if not normalized:
+      return None
+    return self.lua.table_from(title_fields(*normalized))
+
+  def make_title_fields(self, namespace, text, fragment=None):
+    if not isinstance(namespace, (int, float)):
+      namespace = self.namespace_id(namespace)
+      if namespace is None:
+        return None
+    text = re.sub("[_ ]+", " ", to_str(text)).strip()
+    if not text or re.search(r"[<>\[\]|{}\n#]", text):
+      return None
+    return self.lua.table_from(title_fields(int(namespace), text, to_str(fragment) if fragment else ""))
+
+  def title_exists(self, title):
+    if not self.page_exists:
+      raise LuaEngineError("Can't determine whether %s exists" % title)
+    return self.page_exists(title)
+
+  def title_content(self, title):
+    if not self.page_text:
+      raise LuaEngineError("Can't fetch the text of %s" % title)
+    return self.page_text(title)
+
+  def preprocess(self, text):
+    if not self.expand_remote:
+      raise LuaEngineError("Can't preprocess wikitext: %s" % text)
+    result = self.expand_remote(to_str(text), self.pagetitle)
+    if result is None:
+      raise LuaEngineError("Error preprocessing wikitext: %s" % text)
+    return result
+
+  def module_name(self, name):
+    name = re.sub("[_ ]+", " ", to_str(name)).strip()
+    m = re.search("^(?:Module|MOD) *: *(.+)$", name, re.I)
+    if not m:
+      return None
+    return m.group(1)
+
+  def module_filename(self, name, subdir=None):
+    filename = name.replace("/", "%2F") + ".lua"
+    return os.path.join(self.module_dir, subdir, filename) if subdir else os.path.join(self.module_dir, filename)
+
+  def module_source(self, name):
+    for filename in [self.module_filename(name), self.module_filename(name, "fetched")]:
+      if os.path.exists(filename):
+        with open(filename, "r", encoding="utf-8") as fp:
+          return fp.read()
+    if not self.fetch_module_source or name in self.missing_modules:
+      return None
+    source = self.fetch_module_source(name)
+    if not source:
+      self.missing_modules.add(name)
+    if source:
+      os.makedirs(os.path.join(self.module_dir, "fetched"), exist_ok=True)
+      with open(self.module_filename(name, "fetched"), "w", encoding="utf-8") as fp:
+        fp.write(source)
+    return source
+
+  # Call function `function` in Module:`module` as if from {{#invoke:MODULE|FUNCTION|...}} on page `pagetitle`.
+  # `args` are the #invoke arguments (after the function name) and `parent_args`, if not None, the arguments of the
+  # template `parent_title` containing the #invoke; both are dictionaries with int keys for numbered arguments. If
+  # `parent_args` is None, the #invoke is directly on the page, and as in Scribunto, the parent frame is that of the
+  # page, with no arguments. Return the result as a string; raise LuaEngineError on error.
+  def invoke(self, module, function, args, pagetitle, parent_args=None, parent_title=None):
+    self.pagetitle = pagetitle
+    if parent_args is None:
+      parent_args = {}
+      parent_title = pagetitle
+    try:
+      return self.lua_invoke(module, function, self.lua.table_from(args), self.lua.table_from(parent_args),
+        parent_title)
+    except KeyboardInterrupt:
+      raise
+    except Exception as e:
+      # Includes Lua errors and exceptions raised by the Python callbacks (e.g. on failure to fetch a module).
+      raise LuaEngineError("Lua error in Module:%s: %s" % (module, e))
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+# Generate a shell script that runs a bot script in a fixed number of parallel parts. See also run_parallel.py, which
+# runs the parts itself, handing out chunks dynamically, retrying failed chunks and merging the output.
+
 import argparse
 
 parser = argparse.ArgumentParser(description="Generate script to run a bot script in parallel.")
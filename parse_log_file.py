@@ -101,17 +101,27 @@ def yield_page_lines(fn):
       page_lines[i] = fix_page_line(page_lines[i])
 
   for line in open(fn, "r", encoding="utf-8"):
-    line = line.strip()
+    # Logs in JSON format (--log-format jsonl) give the index and page name directly.
+    record = blib.decode_log_record(line)
+    if record is not None and "title" in record:
+      fields = (str(record["index"]), record["title"], record["msg"].strip())
+      line = blib.log_record_to_text(record).strip()
+    else:
+      if record is not None:
+        line = record["msg"]
+      line = line.strip()
+      m = re.match(r"^Page ([0-9/.-]+) (.*?): (.*)$", line)
+      fields = m and m.groups()
     # Add a colon after Processing to match other lines
-    m = re.match(r"^(Page [^{}]*: )Processing (\{\{.*?\}\})$", line)
-    if m:
-      line = "%sProcessing: %s" % (m.groups())
-    m = re.match(r"^Page ([0-9/.-]+) (.*?): (.*)$", line)
-    if not m:
+    if fields and "{" not in fields[0] + fields[1]:
+      m = re.match(r"^([^{}]*: )?Processing (\{\{.*?\}\})$", fields[2])
+      if m:
+        fields = (fields[0], fields[1], "%sProcessing: %s" % (m.group(1) or "", m.group(2)))
+        line = "Page %s %s: %s" % fields
+    if not fields:
       pagemsg("Can't parse line, skipping: [%s]" % line)
     else:
-      newindex = m.group(1)
-      newpagename = m.group(2)
+      newindex, newpagename, rest = fields
       # We're at the end of a page, starting a new one.
       if newindex != index or newpagename != pagename:
         if index != None:
@@ -135,7 +145,7 @@ def yield_page_lines(fn):
         last_processing_template = None
         replace_from_templates = []
         replace_to_template = None
-      mm = re.match(r"Replaced (\{\{.*?\}\}) with (\{\{.*?\}\})$", m.group(3))
+      mm = re.match(r"Replaced (\{\{.*?\}\}) with (\{\{.*?\}\})$", rest)
       if mm:
         # We found a "Replaced {{FOO}} with {{BAR}} line.
         from_template = mm.group(1)
@@ -151,7 +161,7 @@ def yield_page_lines(fn):
           replace_from_templates = [from_template]
           replace_to_template = to_template
       else:
-        mm = re.match(r".*?: Processing: (\{\{.*?\}\})$", m.group(3))
+        mm = re.match(r".*?: Processing: (\{\{.*?\}\})$", rest)
         if mm:
           processing_template = mm.group(1)
           if last_processing_template and (last_processing_template !=
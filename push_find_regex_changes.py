@@ -121,28 +121,25 @@ if __name__ == "__main__":
   args = parser.parse_args()
   start, end = blib.parse_start_end(args.start, args.end)
 
-  origpages = {}
+  # Both files are read using indexed readers, so the text of a given page is only decoded when needed and the index
+  # is reused on subsequent runs over the same files.
+  origfile = blib.FindRegexFile(args.origfile) if args.origfile else None
+  def get_origcontents(pagetitle):
+    return origfile.get_text(pagetitle) if origfile else None
 
-  if args.origfile:
-    origlines = open(args.origfile, "r", encoding="utf-8")
-    for index, pagetitle, text, comment in blib.yield_text_from_find_regex(origlines, args.verbose):
-      origpages[pagetitle] = text
-
-  lines = open(args.direcfile, "r", encoding="utf-8")
+  direcfile = blib.FindRegexFile(args.direcfile)
 
   if blib.args_has_non_default_pages(args):
-    newpages = {}
-    for index, pagetitle, text, comment in blib.yield_text_from_find_regex(lines, args.verbose):
-      newpages[pagetitle] = (text, comment)
-
     def do_process_text_on_page(index, pagetitle, curtext):
       def pagemsg(txt):
         msg("Page %s %s: %s" % (index, pagetitle, txt))
-      origcontents = origpages.get(pagetitle, None)
-      newtext, comment = newpages.get(pagetitle, (None, None))
+      origcontents = get_origcontents(pagetitle)
+      entry = direcfile.by_title.get(pagetitle)
+      newtext = entry and direcfile.text(entry)
       if not newtext:
         pagemsg("Skipping because not found in among new page contents")
         return
+      comment = entry[4]
       if origcontents == newtext:
         pagemsg("Skipping contents because no change")
         return
@@ -150,10 +147,10 @@ if __name__ == "__main__":
     blib.do_pagefile_cats_refs(args, start, end, do_process_text_on_page, edit=True, stdin=True)
 
   else:
-    index_pagetitle_text_comment = blib.yield_text_from_find_regex(lines, args.verbose)
+    index_pagetitle_text_comment = direcfile.iter_pages(start, end)
     for _, (index, pagetitle, newtext, comment) in blib.iter_items(index_pagetitle_text_comment, start, end,
         get_name=lambda x:x[1], get_index=lambda x:x[0]):
-      origcontents = origpages.get(pagetitle, None)
+      origcontents = get_origcontents(pagetitle)
       if origcontents == newtext:
         msg("Page %s %s: Skipping contents because no change" % (index, pagetitle))
       else:
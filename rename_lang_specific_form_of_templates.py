@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import pywikibot, re, sys, argparse
+import pywikibot, re, sys, argparse, time
 import traceback, pprint
 
 import blib
@@ -5250,6 +5250,229 @@ def expand_spec(spec, data):
 
   return newname, expanded_specs, comment
 
+# Compiled versions of the specs, which behave the same as expand_spec() and expand_set_value() but do the work of
+# interpreting and checking the spec once, when compiling, rather than for each template being rewritten. A compiled
+# spec is a function of a TemplateData object that returns the same (NEW_NAME, NEW_PARAMS, COMMENT) as expand_spec().
+# Compiled set values and steps (the compiled subspecs) are functions of a TemplateData object and the template's
+# parameters, given as a TemplateParams object. Parts of a spec computed by a function of the TemplateData object are
+# interpreted as before, since they may be different for each template.
+
+# The parameters of a template, extracted once per template. `items` lists (NAME, VALUE) for each parameter in order,
+# where NAME is stripped, and `values` maps each name to its value, as returned by getparam() (i.e. the value of the
+# last parameter of that name).
+class TemplateParams(object):
+  def __init__(self, t):
+    self.items = [(str(param.name).strip(), str(param.value)) for param in t.params]
+    self.values = dict(self.items)
+
+def compile_set_value(value):
+  def check(cond, err):
+    if not cond:
+      raise BadRewriteSpec("Error compiling set value: %s; value=%s" % (err, value))
+  if callable(value):
+    return lambda data, params: expand_set_value(value(data), data)
+  if isinstance(value, str):
+    return lambda data, params: value
+  if isinstance(value, list):
+    elements = [compile_set_value(x) for x in value]
+    if all(isinstance(x, str) for x in value):
+      # Return a copy, as the caller may modify the list.
+      return lambda data, params: list(value)
+    def expand_list(data, params):
+      retval = []
+      for element in elements:
+        x = element(data, params)
+        if type(x) is list:
+          retval.extend(x)
+        else:
+          retval.append(x)
+      return retval
+    return expand_list
+  check(isinstance(value, tuple), "wrong type %s of %s, not tuple" % (type(value), value))
+  check(len(value) >= 1, "empty value")
+  direc = value[0]
+  if direc == "copy":
+    check(len(value) == 2, "wrong length %s of value %s, != 2" % (len(value), value))
+    param = value[1].strip()
+    return lambda data, params: params.values.get(param)
+  elif direc == "lookup":
+    check(len(value) == 3, "wrong length %s of value %s, != 3" % (len(value), value))
+    param = value[1].strip()
+    table = value[2]
+    check(type(table) is dict, "wrong type %s of %s, not dict" % (type(table), table))
+    compiled_table = {key: compile_set_value(tabval) for key, tabval in table.items()}
+    default = compiled_table.get(True)
+    def lookup(data, params):
+      lookval = params.values.get(param, "").strip()
+      tabval = compiled_table.get(lookval, default)
+      if tabval is None:
+        raise BadTemplateValue("Unrecognized value %s=%s" % (value[1], lookval))
+      return tabval(data, params)
+    return lookup
+  else:
+    check(False, "Unrecognized directive %s" % direc)
+
+def compile_spec(spec):
+  def check(cond, err):
+    if not cond:
+      raise BadRewriteSpec("Error compiling spec: %s; spec=%s" % (err, spec))
+  # Errors that can only be detected when applying the spec, reported as by expand_spec().
+  def expand_error(data, err):
+    return BadRewriteSpec("Error expanding spec for template %s: %s; spec=%s" % (str(data.t), err, spec))
+  if callable(spec):
+    return lambda data: expand_spec(spec(data), data)
+  check(type(spec) is tuple, "wrong type %s of %s, not tuple" % (type(spec), spec))
+  check(len(spec) >= 1, "empty spec")
+  newname_spec = spec[0]
+  # Each step appends to the list of new params, and returns the new comment (for "comment") or None.
+  steps = []
+  for subspec in spec[1:]:
+    check(len(subspec) >= 1, "empty subspec")
+    if subspec[0] == "error-if":
+      check(len(subspec) == 2, "wrong length %s of subspec %s, != 2" % (len(subspec), subspec))
+      check(len(subspec[1]) >= 1, "empty subspec[1]")
+      errtype = subspec[1][0]
+      if errtype == "present-except":
+        check(len(subspec[1]) == 2, "wrong length %s of subspec[1] %s, != 2" % (len(subspec[1]), subspec[1]))
+        def error_if_present_except(data, params, new_params, allowed_params=frozenset(subspec[1][1])):
+          for pname, _ in params.items:
+            if pname not in allowed_params:
+              raise BadTemplateValue("Disallowed param %s=%s" % (pname, params.values[pname]))
+        steps.append(error_if_present_except)
+      elif errtype in ["eq", "neq"]:
+        check(len(subspec[1]) == 3, "wrong length %s of subspec[1] %s, != 3" % (len(subspec[1]), subspec[1]))
+        def error_if_eq(data, params, new_params, param=subspec[1][1], value=subspec[1][2],
+                        disallow_equal=errtype == "eq"):
+          actual = params.values.get(param.strip(), "")
+          if (actual == value) == disallow_equal:
+            if disallow_equal:
+              raise BadTemplateValue("Disallowed value: %s=%s" % (param, value))
+            raise BadTemplateValue("Disallowed value: %s=%s, expected %s" % (param, actual, value))
+        steps.append(error_if_eq)
+      else:
+        check(False, "Unrecognized error-if subtype: %s" % errtype)
+
+    elif subspec[0] == "set":
+      check(len(subspec) == 3, "wrong length %s of subspec %s, != 3" % (len(subspec), subspec))
+      _, param, newval = subspec
+      check(isinstance(param, str), "wrong type %s of %s, not str" % (type(param), param))
+      def set_param(data, params, new_params, param=param, newval=compile_set_value(newval),
+                    numbered=re.search("^[0-9]+$", param)):
+        value = newval(data, params)
+        if value is None:
+          pass
+        elif isinstance(value, str):
+          new_params.append((param, value))
+        else:
+          if type(value) is not list:
+            raise expand_error(data, "wrong type %s of %s, not list" % (type(value), value))
+          while len(value) > 0 and value[-1] is None:
+            del value[-1]
+          if numbered:
+            intparam = int(param)
+            for val in value:
+              new_params.append((str(intparam), "" if val is None else val))
+              intparam += 1
+          else:
+            for index, val in enumerate(value):
+              if val is not None:
+                new_params.append((param if index == 0 else "param%s" % (index + 1), val))
+      steps.append(set_param)
+
+    elif subspec[0] == "copy":
+      check(len(subspec) in [2, 3], "wrong length %s of subspec %s, not in [2, 3]" % (len(subspec), subspec))
+      def copy_param(data, params, new_params, fromparam=subspec[1].strip(), toparam=subspec[-1]):
+        if fromparam in params.values:
+          new_params.append((toparam, params.values[fromparam]))
+      steps.append(copy_param)
+
+    elif subspec[0] in ["copylist", "copyallbut"]:
+      # These are rare, so they're interpreted as before, by expand_spec() on a spec consisting only of the subspec.
+      # Their new params don't depend on the template name.
+      def interpret_subspec(data, params, new_params, subspec_only=(newname_spec, subspec)):
+        new_params.extend(expand_spec(subspec_only, data)[1])
+      steps.append(interpret_subspec)
+
+    elif subspec[0] == "comment":
+      check(len(subspec) == 2, "wrong length %s of subspec %s, != 2" % (len(subspec), subspec))
+      def set_comment(data, params, new_params, comment=compile_set_value(subspec[1])):
+        comment = comment(data, params)
+        if not isinstance(comment, str):
+          raise expand_error(data, "wrong type %s of %s, not str" % (type(comment), comment))
+        return comment
+      steps.append(set_comment)
+
+    else:
+      check(False, "Unrecognized directive: %s" % subspec[0])
+
+  def apply_spec(data):
+    t = data.t
+    oldname = tname(t)
+    newname = newname_spec(data) if callable(newname_spec) else newname_spec
+    params = TemplateParams(t)
+    new_params = []
+    comment = None
+    for step in steps:
+      new_comment = step(data, params, new_params)
+      if new_comment is not None:
+        comment = new_comment.replace("__TEMPNAME__", oldname).replace("__NEWNAME__", newname)
+    if not comment:
+      # See expand_spec().
+      for new_param in new_params:
+        if new_param[0] == "1" and oldname.startswith(new_param[1] + "-"):
+          comment = "rename {{%s}} to {{%s|%s}} with appropriate param changes" % (
+              oldname, newname, new_param[1])
+          break
+    if not comment:
+      comment = "rename {{%s}} to {{%s}} with appropriate param changes" % (oldname, newname)
+    return newname, new_params, comment
+  return apply_spec
+
+compiled_specs = {}
+
+# Compile the specs of the templates in `templates` into `compiled_specs`. A spec that fails to compile is reported and
+# interpreted using expand_spec() instead, which will report the error for each template it's used on.
+def compile_specs(templates):
+  for template in templates:
+    if template in compiled_specs or template not in templates_to_rename_map:
+      continue
+    spec = templates_to_rename_map[template]
+    try:
+      compiled_specs[template] = compile_spec(spec)
+    except BadRewriteSpec as e:
+      errandmsg("INTERNAL ERROR: %s: Compiling spec for Template:%s" % (str(e), template))
+      compiled_specs[template] = lambda data, spec=spec: expand_spec(spec, data)
+
+# Timings and mismatches when comparing expand_spec() with the compiled specs using --benchmark-specs.
+benchmark_stats = {"templates": 0, "mismatched": 0, "interpreted": 0.0, "compiled": 0.0}
+
+# Apply `spec` both interpreted and compiled to the template in `data`, timing both and checking that they give the
+# same result (or raise the same exception). Return or raise the result of the compiled spec.
+def benchmark_spec(tn, spec, data):
+  def apply(fun):
+    starttime = time.time()
+    try:
+      result = ("result", fun(data))
+    except (BadTemplateValue, BadRewriteSpec) as e:
+      result = ("error", e)
+    return result, time.time() - starttime
+  interpreted, interpreted_time = apply(lambda data: expand_spec(spec, data))
+  compiled, compiled_time = apply(compiled_specs[tn])
+  benchmark_stats["templates"] += 1
+  benchmark_stats["interpreted"] += interpreted_time
+  benchmark_stats["compiled"] += compiled_time
+  def describe(result):
+    kind, value = result
+    return (kind, type(value).__name__, str(value)) if kind == "error" else result
+  if describe(interpreted) != describe(compiled):
+    benchmark_stats["mismatched"] += 1
+    data.pagemsg("WARNING: Compiled spec gives %s but interpreted spec gives %s: %s" % (
+      describe(compiled), describe(interpreted), str(data.t)))
+  kind, value = compiled
+  if kind == "error":
+    raise value
+  return value
+
 def process_text_on_page(index, pagetitle, text):
   def pagemsg(txt):
     msg("Page %s %s: %s" % (index, pagetitle, txt))
@@ -5271,7 +5494,10 @@ def process_text_on_page(index, pagetitle, text):
       data = TemplateData(index, pagetitle, t, pagemsg)
       template_spec = templates_to_rename_map[tn]
       try:
-        new_name, new_params, comment = expand_spec(template_spec, data)
+        if args.benchmark_specs:
+          new_name, new_params, comment = benchmark_spec(tn, template_spec, data)
+        else:
+          new_name, new_params, comment = compiled_specs[tn](data)
       except BadTemplateValue as e:
         pagemsg("WARNING: %s: %s" % (str(e), origt))
         continue
@@ -5384,10 +5610,12 @@ parser.add_argument("--lang-for-combine-inflection-of", help="Language name of s
 parser.add_argument("--dont-combine-tags", help="Comma-separated list of tags not to combine with other tags")
 parser.add_argument("--check-ignores-include-ucdot", help="Whether checking ignore issues, include type 'ucdot' to see whether it can be converted to 'lcnodot'", action="store_true")
 parser.add_argument("--partial-page", action="store_true", help="Input was generated with 'find_regex.py --lang LANG' and has no ==LANG== header.")
+parser.add_argument("--benchmark-specs", action="store_true", help="Also apply each spec without compiling it, checking that the result is the same and outputting the time taken by each at the end.")
 args = parser.parse_args()
 start, end = blib.parse_start_end(args.start, args.end)
 
 initialize_templates_to_rename_map(args.do_all, args.do_specified)
+compile_specs(templates_to_actually_do)
 if args.check_ignores:
   templates_to_process_for_check_ignore = {}
   for template in templates_to_actually_do:
@@ -5411,3 +5639,8 @@ if args.check_ignores:
 else:
   blib.do_pagefile_cats_refs(args, start, end, process_text_on_page, edit=True, stdin=True,
       default_refs=["Template:%s" % template for template in templates_to_actually_do])
+  if args.benchmark_specs:
+    msg("%s templates: interpreted specs %.1f ms, compiled specs %.1f ms (%.2fx); %s mismatched" % (
+      benchmark_stats["templates"], benchmark_stats["interpreted"] * 1000, benchmark_stats["compiled"] * 1000,
+      benchmark_stats["interpreted"] / benchmark_stats["compiled"] if benchmark_stats["compiled"] > 0 else 0,
+      benchmark_stats["mismatched"]))
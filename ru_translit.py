@@ -6,6 +6,7 @@ import re
 import unicodedata
 
 from blib import remove_links, msg
+import translitlib
 
 # FIXME:
 #
@@ -73,38 +74,45 @@ tt = {
 
 russian_vowels = "АОУҮЫЭЯЁЮИЕЪЬІѢѴаоуүыэяёюиеъьіѣѵAEIOUYĚƐaeiouyěɛʹʺ"
 
+# Contextual rules for tr(), applied along with the table in tt in a single
+# pass; see translitlib.py.
+tr_rules = [
+    # Remove word-final hard sign
+    ("Ъ", "", None, ["$", r"[- \]]"]),
+    ("ъ", "", None, ["$", r"[- \]]"]),
+    # ё after a "hushing" consonant becomes ó (ё is mostly stressed)
+    ("ё", "ó", "[жшчщЖШЧЩ]"),
+    # ю after ж and ш becomes u (e.g. брошюра, жюри)
+    ("ю", "u", "[жшЖШ]"),
+] + [
+    # е after a vowel, at the beginning of a word or after non-word char
+    # becomes je. An accent is itself a non-word char, so е after an
+    # accented vowel is covered. ё after a "hushing" consonant doesn't count
+    # as a vowel here, since it becomes ó.
+    (e, je, ["^", "[" + russian_vowels.replace("ё", "") + r"\W]", "^ё",
+        "[^жшчщЖШЧЩ]ё"])
+    for e, je in [("Е", "Je"), ("е", "je"), ("Ѣ", "Jě"), ("ѣ", "jě")]
+]
+
+tr_transliterator = translitlib.Transliterator(tr_rules, tt)
+
 # Transliterates text, which should be a single word or phrase. It should
 # include stress marks, which are then preserved in the transliteration.
 def tr(text, lang=None, sc=None, msgfun=msg):
     text = remove_links(text)
     text = tr_canonicalize_russian(text)
 
-    # Remove word-final hard sign
-    text = rsub(text, "[Ъъ]($|[- \]])", r"\1")
-
-    # ё after a "hushing" consonant becomes ó (ё is mostly stressed)
-    text = rsub(text, "([жшчщЖШЧЩ])ё", r"\1ó")
-    # ю after ж and ш becomes u (e.g. брошюра, жюри)
-    text = rsub(text, "([жшЖШ])ю", r"\1u")
-
-    # е after a vowel, at the beginning of a word or after non-word char
-    # becomes je
-    def replace_e(m):
-        ttab = {"Е":"Je", "е":"je", "Ѣ":"Jě", "ѣ":"jě"}
-        return m.group(1) + ttab[m.group(2)]
-    # repeat to handle sequences of ЕЕЕЕЕ...
-    for i in range(2):
-        text = re.sub("(^|[" + russian_vowels + r"\W]" + ACGROPT +
-                # re.U so \W is Unicode-dependent
-                ")([ЕеѢѣ])", replace_e, text, 0, re.U)
-
-    text = rsub(text, '.', tt)
+    text = tr_transliterator.tr(text)
 
     # compose accented characters
     text = tr_canonicalize_latin(text)
 
     return text
 
+# Transliterate each string in TEXTS, returning a list of the results.
+def tr_many(texts, lang=None, sc=None, msgfun=msg):
+    return translitlib.tr_many(lambda text: tr(text, lang, sc, msgfun), texts)
+
 # for adjectives and pronouns; in Lua, may be called directly from a template
 # FIXME: Isn't properly translated to Python yet
 def tr_adj(text):
@@ -565,17 +573,23 @@ def pre_canonicalize_latin(text, russian=None, msgfun=msg):
     debprint("pre_canonicalize_latin: Exit, text=%s" % text)
     return text
 
+latin_composition = {
+    "a"+AC:"á", "e"+AC:"é", "i"+AC:"í",
+    "o"+AC:"ó", "u"+AC:"ú", "y"+AC:"ý", "n"+AC:"ń",
+    "A"+AC:"Á", "E"+AC:"É", "I"+AC:"Í",
+    "O"+AC:"Ó", "U"+AC:"Ú", "Y"+AC:"Ý", "N"+AC:"Ń",
+    "a"+GR:"à", "e"+GR:"è", "i"+GR:"ì",
+    "o"+GR:"ò", "u"+GR:"ù", "y"+GR:"ỳ",
+    "A"+GR:"À", "E"+GR:"È", "I"+GR:"Ì",
+    "O"+GR:"Ò", "U"+GR:"Ù", "Y"+GR:"Ỳ",
+}
+# Only vowels are recomposed.
+latin_composition_transliterator = translitlib.Transliterator(table=dict(
+    (k, v) for k, v in latin_composition.items() if k[0] in "aeiouyAEIOUY"))
+
 def tr_canonicalize_latin(text):
     # recompose accented letters
-    text = rsub(text, "[aeiouyAEIOUY][" + AC + GR + "]",
-        {"a"+AC:"á", "e"+AC:"é", "i"+AC:"í",
-         "o"+AC:"ó", "u"+AC:"ú", "y"+AC:"ý", "n"+AC:"ń",
-         "A"+AC:"Á", "E"+AC:"É", "I"+AC:"Í",
-         "O"+AC:"Ó", "U"+AC:"Ú", "Y"+AC:"Ý", "N"+AC:"Ń",
-         "a"+GR:"à", "e"+GR:"è", "i"+GR:"ì",
-         "o"+GR:"ò", "u"+GR:"ù", "y"+GR:"ỳ",
-         "A"+GR:"À", "E"+GR:"È", "I"+GR:"Ì",
-         "O"+GR:"Ò", "U"+GR:"Ù", "Y"+GR:"Ỳ",})
+    text = latin_composition_transliterator.tr(text)
 
     return text
 
@@ -650,8 +664,8 @@ def canonicalize_latin_foreign(latin, russian, msgfun=msg):
 
 def tr_canonicalize_russian(text):
     # Ё needs converting if is decomposed
-    text = rsub(text, "ё", "ё")
-    text = rsub(text, "Ё", "Ё")
+    text = text.replace("ё", "ё")
+    text = text.replace("Ё", "Ё")
 
     return text
 
@@ -704,13 +718,44 @@ def debprint(x):
     if debug_tr_matching:
         print(x)
 
+# Maximum number of results cached by tr_matching(). When the cache fills
+# up, it is cleared. Set to 0 to disable caching.
+tr_matching_cache_size = 100000
+tr_matching_cache = {}
+
+# Memoizing wrapper around tr_matching_uncached(). Bot scripts often match
+# the same Russian/Latin pair many times over (e.g. the same lemma in
+# several declension templates), so we cache the result along with any
+# messages output through MSGFUN, which are output again on a cache hit.
+# Errors are not cached.
+def tr_matching(russian, latin, err=False, msgfun=msg):
+    if not tr_matching_cache_size:
+        return tr_matching_uncached(russian, latin, err, msgfun)
+    key = (russian, latin, err)
+    cached = tr_matching_cache.get(key)
+    if cached is not None:
+        result, messages = cached
+        for message in messages:
+            msgfun(message)
+        return result
+    messages = []
+    def record_msgfun(txt):
+        messages.append(txt)
+        msgfun(txt)
+    result = tr_matching_uncached(russian, latin, err, record_msgfun)
+    if len(tr_matching_cache) >= tr_matching_cache_size:
+        tr_matching_cache.clear()
+    tr_matching_cache[key] = (result, messages)
+    return result
+
 # Vocalize Russian based on transliterated Latin, and canonicalize the
 # transliteration based on the Russian.  This works by matching the Latin
 # to the Russian and transferring Latin stress marks to the Russian as
 # appropriate, so that ambiguities of Latin transliteration can be
 # correctly handled. Returns a tuple of Russian, Latin. If unable to match,
-# throw an error if ERR, else return None.
-def tr_matching(russian, latin, err=False, msgfun=msg):
+# throw an error if ERR, else return None. Normally called through
+# tr_matching(), which caches the results.
+def tr_matching_uncached(russian, latin, err=False, msgfun=msg):
     origrussian = russian
     origlatin = latin
     russian = pre_pre_canonicalize_russian(russian, msgfun)
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import re
+import re, json, sqlite3
 
 import blib, pywikibot
 from blib import msg, getparam, addparam, site
@@ -42,6 +42,15 @@ global_disable_cache = False
 
 semi_verbose = False # Set by --semi-verbose or --verbose
 
+# Index of the heads and inflections on all Russian pages in a dump, built using
+# build_ru_head_index.py; consulted in place of live page lookups if
+# `head_index_file` is set (e.g. by --head-index). See RuHeadIndex.
+head_index_file = None
+# If set, pages edited since the dump the index was built from are looked up
+# live rather than in the index (see RuHeadIndex.load_overlay()).
+head_index_overlay = False
+head_index = None
+
 # Terms where we manually specify the corresponding lemma and accented form,
 # ignoring certain infrequent alternative uses that rarely apply but would
 # prevent link expansion. The key is the unaccented term, while the value
@@ -179,12 +188,6 @@ def lookup_heads_and_inflections(pagename, pagemsg):
   if semi_verbose:
     pagemsg("lookup_heads_and_inflections: Finding heads on page %s" % pagename)
 
-  # Use our own expand_text() rather than passing it from the caller,
-  # which may have a different value for PAGENAME; the proper value is
-  # important in expanding certain templates e.g. ru-generate-adj-forms.
-  def expand_text(tempcall):
-    return blib.expand_text(tempcall, pagename, pagemsg, semi_verbose)
-
   if pagename in terms_to_ignore:
     pagemsg("lookup_heads_and_inflections: Ignoring term because in terms_to_ignore: %s" % pagename)
     return "manual-override", None
@@ -219,130 +222,222 @@ def lookup_heads_and_inflections(pagename, pagemsg):
         accented_cache[pagename] = None
       return False, None
   else:
-    cached = False
-    page = pywikibot.Page(site, pagename)
-    try:
-      if not page.exists():
-        if semi_verbose:
-          pagemsg("lookup_heads_and_inflections: Page %s doesn't exist" % pagename)
+    index = get_head_index()
+    if index is not None and not index.is_overlaid(pagename):
+      cacheval, yoful_page = index.lookup(pagename)
+      if cacheval is None and semi_verbose:
+        pagemsg("lookup_heads_and_inflections: Page %s not in head index" % pagename)
+    else:
+      page = pywikibot.Page(site, pagename)
+      try:
+        if not page.exists():
+          if semi_verbose:
+            pagemsg("lookup_heads_and_inflections: Page %s doesn't exist" % pagename)
+          if not global_disable_cache:
+            accented_cache[pagename] = None
+          return False, None
+      except Exception as e:
+        pagemsg("WARNING: lookup_heads_and_inflections: Error checking page existence: %s" % str(e))
         if not global_disable_cache:
           accented_cache[pagename] = None
         return False, None
-    except Exception as e:
-      pagemsg("WARNING: lookup_heads_and_inflections: Error checking page existence: %s" % str(e))
-      if not global_disable_cache:
-        accented_cache[pagename] = None
-      return False, None
+      cacheval, yoful_page = find_heads_and_inflections(pagename, str(page.text), pagemsg)
+
+    if yoful_page:
+      pagemsg("lookup_heads_and_inflections: Redirecting from %s to %s" %
+        (pagename, yoful_page))
+      return lookup_heads_and_inflections(yoful_page, pagemsg)
 
-    # Page exists, is it a redirect?
-    if re.match("#redirect", page.text, re.I):
-      if not global_disable_cache:
-        accented_cache[pagename] = "redirect"
-      pagemsg("lookup_heads_and_inflections: Page %s is redirect" % pagename)
-      return False, "redirect"
-
-    # Page exists and is not a redirect, find the info
-    heads = set()
-    inflections_of = set()
-    adj_forms = set()
-
-    foundrussian = False
-    sections = re.split("(^==[^=]*==\n)", str(page.text), 0, re.M)
-
-    for j in range(2, len(sections), 2):
-      if sections[j-1] == "==Russian==\n":
-        if foundrussian:
-          pagemsg("WARNING: lookup_heads_and_inflections: Found multiple Russian sections")
-          break
-        foundrussian = True
-
-        subsections = re.split("(^===+[^=\n]+===+\n)", sections[j], 0, re.M)
-        for k in range(2, len(subsections), 2):
-          parsed = blib.parse_text(subsections[k])
-          this_heads = set()
-          def add(val, tr, is_lemma):
-            val_to_add = blib.remove_links(val)
-            # Remove monosyllabic accents to correctly handle the case of
-            # рад, which has some heads with an accent and some without.
-            val_to_add, tr = remove_monosyllabic_accents(val_to_add, tr)
-            this_heads.add((val_to_add, tr, is_lemma))
-          for t in parsed.filter_templates():
-            tname = str(t.name)
-            check_addl_heads = False
-            if tname in ru_head_templates:
-              is_lemma = tname in ru_lemma_templates
-              check_addl_heads = True
-              if getparam(t, "1"):
-                add(getparam(t, "1"), getparam(t, "tr"), is_lemma)
-              elif getparam(t, "head"):
-                add(getparam(t, "head"), getparam(t, "tr"), is_lemma)
-              else:
-                add(pagename, "", is_lemma)
-            elif tname == "head" and getparam(t, "1") == "ru":
-              is_lemma = getparam(t, "2") in ru_lemma_poses
-              check_addl_heads = True
-              if getparam(t, "head"):
-                add(getparam(t, "head"), getparam(t, "tr"), is_lemma)
-              else:
-                add(pagename, "", is_lemma)
-            elif tname in ["ru-noun+", "ru-proper noun+"]:
-              is_lemma = True
-              lemma = rulib.fetch_noun_lemma(t, expand_text)
-              lemmas = re.split(",", lemma)
-              lemmas = [split_ru_tr(lemma, pagemsg) for lemma in lemmas]
-              # Group lemmas by Russian, to group multiple translits
-              lemmas = rulib.group_translits(lemmas, pagemsg, semi_verbose)
-              for val, tr in lemmas:
-                add(val, tr, is_lemma)
-            elif (tname == "ru-participle of" or
-                tname in inflection_templates and getparam(t, "lang") == "ru"):
-              inflections_of.add((frozenset(this_heads),
-                normalize_text(getparam(t, "1"))))
-            if check_addl_heads:
-              for i in range(2, 10):
-                headn = getparam(t, "head" + str(i))
-                if headn:
-                  add(headn, getparam(t, "tr" + str(i)), is_lemma)
-            elif tname == "ru-decl-adj":
-              result = expand_text(re.sub(r"^\{\{ru-decl-adj", "{{ru-generate-adj-forms", str(t)))
-              if not result:
-                pagemsg("WARNING: lookup_heads_and_inflections: Error expanding template %s, page %s" %
-                  (str(t), pagename))
-              else:
-                args = blib.split_generate_args(result)
-                for value in args.itervalues():
-                  adj_forms.add(value)
-          heads.update(this_heads)
-
-    # Page exists, is it a redirect?
-    if not foundrussian:
-      if not global_disable_cache:
-        accented_cache[pagename] = "no-russian"
-      pagemsg("lookup_heads_and_inflections: Page %s has no Russian section" % pagename)
-      return False, "no-russian"
-
-    saw_lemma = any(is_lemma for ru, tr, is_lemma in heads)
-    if not saw_lemma and not inflections_of:
-      # If no lemmas or inflections found, check for alt-ё templates.
-      # If the term is a non-ё variant of a single term with ё, look up
-      # and return the heads and inflections on that page.
-      parsed = blib.parse_text(str(page.text))
-      yo_pages = set()
-      for t in parsed.filter_templates():
-        if str(t.name) in alt_yo_templates:
-          yo_pages.add(getparam(t, "1"))
-      if len(yo_pages) > 1:
-        pagemsg("WARNING: lookup_heads_and_inflections: Found multiple alt-ё templates for different lemmas: %s" %
-          ",".join(yo_pages))
-      elif len(yo_pages) == 0:
-        pagemsg("WARNING: lookup_heads_and_inflections: Found no lemmas or inflections of lemmas for %s" % pagename)
-      else:
-        yoful_page = list(yo_pages)[0]
-        pagemsg("lookup_heads_and_inflections: Redirecting from %s to %s" %
-          (pagename, yoful_page))
-        return lookup_heads_and_inflections(yoful_page, pagemsg)
-
-    cacheval = (heads, inflections_of, adj_forms)
     if not global_disable_cache:
       accented_cache[pagename] = cacheval
     return False, cacheval
+
+# Find the heads and inflections on page `pagename` with text `text`. Return a
+# tuple (INFO, YOFUL_PAGE), where INFO is "redirect" (page is a redirect),
+# "no-russian" (page has no Russian section) or a tuple
+# (HEADS, INFLECTIONS_OF, ADJ_FORMS) as described above
+# lookup_heads_and_inflections(), and YOFUL_PAGE is None unless the page has no
+# lemmas or inflections of lemmas but is the non-ё variant of a single term
+# with ё, in which case YOFUL_PAGE is that term and the caller should look up
+# its page instead.
+def find_heads_and_inflections(pagename, text, pagemsg):
+  # Use our own expand_text() rather than passing it from the caller,
+  # which may have a different value for PAGENAME; the proper value is
+  # important in expanding certain templates e.g. ru-generate-adj-forms.
+  def expand_text(tempcall):
+    return blib.expand_text(tempcall, pagename, pagemsg, semi_verbose)
+
+  # Page exists, is it a redirect?
+  if re.match("#redirect", text, re.I):
+    pagemsg("lookup_heads_and_inflections: Page %s is redirect" % pagename)
+    return "redirect", None
+
+  # Page exists and is not a redirect, find the info
+  heads = set()
+  inflections_of = set()
+  adj_forms = set()
+
+  foundrussian = False
+  sections = re.split("(^==[^=]*==\n)", text, 0, re.M)
+
+  for j in range(2, len(sections), 2):
+    if sections[j-1] == "==Russian==\n":
+      if foundrussian:
+        pagemsg("WARNING: lookup_heads_and_inflections: Found multiple Russian sections")
+        break
+      foundrussian = True
+
+      subsections = re.split("(^===+[^=\n]+===+\n)", sections[j], 0, re.M)
+      for k in range(2, len(subsections), 2):
+        parsed = blib.parse_text(subsections[k])
+        this_heads = set()
+        def add(val, tr, is_lemma):
+          val_to_add = blib.remove_links(val)
+          # Remove monosyllabic accents to correctly handle the case of
+          # рад, which has some heads with an accent and some without.
+          val_to_add, tr = remove_monosyllabic_accents(val_to_add, tr)
+          this_heads.add((val_to_add, tr, is_lemma))
+        for t in parsed.filter_templates():
+          tname = str(t.name)
+          check_addl_heads = False
+          if tname in ru_head_templates:
+            is_lemma = tname in ru_lemma_templates
+            check_addl_heads = True
+            if getparam(t, "1"):
+              add(getparam(t, "1"), getparam(t, "tr"), is_lemma)
+            elif getparam(t, "head"):
+              add(getparam(t, "head"), getparam(t, "tr"), is_lemma)
+            else:
+              add(pagename, "", is_lemma)
+          elif tname == "head" and getparam(t, "1") == "ru":
+            is_lemma = getparam(t, "2") in ru_lemma_poses
+            check_addl_heads = True
+            if getparam(t, "head"):
+              add(getparam(t, "head"), getparam(t, "tr"), is_lemma)
+            else:
+              add(pagename, "", is_lemma)
+          elif tname in ["ru-noun+", "ru-proper noun+"]:
+            is_lemma = True
+            lemma = rulib.fetch_noun_lemma(t, expand_text)
+            lemmas = re.split(",", lemma)
+            lemmas = [split_ru_tr(lemma, pagemsg) for lemma in lemmas]
+            # Group lemmas by Russian, to group multiple translits
+            lemmas = rulib.group_translits(lemmas, pagemsg, semi_verbose)
+            for val, tr in lemmas:
+              add(val, tr, is_lemma)
+          elif (tname == "ru-participle of" or
+              tname in inflection_templates and getparam(t, "lang") == "ru"):
+            inflections_of.add((frozenset(this_heads),
+              normalize_text(getparam(t, "1"))))
+          if check_addl_heads:
+            for i in range(2, 10):
+              headn = getparam(t, "head" + str(i))
+              if headn:
+                add(headn, getparam(t, "tr" + str(i)), is_lemma)
+          elif tname == "ru-decl-adj":
+            result = expand_text(re.sub(r"^\{\{ru-decl-adj", "{{ru-generate-adj-forms", str(t)))
+            if not result:
+              pagemsg("WARNING: lookup_heads_and_inflections: Error expanding template %s, page %s" %
+                (str(t), pagename))
+            else:
+              args = blib.split_generate_args(result)
+              for value in args.values():
+                adj_forms.add(value)
+        heads.update(this_heads)
+
+  if not foundrussian:
+    pagemsg("lookup_heads_and_inflections: Page %s has no Russian section" % pagename)
+    return "no-russian", None
+
+  saw_lemma = any(is_lemma for ru, tr, is_lemma in heads)
+  if not saw_lemma and not inflections_of:
+    # If no lemmas or inflections found, check for alt-ё templates.
+    # If the term is a non-ё variant of a single term with ё, look up
+    # and return the heads and inflections on that page.
+    parsed = blib.parse_text(text)
+    yo_pages = set()
+    for t in parsed.filter_templates():
+      if str(t.name) in alt_yo_templates:
+        yo_pages.add(getparam(t, "1"))
+    if len(yo_pages) > 1:
+      pagemsg("WARNING: lookup_heads_and_inflections: Found multiple alt-ё templates for different lemmas: %s" %
+        ",".join(yo_pages))
+    elif len(yo_pages) == 0:
+      pagemsg("WARNING: lookup_heads_and_inflections: Found no lemmas or inflections of lemmas for %s" % pagename)
+    else:
+      return (heads, inflections_of, adj_forms), list(yo_pages)[0]
+
+  return (heads, inflections_of, adj_forms), None
+
+# Return the head index specified using `head_index_file`, or None.
+def get_head_index():
+  global head_index
+  if head_index is None and head_index_file:
+    head_index = RuHeadIndex(head_index_file)
+    if head_index_overlay:
+      head_index.load_overlay()
+  return head_index
+
+# Persistent index of the information returned by find_heads_and_inflections()
+# for the pages in a dump, stored in SQLite. Only pages with a Russian section
+# and redirects with Cyrillic titles are stored; other pages are looked up as
+# if they don't exist, which callers treat the same as "no-russian".
+class RuHeadIndex(object):
+  def __init__(self, filename):
+    self.filename = filename
+    self.conn = sqlite3.connect(filename)
+    self.conn.execute("CREATE TABLE IF NOT EXISTS pages (title TEXT PRIMARY KEY, info TEXT) WITHOUT ROWID")
+    self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    self.overlay = set()
+
+  def get_meta(self, key):
+    row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+  def set_meta(self, key, value):
+    self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+  def add(self, pagename, info, yoful_page):
+    if isinstance(info, str):
+      encoded = json.dumps(info)
+    else:
+      heads, inflections_of, adj_forms = info
+      encoded = json.dumps([sorted(list(head) for head in heads),
+        sorted([sorted(list(head) for head in inflheads), lemma] for inflheads, lemma in inflections_of),
+        sorted(adj_forms), yoful_page], ensure_ascii=False)
+    self.conn.execute("INSERT OR REPLACE INTO pages (title, info) VALUES (?, ?)", (pagename, encoded))
+
+  def commit(self):
+    self.conn.commit()
+
+  # Return (INFO, YOFUL_PAGE) as for find_heads_and_inflections(), or
+  # (None, None) if the page isn't in the index.
+  def lookup(self, pagename):
+    row = self.conn.execute("SELECT info FROM pages WHERE title = ?", (pagename,)).fetchone()
+    if not row:
+      return None, None
+    info = json.loads(row[0])
+    if isinstance(info, str):
+      return info, None
+    heads, inflections_of, adj_forms, yoful_page = info
+    return ({tuple(head) for head in heads},
+      {(frozenset(tuple(head) for head in inflheads), lemma) for inflheads, lemma in inflections_of},
+      set(adj_forms)), yoful_page
+
+  # Fetch the titles of the pages changed since `since` (a timestamp such as
+  # 2024-01-01T00:00:00Z, by default the dump date recorded when building the
+  # index), which are then looked up live rather than in the index. Recent
+  # changes only go back 30 days, so for older dumps the index should be
+  # rebuilt instead.
+  def load_overlay(self, since=None):
+    since = since or self.get_meta("dump_date")
+    if not since:
+      raise ValueError("No dump date recorded in head index %s, can't determine pages changed since the dump" %
+        self.filename)
+    for change in site.recentchanges(end=since, namespaces=[0]):
+      if "title" in change:
+        self.overlay.add(change["title"])
+    msg("Found %s pages changed since %s, looking them up live" % (len(self.overlay), since))
+
+  def is_overlaid(self, pagename):
+    return pagename in self.overlay
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Run a bot script in parallel over a range of page indices. Unlike make_parallel_run.py, which generates a shell
+# script that splits the range into a fixed number of parts, the range is split into small chunks that are handed out
+# to the worker processes as they become free, so that slow parts of the range don't hold up the whole run. A chunk
+# whose command fails is retried. The output of each chunk goes to a separate file while the run is in progress; at the
+# end, the chunk files are merged in index order into a single log PREFIX.out, with the per-chunk progress lines
+# removed, and the chunk files are deleted (unless some chunks failed). Aggregate throughput and the estimated time
+# remaining are displayed after each chunk finishes.
+#
+# NOTE: Chunks are started at different times, so if the command takes its pages from a category or list of
+# references, saving pages may change the pages listed and hence the pages corresponding to a given index. In that
+# case, use --overlap or (better) have the command take its pages from a fixed source such as a page file.
+
+import argparse, os, queue, re, subprocess, sys, threading, time
+
+parser = argparse.ArgumentParser(description="Run a bot script in parallel over a range of page indices.")
+parser.add_argument('--command', help="Command to run. %%START and %%END are replaced with the chunk's index range (appended if not present) and %%SAVE with --save unless --no-save is given (appended if not present).", required=True)
+parser.add_argument('--output-prefix', help="Prefix for output files.", required=True)
+parser.add_argument('--num-terms', help="Approximate number of terms that will be run on.", type=int, required=True)
+parser.add_argument('--start', help="Index of first term to run on (default %(default)s).", type=int, default=1)
+parser.add_argument('--num-workers', help="Number of commands to run at once (default %(default)s).", type=int, default=10)
+parser.add_argument('--chunk-size', help="Number of terms in each chunk (default %(default)s).", type=int, default=200)
+parser.add_argument('--overlap', help="Number of terms that each chunk will overlap with the next chunk (default %(default)s).", type=int, default=0)
+parser.add_argument('--retries', help="Number of times to retry a failed chunk (default %(default)s).", type=int, default=2)
+parser.add_argument('--no-save', help="Don't add --save to the commands.", action="store_true")
+parser.add_argument('--keep-chunk-files', help="Don't delete the per-chunk output files after merging them.", action="store_true")
+args = parser.parse_args()
+
+command = args.command
+if "%SAVE" not in command:
+  command += " %SAVE"
+if "%START" not in command:
+  command += " %START %END"
+command = command.replace("%SAVE", "" if args.no_save else "--save")
+
+last_index = args.start + args.num_terms - 1
+chunks = []
+for first_index in range(args.start, last_index + 1, args.chunk_size):
+  chunks.append((first_index, min(first_index + args.chunk_size - 1 + args.overlap, last_index)))
+chunk_width = len(str(len(chunks)))
+
+def chunk_filename(chunkno):
+  first_index, last_index = chunks[chunkno]
+  return "%s.out.%s.%s-%s" % (args.output_prefix, ("%%0%dd" % chunk_width) % (chunkno + 1), first_index, last_index)
+
+def format_time(secs):
+  secs = int(secs + 0.5)
+  return "%d:%02d:%02d" % (secs // 3600, secs % 3600 // 60, secs % 60)
+
+work_queue = queue.Queue()
+for chunkno in range(len(chunks)):
+  work_queue.put((chunkno, 1))
+lock = threading.Lock()
+starttime = time.time()
+num_terms_done = 0
+num_chunks_done = 0
+failed_chunks = []
+
+def msg(text):
+  with lock:
+    print(text)
+    sys.stdout.flush()
+
+def run_worker():
+  global num_terms_done, num_chunks_done
+  while True:
+    try:
+      chunkno, attempt = work_queue.get_nowait()
+    except queue.Empty:
+      return
+    first_index, last_index = chunks[chunkno]
+    chunk_command = command.replace("%START", str(first_index)).replace("%END", str(last_index))
+    with open(chunk_filename(chunkno), "w") as outfp:
+      retcode = subprocess.call(chunk_command, shell=True, stdout=outfp, stderr=subprocess.STDOUT)
+    if retcode != 0:
+      if attempt <= args.retries:
+        msg("WARNING: Chunk %s-%s failed with exit code %s on attempt %s, retrying" % (
+          first_index, last_index, retcode, attempt))
+        work_queue.put((chunkno, attempt + 1))
+      else:
+        msg("WARNING: Chunk %s-%s failed with exit code %s on attempt %s, giving up" % (
+          first_index, last_index, retcode, attempt))
+        with lock:
+          failed_chunks.append(chunkno)
+      continue
+    with lock:
+      num_chunks_done += 1
+      num_terms_done += min(first_index + args.chunk_size - 1, last_index) - first_index + 1
+      elapsed = time.time() - starttime
+      rate = num_terms_done / elapsed if elapsed > 0 else 0
+      eta = (args.num_terms - num_terms_done) / rate if rate > 0 else 0
+      print("Chunk %s-%s done: %s/%s chunks, %s/%s terms, %.2f terms/sec, elapsed %s, est. %s left" % (
+        first_index, last_index, num_chunks_done, len(chunks), num_terms_done, args.num_terms, rate,
+        format_time(elapsed), format_time(eta)))
+      sys.stdout.flush()
+
+workers = [threading.Thread(target=run_worker) for _ in range(min(args.num_workers, len(chunks)))]
+for worker in workers:
+  worker.start()
+for worker in workers:
+  worker.join()
+
+# Merge the chunk files, omitting the progress lines output by blib.iter_items(), which refer only to the chunk.
+progress_line_re = re.compile(r"^[0-9]+/([0-9]+|None)(, est\. .* left)?$")
+with open("%s.out" % args.output_prefix, "w") as outfp:
+  for chunkno in range(len(chunks)):
+    filename = chunk_filename(chunkno)
+    if not os.path.exists(filename):
+      continue
+    with open(filename, "r", errors="replace") as infp:
+      for line in infp:
+        if not progress_line_re.search(line.rstrip("\n")):
+          outfp.write(line)
+    if not failed_chunks and not args.keep_chunk_files:
+      os.remove(filename)
+
+if failed_chunks:
+  msg("WARNING: %s chunks failed, keeping chunk files: %s" % (len(failed_chunks),
+    ", ".join("%s-%s" % chunks[chunkno] for chunkno in sorted(failed_chunks))))
+msg("Ran %s terms in %s chunks in %s; merged output is in %s.out" % (num_terms_done, len(chunks),
+  format_time(time.time() - starttime), args.output_prefix))
+if failed_chunks:
+  sys.exit(1)
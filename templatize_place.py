@@ -159,6 +159,27 @@ from blib import getparam, rmparam, tname, pname, msg, site
 
 blib.getData()
 
+# Return a regex matching any of the literal strings in STRINGS. The regex is built from a trie of the strings, so
+# that at each position the regex engine follows a single path through the trie rather than trying every string in
+# turn. As with an alternation of the strings sorted by decreasing length, longer strings are tried before their
+# prefixes.
+def literal_alternation_regex(strings):
+  trie = {}
+  for string in strings:
+    node = trie
+    for ch in string:
+      node = node.setdefault(ch, {})
+    node[""] = True
+  def trie_to_regex(node):
+    branches = [re.escape(ch) + trie_to_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+      return ""
+    regex = branches[0] if len(branches) == 1 else "(?:%s)" % "|".join(branches)
+    if "" in node:
+      return "(?:%s)?" % regex
+    return regex
+  return trie_to_regex(trie)
+
 place_qualifiers = [
   "small",
   "large",
@@ -197,6 +218,7 @@ aliased_place_qualifiers = {
 place_qualifiers_with_aliases = {x: x for x in place_qualifiers}
 place_qualifiers_with_aliases.update(aliased_place_qualifiers)
 place_qualifiers_with_aliases_list = sorted(place_qualifiers_with_aliases.keys(), key=lambda x:-len(x))
+place_qualifier_re = re.compile("^(%s) +(.*)$" % literal_alternation_regex(place_qualifiers_with_aliases_list))
 
 place_types = [
   # city
@@ -410,6 +432,8 @@ aliased_place_types = {
 place_types_with_aliases = {x: x for x in place_types}
 place_types_with_aliases.update(aliased_place_types)
 place_types_with_aliases_list = sorted(place_types_with_aliases.keys(), key=lambda x:-len(x))
+# Matches any line containing a known place type.
+place_type_line_re = re.compile("^.*(%s).*$" % literal_alternation_regex(place_types_with_aliases_list), re.M)
 
 place_types_to_codes = {
   "archipelago": "arch",
@@ -572,6 +596,10 @@ first_only_compass_points = {
 compass_points_with_aliases = {x: x for x in compass_points}
 compass_points_with_aliases.update(dict(aliased_compass_points))
 compass_points_with_aliases_list = sorted(compass_points_with_aliases.keys(), key=lambda x:-len(x))
+compass_point_regex = literal_alternation_regex(compass_points_with_aliases_list)
+# Matches "island off the coast", "port city on the west coast", etc.
+coast_re = re.compile("^(.*?),? +(?:situated +|located +)?(off|on) +the +(?:(%s) +)?coast$" % compass_point_regex)
+compass_point_holonym_re = re.compile("^(%s) +(?:the +)?(.*)$" % compass_point_regex)
 
 compass_points_before_coast = {
   "northern": "north",
@@ -1742,8 +1770,8 @@ def output_stats(num_counts):
 
 # Compute the list of all uppercase Unicode characters, see
 # https://stackoverflow.com/questions/36187349/python-regex-for-unicode-capitalized-words
-pLu = u'[{}]'.format("".join([unichr(i) for i in range(sys.maxunicode) if unichr(i).isupper()]))
-proper_noun_word_regex = r"(?u)%s[\w'.-]*" % pLu
+pLu = u'[{}]'.format("".join([chr(i) for i in range(sys.maxunicode) if chr(i).isupper()]))
+proper_noun_word_regex = r"%s[\w'.-]*" % pLu
 # The following regex requires that the first word of a county/parish/borough name be capitalized
 # and contain only letters, hyphens (Stratford-on-Avon), apostrophes (King's Lynn) and periods
 # (St. Louis), and remaining words must either be of the same format or be "and" (Tyne and Wear,
@@ -1757,187 +1785,204 @@ proper_noun_word_regex = r"(?u)%s[\w'.-]*" % pLu
 proper_noun_regex = "(?:%s)(?: +(?:%s|and|and the|of|of the|upon|de|du|del|la|am|in der|an der|es|op))*" % (
   proper_noun_word_regex, proper_noun_word_regex)
 
-def inner_parse_holonym(holonym, all_holonyms):
+# Match a capital, official name or county/parish/borough seat spec at the end of a line, in the format
+# "with the capital in Foo" or similar.
+cap_official_after_re = re.compile(r"^(.*[^,.;: ])(?:[,.;:] *(?:[Ww]ith +)?|[,.;:]? *[Ww]ith +)(?:[Tt]he +|[Ii]t'?s +)?([Cc]apital|[Oo]fficial [Nn]ame|[Cc]ounty [Ss]eat|[Pp]arish [Ss]eat|[Bb]orough [Ss]eat)(?: +[Ii]s(?: +in)?)?:? *(?:[Tt]he +)?(%s)(?<!\.) *((?:\)|\}\} *)?[,.;:]?) *$" % proper_noun_regex)
+# Same, in the format "with Foo as the capital" or similar.
+cap_official_before_re = re.compile(r"^(.*[^,.;: ])[,.;:]? *(?:(?:[Ww]hich|[Tt]hat) +[Hh]as +|[Ww]ith +|[Hh]aving +)(%s) +[Aa]s +(?:[Tt]he +|[Ii]t'?s +)?([Cc]apital|[Oo]fficial [Nn]ame|[Cc]ounty [Ss]eat|[Pp]arish [Ss]eat|[Bb]orough [Ss]eat) *((?:\)|\}\} *)?[,.;:]?) *$" % proper_noun_regex)
+translation_re = re.compile("^(?:the )?%s$" % proper_noun_regex)
+
+# Rules for parsing a holonym, in order of precedence. A rule is either a pair (TABLE, MAKE_HOLONYM), which recognizes
+# the holonyms in TABLE and calls MAKE_HOLONYM on the holonym to get the parsed holonym, or a function called with the
+# holonym and the list of all holonyms in the line, which returns the parsed holonym or None. Table rules are merged
+# into the single dictionary `holonym_gazetteer` below, so inner_parse_holonym() only needs to try the function rules
+# that take precedence over the table the holonym is found in.
+
+# Rule that strips REGEX from the holonym and looks the result up in TABLE.
+def normalized_holonym_rule(regex, table, make_holonym):
+  regex = re.compile(regex)
+  def rule(holonym, all_holonyms):
+    normalized_holonym = regex.sub("", holonym)
+    if normalized_holonym in table:
+      return make_holonym(normalized_holonym)
+    return None
+  return rule
+
+# Rule that matches REGEX against the holonym and calls MAKE_HOLONYM on the match object and the list of all
+# holonyms if it matches.
+def regex_holonym_rule(regex, make_holonym):
+  regex = re.compile(regex)
+  def rule(holonym, all_holonyms):
+    m = regex.search(holonym)
+    if m:
+      return make_holonym(m, all_holonyms)
+    return None
+  return rule
+
+def london_borough_holonym(m, all_holonyms):
+  if "Greater London" in all_holonyms:
+    return "lbor/%s" % m.group(1)
+  else:
+    return ["lbor/%s" % m.group(1), "co/Greater London"]
+
+def italian_province_holonym(m, all_holonyms):
+  if m.group(2) in italian_regions:
+    return ["p/%s" % m.group(1), "%s/%s" % (italian_regions[m.group(2)], m.group(2))]
+  return None
+
+def ancient_mentioned_region_holonym(m, all_holonyms):
+  normalized_holonym, mentioned_by = m.groups()
+  if normalized_holonym in ancient_mentioned_regions_with_aliases:
+    return ["r/%s" % ancient_mentioned_regions_with_aliases[normalized_holonym], mentioned_by]
+  return None
+
+placetype_suffixes_to_codes = {"County": "co", "Parish": "par", "Borough": "bor", "Township": "twp", "State": "s",
+  "Province": "p", "Oblast": "obl", "Voivodeship": "voi", "Department": "dept", "Autonomous Region": "ar",
+  "Region": "r", "Peninsula": "pen", "Ocean": "ocean", "Sea": "sea", "Island": "isl",
+  "River": "riv",
+}
+
+def subdivision_holonym(m, all_holonyms):
+  subdiv, subdiv_type, div = m.groups()
+  div_holonym = parse_holonym(div, all_holonyms)
+  if div_holonym:
+    if type(div_holonym) is not list:
+      div_holonym = [div_holonym]
+    return ["%s/%s" % (place_types_to_codes[subdiv_type], subdiv)] + div_holonym
+  return None
+
+coded_place_type_regex = literal_alternation_regex(place_types_to_codes.keys())
+
+holonym_rules = [
   # US etc. Do '... Island' later because of 'Prince Edward Island' (should be province not island).
-  if holonym in us_states:
-    # Do states before countries because of Georgia.
-    return "s/" + holonym
-  normalized_holonym = re.sub(" [Ss]tate$", "", holonym)
-  if normalized_holonym in us_states:
-    return "s/" + normalized_holonym
-  normalized_holonym = re.sub(r"^(US|U\.S\. +)?state of ", "", holonym)
-  if normalized_holonym in us_states:
-    return "s/" + normalized_holonym
+  # Do states before countries because of Georgia.
+  (us_states, lambda holonym: "s/" + holonym),
+  normalized_holonym_rule(" [Ss]tate$", us_states, lambda holonym: "s/" + holonym),
+  normalized_holonym_rule(r"^(US|U\.S\. +)?state of ", us_states, lambda holonym: "s/" + holonym),
   # UK
-  if holonym in uk_constituents:
-    return "%s/%s" % (uk_constituents[holonym], holonym)
-  if holonym in english_counties:
-    return "co/" + holonym
-  if holonym in northern_ireland_counties:
-    return "co/" + holonym
-  normalized_holonym = re.sub("^[Cc]ounty +", "", holonym)
-  if normalized_holonym in northern_ireland_counties:
-    return "co/" + normalized_holonym
-  if holonym in scotland_council_areas:
-    return "council area/" + holonym
-  normalized_holonym = re.sub(" [Cc]ouncil +[Aa]rea$", "", holonym)
-  if normalized_holonym in scotland_council_areas:
-    return "council area/" + normalized_holonym
-  normalized_holonym = re.sub(" [Cc]ouncil +[Aa]rea +of +Scotland$", "", holonym)
-  if normalized_holonym in scotland_council_areas:
-    return ["council area/" + normalized_holonym, "cc/Scotland"]
-  if holonym in welsh_counties_etc:
-    return "%s/%s" % (welsh_counties_etc[holonym], holonym)
+  (uk_constituents, lambda holonym: "%s/%s" % (uk_constituents[holonym], holonym)),
+  (english_counties, lambda holonym: "co/" + holonym),
+  (northern_ireland_counties, lambda holonym: "co/" + holonym),
+  normalized_holonym_rule("^[Cc]ounty +", northern_ireland_counties, lambda holonym: "co/" + holonym),
+  (scotland_council_areas, lambda holonym: "council area/" + holonym),
+  normalized_holonym_rule(" [Cc]ouncil +[Aa]rea$", scotland_council_areas,
+    lambda holonym: "council area/" + holonym),
+  normalized_holonym_rule(" [Cc]ouncil +[Aa]rea +of +Scotland$", scotland_council_areas,
+    lambda holonym: ["council area/" + holonym, "cc/Scotland"]),
+  (welsh_counties_etc, lambda holonym: "%s/%s" % (welsh_counties_etc[holonym], holonym)),
   # Borough of Ealing, Borough of Slough, Borough of Tower Hamlets, Borough of Hinckley and Bosworth,
   # borough of Chesterfield, borough of North Tyneside, etc.
-  m = re.search("^[Bb]orough +of +(%s)$" % proper_noun_regex, holonym)
-  if m:
-    return "bor/%s" % m.group(1)
-  m = re.search("^[Mm]etropolitan +[Bb]orough +of +(%s)$" % proper_noun_regex, holonym)
-  if m:
-    return "metbor/%s" % m.group(1)
+  regex_holonym_rule("^[Bb]orough +of +(%s)$" % proper_noun_regex,
+    lambda m, all_holonyms: "bor/%s" % m.group(1)),
+  regex_holonym_rule("^[Mm]etropolitan +[Bb]orough +of +(%s)$" % proper_noun_regex,
+    lambda m, all_holonyms: "metbor/%s" % m.group(1)),
   # London Borough of Ealing, London Borough of Hammersmith and Fulham, etc.
-  m = re.search("^[Ll]ondon +[Bb]orough +of +(%s)$" % proper_noun_regex, holonym)
-  if m:
-    if "Greater London" in all_holonyms:
-      return "lbor/%s" % m.group(1)
-    else:
-      return ["lbor/%s" % m.group(1), "co/Greater London"]
+  regex_holonym_rule("^[Ll]ondon +[Bb]orough +of +(%s)$" % proper_noun_regex, london_borough_holonym),
   # city of Manchester, city of Sydney, city of Fremont (California), city of Thunder Bay (Ontario), etc.
   # NOTE: capitalized City can refer to other things, e.g. City of Melville (local government area)
-  m = re.search("^city +of +(%s)$" % proper_noun_regex, holonym)
-  if m:
-    return "city/%s" % m.group(1)
+  regex_holonym_rule("^city +of +(%s)$" % proper_noun_regex, lambda m, all_holonyms: "city/%s" % m.group(1)),
   # countries
-  if holonym in countries_with_aliases:
-    return "c/" + countries_with_aliases[holonym]
+  (countries_with_aliases, lambda holonym: "c/" + countries_with_aliases[holonym]),
   # continents
-  if holonym in continents:
-    return "cont/" + holonym
+  (continents, lambda holonym: "cont/" + holonym),
   # regions
-  if holonym in regions_with_aliases:
-    return "r/" + regions_with_aliases[holonym]
+  (regions_with_aliases, lambda holonym: "r/" + regions_with_aliases[holonym]),
   # Australia
-  if holonym in australian_states_and_territories:
-    return "%s/%s" % (australian_states_and_territories[holonym], holonym)
+  (australian_states_and_territories,
+    lambda holonym: "%s/%s" % (australian_states_and_territories[holonym], holonym)),
   # Austria
-  if holonym in austrian_states:
-    return "s/%s" % holonym
+  (austrian_states, lambda holonym: "s/%s" % holonym),
   # Canada
-  if holonym in canadian_provinces_and_territories:
-    return "%s/%s" % (canadian_provinces_and_territories[holonym], holonym)
+  (canadian_provinces_and_territories,
+    lambda holonym: "%s/%s" % (canadian_provinces_and_territories[holonym], holonym)),
   # China
-  if holonym in chinese_provinces_and_autonomous_regions:
-    return "%s/%s" % (chinese_provinces_and_autonomous_regions[holonym], holonym)
-  normalized_holonym = re.sub(" +([Pp]rovince|[Aa]utonomous +[Rr]egion)$", "", holonym)
-  if normalized_holonym in chinese_provinces_and_autonomous_regions:
-    return "%s/%s" % (chinese_provinces_and_autonomous_regions[normalized_holonym], normalized_holonym)
+  (chinese_provinces_and_autonomous_regions,
+    lambda holonym: "%s/%s" % (chinese_provinces_and_autonomous_regions[holonym], holonym)),
+  normalized_holonym_rule(" +([Pp]rovince|[Aa]utonomous +[Rr]egion)$", chinese_provinces_and_autonomous_regions,
+    lambda holonym: "%s/%s" % (chinese_provinces_and_autonomous_regions[holonym], holonym)),
   # Finland
-  if holonym in finnish_regions_with_aliases:
-    return "r/" + finnish_regions_with_aliases[holonym]
-  normalized_holonym = re.sub("^region +of +", "", holonym)
-  if normalized_holonym in finnish_regions_with_aliases:
-    return "r/" + finnish_regions_with_aliases[normalized_holonym]
+  (finnish_regions_with_aliases, lambda holonym: "r/" + finnish_regions_with_aliases[holonym]),
+  normalized_holonym_rule("^region +of +", finnish_regions_with_aliases,
+    lambda holonym: "r/" + finnish_regions_with_aliases[holonym]),
   # France
-  if m:
-    return "dept/%s" % m.group(1)
-  m = re.search("^(%s) +(?:department|département) +of +France$" % proper_noun_regex, holonym)
-  if m:
-    return ["dept/%s" % m.group(1), "c/France"]
+  regex_holonym_rule("^(%s) +(?:department|département) +of +France$" % proper_noun_regex,
+    lambda m, all_holonyms: ["dept/%s" % m.group(1), "c/France"]),
   # Germany
-  if holonym in german_states_with_aliases:
-    return "s/%s" % german_states_with_aliases[holonym]
+  (german_states_with_aliases, lambda holonym: "s/%s" % german_states_with_aliases[holonym]),
   # India
-  if holonym in indian_states_and_union_territories:
-    return "%s/%s" % (indian_states_and_union_territories[holonym], holonym)
-  normalized_holonym = re.sub("^(Indian +)?state +of +", "", holonym)
-  if normalized_holonym in indian_states_and_union_territories:
-    return "%s/%s" % (indian_states_and_union_territories[normalized_holonym], normalized_holonym)
+  (indian_states_and_union_territories,
+    lambda holonym: "%s/%s" % (indian_states_and_union_territories[holonym], holonym)),
+  normalized_holonym_rule("^(Indian +)?state +of +", indian_states_and_union_territories,
+    lambda holonym: "%s/%s" % (indian_states_and_union_territories[holonym], holonym)),
   # Ireland
-  if holonym in irish_counties:
-    return "co/" + holonym
-  normalized_holonym = re.sub("^[Cc]ounty +", "", holonym)
-  if normalized_holonym in irish_counties:
-    return "co/" + normalized_holonym
+  (irish_counties, lambda holonym: "co/" + holonym),
+  normalized_holonym_rule("^[Cc]ounty +", irish_counties, lambda holonym: "co/" + holonym),
   # Italy
-  if holonym in italian_regions:
-    return "%s/%s" % (italian_regions[holonym], holonym)
+  (italian_regions, lambda holonym: "%s/%s" % (italian_regions[holonym], holonym)),
   # Check for "Perugia province of Umbria". Allow "the" before region name because of "the Veneto".
-  m = re.search("^(%s) +province +of +(?:the +)?(%s)$" % (proper_noun_regex, proper_noun_regex), holonym)
-  if m and m.group(2) in italian_regions:
-    return ["p/%s" % m.group(1), "%s/%s" % (italian_regions[m.group(2)], m.group(2))]
+  regex_holonym_rule("^(%s) +province +of +(?:the +)?(%s)$" % (proper_noun_regex, proper_noun_regex),
+    italian_province_holonym),
   # Japan
-  if holonym in japanese_prefectures:
-    return "pref/%s" % holonym
-  normalized_holonym = re.sub(" +([Pp]refecture)$", "", holonym)
-  if normalized_holonym in japanese_prefectures:
-    return "pref/%s" % normalized_holonym
+  (japanese_prefectures, lambda holonym: "pref/%s" % holonym),
+  normalized_holonym_rule(" +([Pp]refecture)$", japanese_prefectures, lambda holonym: "pref/%s" % holonym),
   # Norway
-  if holonym in norwegian_counties:
-    return "co/%s" % holonym
-  normalized_holonym = re.sub(" +county$", "", holonym)
-  if normalized_holonym in norwegian_counties:
-    return "co/%s" % normalized_holonym
+  (norwegian_counties, lambda holonym: "co/%s" % holonym),
+  normalized_holonym_rule(" +county$", norwegian_counties, lambda holonym: "co/%s" % holonym),
   # Philippines
-  if holonym in philippine_provinces:
-    return "p/%s" % holonym
+  (philippine_provinces, lambda holonym: "p/%s" % holonym),
   # Spain
-  if holonym in spanish_autonomous_communities:
-    return "acomm/%s" % holonym
+  (spanish_autonomous_communities, lambda holonym: "acomm/%s" % holonym),
   # Ancient Rome, etc.
-  if holonym in roman_provinces:
-    return "p/%s" % holonym
-  m = re.search("^(%s) (mentioned +by +.*)$" % proper_noun_regex, holonym)
-  if m:
-    normalized_holonym, mentioned_by = m.groups()
-    if normalized_holonym in ancient_mentioned_regions_with_aliases:
-      return ["r/%s" % ancient_mentioned_regions_with_aliases[normalized_holonym], mentioned_by]
+  (roman_provinces, lambda holonym: "p/%s" % holonym),
+  regex_holonym_rule("^(%s) (mentioned +by +.*)$" % proper_noun_regex, ancient_mentioned_region_holonym),
   # Misc places
-  if holonym in misc_places:
-    return "%s/%s" % (misc_places[holonym], holonym)
+  (misc_places, lambda holonym: "%s/%s" % (misc_places[holonym], holonym)),
   # Recognize "(the) Foo province" etc.
-  coded_place_type_regex = "|".join(re.escape(x) for x in place_types_to_codes.keys())
-  m = re.search("^(%s) (%s)$" % (proper_noun_regex, coded_place_type_regex), holonym)
-  if m:
-    bare_holonym, placetype = m.groups()
-    return "%s/%s" % (place_types_to_codes[placetype], bare_holonym)
+  regex_holonym_rule("^(%s) (%s)$" % (proper_noun_regex, coded_place_type_regex),
+    lambda m, all_holonyms: "%s/%s" % (place_types_to_codes[m.group(2)], m.group(1))),
   # Recognize "(the) province of Foo", "(the) province Foo", etc.
-  m = re.search("^(%s) +(?:of +)?(%s)$" % (coded_place_type_regex, proper_noun_regex), holonym)
-  if m:
-    placetype, bare_holonym = m.groups()
-    return "%s/%s" % (place_types_to_codes[placetype], bare_holonym)
+  regex_holonym_rule("^(%s) +(?:of +)?(%s)$" % (coded_place_type_regex, proper_noun_regex),
+    lambda m, all_holonyms: "%s/%s" % (place_types_to_codes[m.group(1)], m.group(2))),
   # Recognize holonyms with the placetype in the name itself, e.g.
   # 'Meadow Township', 'Chaffee County'.
-  m = re.search("^%s +(County|Parish|Borough|Township|State|Province|Oblast|Voivodeship|Department|Autonomous Region|Region|Peninsula|Ocean|Sea|Island|River)$" % proper_noun_regex, holonym)
-  if m:
-    placetype = {"County": "co", "Parish": "par", "Borough": "bor", "Township": "twp", "State": "s",
-      "Province": "p", "Oblast": "obl", "Voivodeship": "voi", "Department": "dept", "Autonomous Region": "ar",
-      "Region": "r", "Peninsula": "pen", "Ocean": "ocean", "Sea": "sea", "Island": "isl",
-      "River": "riv",
-    }[m.group(1)]
-    return "%s/%s" % (placetype, m.group(0))
+  regex_holonym_rule("^%s +(%s)$" % (proper_noun_regex, "|".join(placetype_suffixes_to_codes)),
+    lambda m, all_holonyms: "%s/%s" % (placetype_suffixes_to_codes[m.group(1)], m.group(0))),
   # Recognize 'Contra Costa and Alameda Counties' etc.
-  m = re.search("^(%s) +and +(%s) +Counties$" % (proper_noun_regex, proper_noun_regex), holonym)
-  if m:
-    county1, county2 = m.groups()
-    return ["co/%s County" % county1, "and", "co/%s County" % county2]
+  regex_holonym_rule("^(%s) +and +(%s) +Counties$" % (proper_noun_regex, proper_noun_regex),
+    lambda m, all_holonyms: ["co/%s County" % m.group(1), "and", "co/%s County" % m.group(2)]),
   # Recognize 'Ticino canton of Switzerland' etc. Note, we don't include 'state' because of things like
   # 'German state of Bremen', 'Brazilian state of Mato Grosso do Sul', 'US state of Alabama', etc.
   # There are also such things as 'Canadian province of Ontario' but they will be rejected by the
   # check for double provinces/countries/etc.
-  m = re.search("^(%s) +(district|region|canton|borough|province) +of +(?:the +)?(%s)$" % (proper_noun_regex, proper_noun_regex),
-    holonym)
-  if m:
-    subdiv, subdiv_type, div = m.groups()
-    div_holonym = parse_holonym(div, all_holonyms)
-    if div_holonym:
-      if type(div_holonym) is not list:
-        div_holonym = [div_holonym]
-      return ["%s/%s" % (place_types_to_codes[subdiv_type], subdiv)] + div_holonym
-  return None
+  regex_holonym_rule("^(%s) +(district|region|canton|borough|province) +of +(?:the +)?(%s)$" % (
+    proper_noun_regex, proper_noun_regex), subdivision_holonym),
+]
+
+# Map from each holonym in the tables in `holonym_rules` to a tuple (NUM_RULES, PARSED_HOLONYM), where NUM_RULES is
+# the number of function rules in `holonym_function_rules` that take precedence over the table.
+holonym_gazetteer = {}
+holonym_function_rules = []
+for rule in holonym_rules:
+  if type(rule) is tuple:
+    table, make_holonym = rule
+    for holonym in table:
+      if holonym not in holonym_gazetteer:
+        holonym_gazetteer[holonym] = (len(holonym_function_rules), make_holonym(holonym))
+  else:
+    holonym_function_rules.append(rule)
+
+def inner_parse_holonym(holonym, all_holonyms):
+  num_rules, parsed_holonym = holonym_gazetteer.get(holonym, (len(holonym_function_rules), None))
+  for i in range(num_rules):
+    retval = holonym_function_rules[i](holonym, all_holonyms)
+    if retval:
+      return retval
+  return parsed_holonym
+
+modern_holonym_re = re.compile("^(modern|modern-day) +(.*)$")
 
 def parse_holonym(holonym, all_holonyms):
-  m = re.search("^(modern|modern-day) +(.*)$", holonym)
+  m = modern_holonym_re.search(holonym)
   if m:
     modern, holonym = m.groups()
     holonym = inner_parse_holonym(holonym, all_holonyms)
@@ -2074,7 +2119,7 @@ def process_text_on_page(index, pagetitle, text):
         # from the right.
         while True:
           # Check for the format "with the capital in Foo" or similar.
-          m = re.search(r"^(.*[^,.;: ])(?:[,.;:] *(?:[Ww]ith +)?|[,.;:]? *[Ww]ith +)(?:[Tt]he +|[Ii]t'?s +)?([Cc]apital|[Oo]fficial [Nn]ame|[Cc]ounty [Ss]eat|[Pp]arish [Ss]eat|[Bb]orough [Ss]eat)(?: +[Ii]s(?: +in)?)?:? *(?:[Tt]he +)?(%s)(?<!\.) *((?:\)|\}\} *)?[,.;:]?) *$" % proper_noun_regex, chopped_line)
+          m = cap_official_after_re.search(chopped_line)
           if m:
             chopped_line, cap_official_type, cap_official_name, final_punct = m.groups()
             chopped_line += final_punct
@@ -2082,7 +2127,7 @@ def process_text_on_page(index, pagetitle, text):
             cap_officials.append((cap_official_param, cap_official_name))
           else:
             # Check for the format "with Foo as the capital" or similar.
-            m = re.search(r"^(.*[^,.;: ])[,.;:]? *(?:(?:[Ww]hich|[Tt]hat) +[Hh]as +|[Ww]ith +|[Hh]aving +)(%s) +[Aa]s +(?:[Tt]he +|[Ii]t'?s +)?([Cc]apital|[Oo]fficial [Nn]ame|[Cc]ounty [Ss]eat|[Pp]arish [Ss]eat|[Bb]orough [Ss]eat) *((?:\)|\}\} *)?[,.;:]?) *$" % proper_noun_regex, chopped_line)
+            m = cap_official_before_re.search(chopped_line)
             if m:
               chopped_line, cap_official_name, cap_official_type, final_punct = m.groups()
               chopped_line += final_punct
@@ -2140,7 +2185,7 @@ def process_text_on_page(index, pagetitle, text):
           break
         postq = remove_links_from_topics(postq)
         if trans:
-          if not re.search("^(?:the )?%s$" % proper_noun_regex, trans):
+          if not translation_re.search(trans):
             status = status or "unparsable"
             append_pagemsg("WARNING: Bad format for translation '%s'" % trans)
             break
@@ -2152,7 +2197,7 @@ def process_text_on_page(index, pagetitle, text):
         coast_spec = None
         for i, pt in enumerate(split_placetype):
           # Check for "island off the coast", "port city on the west coast", etc.
-          m = re.search("^(.*?),? +(?:situated +|located +)?(off|on) +the +(?:(%s) +)?coast$" % "|".join(re.escape(x) for x in compass_points_with_aliases_list), pt)
+          m = coast_re.search(pt)
           if m:
             pt, offon, compass_point = m.groups()
             if compass_point:
@@ -2172,7 +2217,7 @@ def process_text_on_page(index, pagetitle, text):
           if pt not in place_types_with_aliases:
             # Successively peel off qualifiers at the beginning.
             while True:
-              m = re.search("^(%s) +(.*)$" % "|".join(re.escape(x) for x in place_qualifiers_with_aliases_list), pt)
+              m = place_qualifier_re.search(pt)
               if m:
                 pt_qual, pt = m.groups()
                 pt_qual = place_qualifiers_with_aliases[pt_qual]
@@ -2226,7 +2271,7 @@ def process_text_on_page(index, pagetitle, text):
             if parsed_holonym:
               add_to_parsed_holonyms(parsed_holonym)
             else:
-              m = re.search("^(%s) +(?:the +)?(.*)$" % "|".join(re.escape(x) for x in compass_points_with_aliases_list), holonym)
+              m = compass_point_holonym_re.search(holonym)
               if m:
                 compass_point, base_holonym = m.groups()
                 if holonym_index > 0 and compass_point in first_only_compass_points:
@@ -2439,8 +2484,7 @@ def process_text_on_page(index, pagetitle, text):
       langcode = blib.languages_byCanonicalName[langname]["code"]
       def do_templatize_place_line(m):
         return templatize_place_line(m, langcode)
-      sections[j] = re.sub(r"^.*(%s).*$" % "|".join(re.escape(x) for x in place_types_with_aliases_list),
-        do_templatize_place_line, sections[j], 0, re.M)
+      sections[j] = place_type_line_re.sub(do_templatize_place_line, sections[j])
   return "".join(sections), notes
 
 parser = blib.create_argparser("Templatize place specs into {{place}}",
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Table-driven transliteration engine used by the tr() functions in the *_translit.py modules.
+#
+# A language's transliteration is declared as a list of rewrite rules plus a character table, and compiled once
+# into a Transliterator, which rewrites text in a single left-to-right pass using one regular expression. At each
+# position, the longest rule whose source matches (and whose context conditions hold) is applied; among rules of
+# the same length, the first one declared wins, and rules take precedence over the character table. Characters
+# matched by no rule and not in the table are copied unchanged.
+#
+# Each rule is a tuple (SOURCE, TARGET) or (SOURCE, TARGET, BEFORE, AFTER), where SOURCE is the literal text to
+# replace and TARGET the replacement. BEFORE and AFTER are context conditions on the text preceding and following
+# SOURCE. Each is None (no condition), a regex or a list of alternative regexes; "^" and "$" stand for the
+# beginning and end of the text. Contexts are checked against the original text, not the output of other rules.
+# Python requires lookbehind to be fixed-width, so each alternative in BEFORE must match a fixed number of
+# characters (e.g. use ["[aeiou]", "[aeiou]" + AC] rather than "[aeiou]" + AC + "?").
+
+import re
+
+# Convert a context condition (see above) to a zero-width regex. BEHIND is True for a BEFORE condition.
+def context_regex(context, behind):
+  if context is None:
+    return ""
+  if isinstance(context, str):
+    context = [context]
+  alternatives = []
+  for alt in context:
+    if alt in ["^", "$"]:
+      alternatives.append(alt)
+    elif behind:
+      alternatives.append("(?<=%s)" % alt)
+    else:
+      alternatives.append("(?=%s)" % alt)
+  return "(?:%s)" % "|".join(alternatives)
+
+class Transliterator(object):
+  def __init__(self, rules=[], table={}):
+    rules = list(rules)
+    table_chars = []
+    for source, target in table.items():
+      if len(source) == 1:
+        table_chars.append(source)
+      else:
+        rules.append((source, target))
+    # Longest sources first; sorted() is stable, so otherwise the declaration order is preserved.
+    rules = sorted(rules, key=lambda rule: -len(rule[0]))
+    alternatives = []
+    # Indexed by the number of the capturing group around each rule's source; index 0 is unused.
+    targets = [None]
+    for rule in rules:
+      source, target = rule[0], rule[1]
+      before = rule[2] if len(rule) > 2 else None
+      after = rule[3] if len(rule) > 3 else None
+      alternatives.append("%s(%s)%s" % (context_regex(before, True), re.escape(source),
+        context_regex(after, False)))
+      targets.append(target)
+    table_index = None
+    if table_chars:
+      alternatives.append("([%s])" % "".join(re.escape(ch) for ch in table_chars))
+      table_index = len(targets)
+      targets.append(None)
+    self.regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    table = dict(table)
+    def replace(m):
+      index = m.lastindex
+      if index == table_index:
+        return table[m.group(index)]
+      return targets[index]
+    self.replace = replace
+
+  # Transliterate TEXT.
+  def tr(self, text):
+    if self.regex is None:
+      return text
+    return self.regex.sub(self.replace, text)
+
+  # Transliterate each string in TEXTS, returning a list of the results.
+  def tr_many(self, texts):
+    return tr_many(self.tr, texts)
+
+# Apply the transliteration function TRFUN to each string in TEXTS, returning a list of the results. Bulk runs over a
+# dump see the same strings over and over, so each distinct string is transliterated only once.
+def tr_many(trfun, texts):
+  results = {}
+  retval = []
+  for text in texts:
+    result = results.get(text)
+    if result is None and text not in results:
+      result = trfun(text)
+      results[text] = result
+    retval.append(result)
+  return retval